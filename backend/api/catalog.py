@@ -0,0 +1,83 @@
+import gzip
+import hashlib
+
+import brotli
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+
+from api.renderers import ORJSONRenderer
+from api.serializers import IngredientSerializer
+from api.versions import INGREDIENTS, get_version
+from recipes.models import Ingredient
+
+CATALOG_KEY = 'ingredients:catalog'
+# Кодировки в порядке предпочтения сервера.
+ENCODINGS = ('br', 'gzip')
+
+_local = {}
+
+
+def build_catalog(version):
+    """Рендерит весь каталог ингредиентов и его сжатые варианты.
+
+    Каталог кэшируется под новой версией без срока, поэтому читается из
+    основной БД, а не с реплики, которая может ещё не получить изменения.
+    """
+    body = ORJSONRenderer().render(IngredientSerializer(
+        Ingredient.objects.using(DEFAULT_DB_ALIAS), many=True
+    ).data)
+    return {
+        'version': version,
+        'etag': quote_etag(hashlib.sha256(body).hexdigest()),
+        'identity': body,
+        'gzip': gzip.compress(body, compresslevel=9, mtime=0),
+        'br': brotli.compress(body, quality=11),
+    }
+
+
+def get_catalog():
+    """Каталог текущей версии: из памяти процесса, общего кэша или БД."""
+    version = get_version(INGREDIENTS)
+    catalog = _local.get(CATALOG_KEY)
+    if catalog is None or catalog['version'] != version:
+        catalog = cache.get(CATALOG_KEY)
+        if catalog is None or catalog['version'] != version:
+            catalog = build_catalog(version)
+            cache.set(CATALOG_KEY, catalog, None)
+        _local[CATALOG_KEY] = catalog
+    return catalog
+
+
+def choose_encoding(request):
+    accepted = {
+        item.split(';')[0].strip().lower()
+        for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(',')
+    }
+    for encoding in ENCODINGS:
+        if encoding in accepted:
+            return encoding
+    return 'identity'
+
+
+def catalog_response(request):
+    """Готовый ответ со всем каталогом без обращения к ORM."""
+    catalog = get_catalog()
+    encoding = choose_encoding(request)
+    # У каждого представления свой сильный ETag.
+    etag = catalog['etag']
+    if encoding != 'identity':
+        etag = f'{etag[:-1]}-{encoding}"'
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(catalog[encoding],
+                                content_type='application/json')
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    response.headers['ETag'] = etag
+    patch_cache_control(response, public=True, no_cache=True)
+    patch_vary_headers(response, ('Accept', 'Accept-Encoding'))
+    return response
@@ -0,0 +1,184 @@
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q, Value
+from django.db.models.expressions import RawSQL
+
+from api.events import USER_CHANNEL, publish_events
+from api.read_models import RecipeListReadModel
+from api.utils import is_number
+from recipes.models import Change, Favorite, Recipe, ShoppingCart
+from users.models import Subscription
+
+# Тип записи журнала и поле с id отмеченного объекта.
+MARKS = {
+    Favorite: (Change.FAVORITE, 'recipe_id'),
+    ShoppingCart: (Change.SHOPPING_CART, 'recipe_id'),
+    Subscription: (Change.SUBSCRIPTION, 'author_id'),
+}
+UPSERT = 'upsert'
+DELETE = 'delete'
+START = (0, 0)
+
+
+class CursorExpired(Exception):
+    """Записи после курсора уже удалены из журнала."""
+
+
+def format_cursor(position):
+    return '{}.{}'.format(*position)
+
+
+def parse_cursor(value):
+    """Позиция (txid, id) из курсора вида '<txid>.<id>'.
+
+    Для некорректного курсора возвращает None.
+    """
+    parts = value.split('.')
+    if len(parts) != 2 or not all(map(is_number, parts)):
+        return None
+    return tuple(map(int, parts))
+
+
+def current_txid():
+    """Номер текущей транзакции для Change.txid.
+
+    Без PostgreSQL запись в базу идёт по одной транзакции за раз, номера
+    записей и так растут в порядке коммитов.
+    """
+    if connections[Change.objects.db].vendor != 'postgresql':
+        return Value(0)
+    return RawSQL('pg_current_xact_id()::text::bigint', ())
+
+
+def get_horizon():
+    """Номер старейшей незавершённой транзакции или None без PostgreSQL.
+
+    Транзакции с меньшими номерами уже закоммичены или откачены, и новых
+    записей от них не появится. Записи от остальных пока не отдаются:
+    порядок номеров транзакций не совпадает с порядком коммитов, и
+    курсор перескочил бы через запись, которая ещё не видна.
+    """
+    connection = connections[Change.objects.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint'
+        )
+        return cursor.fetchone()[0]
+
+
+def readable(queryset):
+    """Записи, порядок которых относительно курсора уже не изменится."""
+    horizon = get_horizon()
+    if horizon is None:
+        return queryset
+    return queryset.filter(txid__lt=horizon)
+
+
+def log_recipes(recipe_ids, deleted=False):
+    txid = current_txid()
+    Change.objects.bulk_create(
+        Change(kind=Change.RECIPE, object_id=recipe_id, deleted=deleted,
+               txid=txid)
+        for recipe_id in recipe_ids
+    )
+
+
+def log_marks(model, rows, deleted=False):
+    """Записывает изменения отметок, rows - пары (user_id, object_id).
+
+    Те же изменения после коммита уходят событиями в открытые сессии
+    пользователя.
+    """
+    kind, _ = MARKS[model]
+    txid = current_txid()
+    Change.objects.bulk_create(
+        Change(kind=kind, object_id=object_id, user_id=user_id,
+               deleted=deleted, txid=txid)
+        for user_id, object_id in rows
+    )
+    publish_events(
+        (USER_CHANNEL.format(user_id), {
+            'type': kind, 'id': object_id,
+            'action': DELETE if deleted else UPSERT,
+        })
+        for user_id, object_id in rows
+    )
+
+
+def log_mark(instance, deleted=False):
+    _, field = MARKS[type(instance)]
+    log_marks(type(instance), [(instance.user_id, getattr(instance, field))],
+              deleted)
+
+
+def visible_to(user):
+    visible = Q(user_id__isnull=True)
+    if user.is_authenticated:
+        visible |= Q(user_id=user.pk)
+    return visible
+
+
+def latest_cursor(user):
+    position = readable(Change.objects.filter(visible_to(user))).order_by(
+        '-txid', '-id'
+    ).values_list('txid', 'id').first()
+    return format_cursor(position or START)
+
+
+def get_changes(request, since):
+    """Изменения после позиции since, видимые текущему пользователю.
+
+    Возвращает новый курсор, признак того, что есть ещё изменения, и
+    список, в котором каждый объект встречается один раз со своим
+    последним состоянием: рецепты целиком, отметки только id. Удаление
+    рецепта означает и удаление его из избранного и корзины.
+    """
+    txid, change_id = since
+    if since == START:
+        # Журнал пуст с самого начала, только если его ещё не чистили.
+        oldest = Change.objects.order_by('id').values_list(
+            'id', flat=True).first()
+        if oldest is not None and oldest > 1:
+            raise CursorExpired
+    elif not Change.objects.filter(id=change_id).exists():
+        # prune_changes удалил запись курсора, а с ней, возможно, и
+        # следующие за ней.
+        raise CursorExpired
+    rows = list(readable(Change.objects.filter(
+        visible_to(request.user),
+        Q(txid__gt=txid) | Q(txid=txid, id__gt=change_id)
+    )).order_by('txid', 'id').values_list(
+        'txid', 'id', 'kind', 'object_id', 'deleted'
+    )[:settings.CHANGES_PAGE_SIZE + 1])
+    has_more = len(rows) > settings.CHANGES_PAGE_SIZE
+    rows = rows[:settings.CHANGES_PAGE_SIZE]
+    latest = {}
+    for _, _, kind, object_id, deleted in rows:
+        # Объект переезжает в конец: порядок по последнему изменению.
+        latest.pop((kind, object_id), None)
+        latest[(kind, object_id)] = deleted
+    read_model = RecipeListReadModel(request)
+    recipes = {
+        recipe['id']: recipe
+        for recipe in read_model.build(read_model.get_rows(
+            Recipe.objects.filter(id__in=[
+                object_id for (kind, object_id), deleted in latest.items()
+                if kind == Change.RECIPE and not deleted
+            ])
+        ))
+    }
+    changes = []
+    for (kind, object_id), deleted in latest.items():
+        change = {'type': kind, 'id': object_id,
+                  'action': DELETE if deleted else UPSERT}
+        if kind == Change.RECIPE and not deleted:
+            if object_id in recipes:
+                change['data'] = recipes[object_id]
+            else:
+                # Рецепт удалён, запись об этом ещё не попала в выдачу.
+                change['action'] = DELETE
+        changes.append(change)
+    cursor = rows[-1][:2] if rows else since
+    return format_cursor(cursor), has_more, changes
@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.db import transaction
+
+from api.changes import MARKS, log_marks, log_recipes
+from api.signals import bump_after_commit, viewer_changed
+from api.versions import RECIPES
+from recipes.models import Favorite, Recipe, RecipeIngredient, ShoppingCart
+from recipes.storage import release
+from users.models import Subscription
+
+
+def _raw_delete(queryset):
+    """DELETE одним запросом, без загрузки объектов и сигналов."""
+    return queryset._raw_delete(queryset.db)
+
+
+def _delete_marks(model, **filters):
+    """Удаляет строки избранного/корзины/подписок пачками.
+
+    Сигналы при таком удалении не отправляются, поэтому журнал изменений
+    и версии отметок затронутых пользователей обновляются здесь.
+    """
+    _, field = MARKS[model]
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            rows = list(model.objects.filter(**filters).values_list(
+                'id', 'user_id', field)[:settings.DELETE_CHUNK_SIZE])
+            if not rows:
+                return deleted
+            deleted += _raw_delete(model.objects.filter(
+                id__in=[row_id for row_id, _, _ in rows]
+            ))
+            log_marks(model, [(user_id, object_id)
+                              for _, user_id, object_id in rows],
+                      deleted=True)
+            for user_id in {user_id for _, user_id, _ in rows}:
+                viewer_changed(user_id)
+
+
+def delete_recipes(queryset):
+    """Удаляет рецепты со всеми связями пачками с ограниченной памятью.
+
+    В отличие от queryset.delete(), связанные избранное, корзины и
+    ингредиенты не загружаются в память: каждая пачка рецептов удаляется
+    несколькими DELETE по id. Со всех картинок снимаются ссылки, сами
+    файлы удаляет collect_image_garbage. Возвращает количество удалённых
+    рецептов.
+    """
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            rows = list(queryset.order_by().values_list(
+                'id', 'image')[:settings.DELETE_CHUNK_SIZE])
+            if not rows:
+                break
+            recipe_ids = [recipe_id for recipe_id, _ in rows]
+            for model in (Favorite, ShoppingCart):
+                _delete_marks(model, recipe_id__in=recipe_ids)
+            _raw_delete(RecipeIngredient.objects.filter(
+                recipe_id__in=recipe_ids))
+            _raw_delete(Recipe.tags.through.objects.filter(
+                recipe_id__in=recipe_ids))
+            deleted += _raw_delete(Recipe.objects.filter(id__in=recipe_ids))
+            log_recipes(recipe_ids, deleted=True)
+            release(name for _, name in rows)
+    if deleted:
+        # Админка удаляет внутри своей транзакции.
+        bump_after_commit(RECIPES)
+    return deleted
+
+
+def delete_user(user):
+    """Удаляет пользователя, его рецепты, отметки и подписки пачками.
+
+    Тяжёлые связи удаляются заранее, поэтому на долю стандартного
+    user.delete() остаются только токен, журнал админки и группы.
+    """
+    delete_recipes(Recipe.objects.filter(author=user))
+    _delete_marks(Favorite, user=user)
+    _delete_marks(ShoppingCart, user=user)
+    _delete_marks(Subscription, user=user)
+    _delete_marks(Subscription, author=user)
+    user.delete()
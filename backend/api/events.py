@@ -0,0 +1,222 @@
+import asyncio
+import logging
+import os
+import queue
+import threading
+from collections import defaultdict
+from functools import partial
+
+import orjson
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+USER_CHANNEL = 'user:{}'
+AUTHOR_CHANNEL = 'author:{}'
+
+_broker = None
+
+
+class Listener:
+    """Подписка одного соединения на набор каналов брокера."""
+
+    def __init__(self, broker, loop):
+        self.broker = broker
+        self.loop = loop
+        self.channels = set()
+        self.queue = asyncio.Queue(settings.EVENTS_QUEUE_SIZE)
+
+    async def add(self, channel):
+        if channel not in self.channels:
+            self.channels.add(channel)
+            await self.broker.attach(self, channel)
+
+    async def discard(self, channel):
+        if channel in self.channels:
+            self.channels.discard(channel)
+            await self.broker.detach(self, channel)
+
+    async def get(self):
+        return await self.queue.get()
+
+    async def close(self):
+        for channel in list(self.channels):
+            await self.discard(channel)
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Медленный клиент теряет события, а не память сервера;
+            # пропущенное он догонит через /api/changes/.
+            logger.warning('Event queue is full, dropping %s', event)
+
+
+class InProcessBroker:
+    """Брокер событий в памяти процесса.
+
+    Подходит, когда запись и поток событий обслуживает один процесс
+    (runserver, один воркер uvicorn). publish() можно вызывать из любого
+    потока: события передаются в цикл событий слушателя.
+    """
+
+    def __init__(self):
+        self.listeners = defaultdict(set)
+        self.lock = threading.Lock()
+
+    def listen(self):
+        return Listener(self, asyncio.get_running_loop())
+
+    async def attach(self, listener, channel):
+        with self.lock:
+            self.listeners[channel].add(listener)
+
+    async def detach(self, listener, channel):
+        with self.lock:
+            self.listeners[channel].discard(listener)
+            if not self.listeners[channel]:
+                del self.listeners[channel]
+
+    def dispatch(self, channel, event):
+        with self.lock:
+            listeners = list(self.listeners.get(channel, ()))
+        for listener in listeners:
+            listener.loop.call_soon_threadsafe(listener.put, event)
+
+    def publish(self, events):
+        """Отправляет пачку пар (канал, событие)."""
+        for channel, event in events:
+            self.dispatch(channel, event)
+
+
+class RedisBroker(InProcessBroker):
+    """Общий брокер на Redis pub/sub для нескольких процессов.
+
+    Процесс держит одно соединение подписки на все свои каналы и
+    раздаёт полученные сообщения локальным слушателям, поэтому число
+    соединений с Redis не зависит от числа клиентов.
+    """
+
+    prefix = 'events:'
+
+    def __init__(self, url=None):
+        super().__init__()
+        self.url = url or settings.REDIS_URL
+        self.client = None
+        self.pubsub = None
+        self.reader = None
+
+    def publish(self, events):
+        if self.client is None:
+            import redis
+            self.client = redis.Redis.from_url(self.url)
+        # Вся пачка уходит за одно обращение к Redis.
+        pipeline = self.client.pipeline(transaction=False)
+        for channel, event in events:
+            pipeline.publish(self.prefix + channel, orjson.dumps(event))
+        pipeline.execute()
+
+    async def attach(self, listener, channel):
+        with self.lock:
+            first = channel not in self.listeners
+            self.listeners[channel].add(listener)
+        if first:
+            await self.connect()
+            await self.pubsub.subscribe(self.prefix + channel)
+
+    async def detach(self, listener, channel):
+        await super().detach(listener, channel)
+        with self.lock:
+            last = channel not in self.listeners
+        if last and self.pubsub is not None:
+            await self.pubsub.unsubscribe(self.prefix + channel)
+
+    async def connect(self):
+        if self.pubsub is None:
+            import redis.asyncio
+            self.pubsub = redis.asyncio.Redis.from_url(self.url).pubsub(
+                ignore_subscribe_messages=True
+            )
+            self.reader = asyncio.create_task(self.read())
+
+    async def read(self):
+        while True:
+            if not self.pubsub.subscribed:
+                await asyncio.sleep(1)
+                continue
+            try:
+                message = await self.pubsub.get_message(timeout=1)
+            except Exception:
+                logger.exception('Redis pub/sub read failed')
+                await asyncio.sleep(1)
+                continue
+            if message is not None and message['type'] == 'message':
+                channel = message['channel'].decode()[len(self.prefix):]
+                self.dispatch(channel, orjson.loads(message['data']))
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        _broker = import_string(settings.EVENTS_BROKER)()
+    return _broker
+
+
+class Publisher:
+    """Отправка событий брокеру из фонового потока.
+
+    Запрос только кладёт пачку событий в очередь и не ждёт брокер. Поток
+    не переживает форк и запускается заново в каждом процессе. Если
+    брокер не успевает, новые пачки отбрасываются: клиенты догонят
+    пропущенное через /api/changes/.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queue = None
+        self.pid = None
+
+    def put(self, events):
+        with self.lock:
+            self.start()
+        try:
+            self.queue.put_nowait(events)
+        except queue.Full:
+            logger.warning('Event publisher queue is full, dropping %d '
+                           'events', len(events))
+
+    def start(self):
+        if self.pid == os.getpid():
+            return
+        self.pid = os.getpid()
+        self.queue = queue.Queue(settings.EVENTS_PUBLISH_QUEUE_SIZE)
+        threading.Thread(target=self.run, name='event-publisher',
+                         daemon=True).start()
+
+    def run(self):
+        while True:
+            events = self.queue.get()
+            try:
+                get_broker().publish(events)
+            except Exception:
+                # Недоступный брокер не должен ломать запись через API.
+                logger.exception('Failed to publish %d events', len(events))
+
+
+publisher = Publisher()
+
+
+def publish_events(events):
+    """Публикует пары (канал, событие) одной пачкой после коммита.
+
+    При откате транзакции события не отправляются.
+    """
+    events = list(events)
+    if events:
+        transaction.on_commit(partial(publisher.put, events))
+
+
+def publish_event(channel, event):
+    publish_events([(channel, event)])
@@ -0,0 +1,139 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, Count, Value, When
+from rest_framework.exceptions import ValidationError
+
+from api.versions import CATALOG, RECIPES, get_versions, viewer_scope
+from recipes.models import Recipe
+
+TAGS = 'tags'
+COOKING_TIME = 'cooking_time'
+FACETS = (TAGS, COOKING_TIME)
+# Фильтры, результат которых зависит от пользователя.
+VIEWER_FILTERS = ('is_favorited', 'is_in_shopping_cart')
+FACETS_KEY = 'facets:{}'
+
+
+def parse_facets(value):
+    names = [name for name in value.split(',') if name]
+    unknown = set(names) - set(FACETS)
+    if unknown:
+        raise ValidationError({'facets': [
+            f'Неизвестные фасеты: {", ".join(sorted(unknown))}. '
+            f'Доступные: {", ".join(FACETS)}.'
+        ]})
+    return tuple(name for name in FACETS if name in names)
+
+
+def filtered_recipes(request, view, exclude=()):
+    """id рецептов под фильтрами запроса, кроме фильтров exclude."""
+    data = request.query_params.copy()
+    for name in exclude:
+        data.pop(name, None)
+    filterset = view.filterset_class(
+        data, Recipe.objects.all(), request=request
+    )
+    if not filterset.is_valid():
+        raise ValidationError(filterset.errors)
+    return filterset.qs.order_by().values('id')
+
+
+def tag_counts(recipe_ids):
+    """Количество рецептов по тегам одним GROUP BY.
+
+    Теги без рецептов в выдачу не попадают.
+    """
+    rows = Recipe.tags.through.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values('tag_id', 'tag__slug', 'tag__name').annotate(
+        count=Count('recipe_id')
+    ).order_by('tag__name')
+    return [
+        {'id': row['tag_id'], 'slug': row['tag__slug'],
+         'name': row['tag__name'], 'count': row['count']}
+        for row in rows
+    ]
+
+
+def cooking_time_histogram(recipe_ids):
+    """Гистограмма времени приготовления одним GROUP BY.
+
+    Границы корзин - FACET_COOKING_TIME_BUCKETS, последняя корзина
+    открыта сверху (max равен None).
+    """
+    bounds = settings.FACET_COOKING_TIME_BUCKETS
+    bucket = Case(
+        *(When(cooking_time__lte=upper, then=Value(number))
+          for number, upper in enumerate(bounds)),
+        default=Value(len(bounds)),
+    )
+    counts = dict(Recipe.objects.filter(id__in=recipe_ids).annotate(
+        bucket=bucket
+    ).order_by().values('bucket').annotate(
+        count=Count('id')
+    ).values_list('bucket', 'count'))
+    histogram = []
+    lower = 1
+    for number, upper in enumerate((*bounds, None)):
+        histogram.append({'min': lower, 'max': upper,
+                          'count': counts.get(number, 0)})
+        lower = upper + 1 if upper is not None else None
+    return histogram
+
+
+def cache_key(request, view, names):
+    """Ключ кэша по нормализованным значениям фильтров.
+
+    Значения берутся из очищенной формы фильтров, поэтому tags=a&tags=b
+    и tags=b&tags=a, is_favorited=1 и is_favorited=true дают один ключ.
+    В ключ входят версии данных: изменения рецептов и справочников
+    сразу дают новый ключ, а срок жизни только подчищает старые.
+    """
+    filterset = view.filterset_class(
+        request.query_params, Recipe.objects.none(), request=request
+    )
+    if not filterset.is_valid():
+        raise ValidationError(filterset.errors)
+    values = []
+    for name, value in sorted(filterset.form.cleaned_data.items()):
+        if name == 'ordering' or value in (None, '', False):
+            continue
+        if name == TAGS:
+            value = sorted(tag.slug for tag in value)
+        elif hasattr(value, 'pk'):
+            value = value.pk
+        values.append((name, value))
+    scopes = [RECIPES, CATALOG]
+    if any(name in VIEWER_FILTERS for name, _ in values):
+        viewer = viewer_scope(request.user)
+        if viewer:
+            values.append(('viewer', request.user.pk))
+            scopes.append(viewer)
+    raw = repr((names, values, get_versions(*scopes)))
+    return FACETS_KEY.format(hashlib.md5(raw.encode()).hexdigest())
+
+
+def get_facets(request, view, names):
+    """Фасеты для отфильтрованного списка рецептов.
+
+    Счётчики тегов считаются без фильтра по тегам: теги в фильтре
+    объединяются через ИЛИ, и выбранный тег не должен обнулять
+    соседние.
+    """
+    key = cache_key(request, view, names)
+    facets = cache.get(key)
+    if facets is not None:
+        return facets
+    facets = {}
+    if TAGS in names:
+        facets[TAGS] = tag_counts(
+            filtered_recipes(request, view, exclude=(TAGS,))
+        )
+    if COOKING_TIME in names:
+        facets[COOKING_TIME] = cooking_time_histogram(
+            filtered_recipes(request, view)
+        )
+    cache.set(key, facets, settings.FACETS_CACHE_SECONDS)
+    return facets
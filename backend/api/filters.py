@@ -2,6 +2,9 @@ from django_filters.rest_framework import FilterSet, filters
 
 from recipes.models import Ingredient, Recipe, Tag
 
+NEWEST = 'newest'
+POPULAR = 'popular'
+
 
 class RecipeFilter(FilterSet):
     tags = filters.ModelMultipleChoiceFilter(
@@ -15,10 +18,15 @@ class RecipeFilter(FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='is_in_shopping_cart_filter'
     )
+    ordering = filters.ChoiceFilter(
+        choices=((NEWEST, 'Сначала новые'), (POPULAR, 'Сначала популярные')),
+        method='ordering_filter'
+    )
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart',
+                  'ordering')
 
     def is_favorited_filter(self, queryset, name, value):
         if self.request.user.is_authenticated and value:
@@ -30,6 +38,12 @@ class RecipeFilter(FilterSet):
             return queryset.filter(shopping_carts__user=self.request.user)
         return queryset
 
+    def ordering_filter(self, queryset, name, value):
+        # id делает порядок однозначным для пагинации по ключу.
+        if value == POPULAR:
+            return queryset.order_by('-popularity', '-id')
+        return queryset
+
 
 class IngredientFilter(FilterSet):
     name = filters.CharFilter(lookup_expr='istartswith')
@@ -0,0 +1,156 @@
+import logging
+from contextlib import ExitStack
+
+import orjson
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, OperationalError, connections
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.settings import api_settings
+
+logger = logging.getLogger(__name__)
+
+GUARDRAILS_KEY = 'guardrails:{}:{}'
+TIMEOUTS = 'timeouts'
+REJECTED = 'rejected'
+# SQLSTATE query_canceled: запрос прерван по statement_timeout.
+QUERY_CANCELED = '57014'
+
+
+class StatementTimeoutError(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Запрос выполнялся слишком долго, попробуйте позже.'
+    default_code = 'statement_timeout'
+
+
+def count(kind, endpoint):
+    """Увеличивает счётчик срабатываний в общем кэше.
+
+    Счётчики без срока жизни, их выводит команда guardrail_stats. Ей
+    нужен общий кэш (Redis): в LocMemCache счётчики остаются в памяти
+    воркера, и команда в отдельном процессе их не видит.
+    """
+    key = GUARDRAILS_KEY.format(kind, endpoint)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Ключ вытеснили между add() и incr().
+        cache.set(key, 1, None)
+
+
+def is_timeout(error):
+    cause = error.__cause__
+    return QUERY_CANCELED in (getattr(cause, 'pgcode', None),
+                              getattr(cause, 'sqlstate', None))
+
+
+class StatementTimeout:
+    """Ограничение времени запросов к БД на время одного HTTP-запроса.
+
+    Подключается к соединениям через execute_wrapper(). Перед первым
+    запросом через соединение PostgreSQL задаёт ему statement_timeout,
+    прерванный по времени запрос превращается в ответ 503 и учитывается
+    в счётчиках. Пока seconds равно None, время не ограничивается.
+    """
+
+    def __init__(self):
+        self.seconds = None
+        self.endpoint = None
+        self.applied = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        connection = context['connection']
+        if (self.seconds and connection.vendor == 'postgresql'
+                and self.applied.get(connection.alias) != self.seconds):
+            # Сырой курсор: запрос через обёртку снова попал бы сюда.
+            context['cursor'].cursor.execute(
+                "SELECT set_config('statement_timeout', %s, false)",
+                [f'{int(self.seconds * 1000)}ms']
+            )
+            self.applied[connection.alias] = self.seconds
+        try:
+            return execute(sql, params, many, context)
+        except OperationalError as error:
+            if not is_timeout(error):
+                raise
+            count(TIMEOUTS, self.endpoint)
+            logger.warning('Statement timeout of %ss in %s: %s',
+                           self.seconds, self.endpoint, sql)
+            raise StatementTimeoutError from error
+
+    def reset(self):
+        """Возвращает соединениям statement_timeout по умолчанию.
+
+        Соединения переиспользуются между запросами, и ограничение одной
+        вьюхи не должно доставаться следующей.
+        """
+        for alias in self.applied:
+            try:
+                with connections[alias].cursor() as cursor:
+                    cursor.execute('RESET statement_timeout')
+            except DatabaseError:
+                # Сломанное соединение Django закроет сам.
+                pass
+        self.applied.clear()
+
+
+class StatementTimeoutMiddleware:
+    """statement_timeout для вьюх API.
+
+    Время берётся из словаря statement_timeouts вьюсета по имени
+    действия, иначе из STATEMENT_TIMEOUT_SECONDS. Вьюхи не на DRF,
+    например админка, не ограничиваются.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.statement_timeout = timeout = StatementTimeout()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timeout))
+            response = self.get_response(request)
+        timeout.reset()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None)
+        if view_class is None:
+            return None
+        action = (getattr(view_func, 'actions', None) or {}).get(
+            request.method.lower()
+        )
+        timeout = request.statement_timeout
+        timeout.seconds = getattr(view_class, 'statement_timeouts', {}).get(
+            action, settings.STATEMENT_TIMEOUT_SECONDS
+        )
+        timeout.endpoint = request.resolver_match.url_name
+        return None
+
+
+def query_cost(queryset):
+    """Оценка стоимости запроса планировщиком PostgreSQL без выполнения."""
+    plan = orjson.loads(queryset.explain(format='json'))
+    return plan[0]['Plan']['Total Cost']
+
+
+def check_query_cost(queryset, endpoint):
+    """Отклоняет запрос дороже QUERY_COST_LIMIT ошибкой 400.
+
+    Проверка делает лишний EXPLAIN на каждый запрос, поэтому включается
+    только заданным QUERY_COST_LIMIT и только для PostgreSQL.
+    """
+    limit = settings.QUERY_COST_LIMIT
+    if limit is None or connections[queryset.db].vendor != 'postgresql':
+        return
+    cost = query_cost(queryset)
+    if cost <= limit:
+        return
+    count(REJECTED, endpoint)
+    logger.warning('Query cost %.0f over %.0f in %s', cost, limit, endpoint)
+    raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [
+        'Запрос слишком тяжёлый: уточните фильтры или уменьшите limit.'
+    ]})
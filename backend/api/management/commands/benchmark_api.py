@@ -0,0 +1,372 @@
+import base64
+import json
+import random
+import statistics
+import time
+from io import BytesIO
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from api.deletion import delete_recipes, delete_user
+from recipes.management.commands.seed_benchmark_data import (
+    BENCHMARK_PASSWORD, BENCHMARK_PREFIX)
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from users.models import Subscription, User
+
+PICK_ATTEMPTS = 100
+
+
+class Scenario:
+    """Сценарий, меняющий данные.
+
+    prepare() готовит состояние для run(state), restore(state, response)
+    возвращает данные к исходным, чтобы повторные прогоны были
+    сравнимы. Подготовка и откат в замер не входят.
+    """
+
+    def __init__(self, run, prepare=None, restore=None):
+        self.run = run
+        self.prepare = prepare or (lambda: None)
+        self.restore = restore or (lambda state, response: None)
+
+
+def percentile(values, percent):
+    """Перцентиль по методу ближайшего ранга."""
+    ordered = sorted(values)
+    index = max(0, round(percent / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = ("Runs a repeatable in-process benchmark against every API "
+            "endpoint and writes a JSON baseline")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--users', type=int, default=20,
+                            help='How many seeded users to act as')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default='benchmark.json')
+        parser.add_argument('--baseline',
+                            help='Previous JSON result to diff against')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+        users = list(User.objects.filter(
+            username__startswith=BENCHMARK_PREFIX
+        ).order_by('id')[:options['users']])
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True)[:1000])
+        if len(users) < 2 or not recipe_ids:
+            raise CommandError('Run seed_benchmark_data first.')
+        self.tokens = [Token.objects.get_or_create(user=user)[0].key
+                       for user in users]
+        self.user_ids = [user.id for user in users]
+        self.recipe_ids = recipe_ids
+        tags = list(Tag.objects.values_list('id', 'slug'))
+        self.tag_ids = [tag_id for tag_id, _ in tags]
+        self.tag_slugs = [slug for _, slug in tags]
+        self.ingredient_ids = list(
+            Ingredient.objects.values_list('id', flat=True)[:1000]
+        )
+        self.ingredient_words = [
+            word for name in Ingredient.objects.values_list('name', flat=True)
+            for word in name.split() if len(word) > 3
+        ]
+        self.emails = [user.email for user in users]
+        self.image = self.encode_image()
+        self.signups = 0
+
+        results = {}
+        for name, scenario in self.scenarios():
+            results[name] = self.measure(scenario, options['iterations'])
+            self.stdout.write(
+                f'{name:<32} {results[name]["rps"]:>8.1f} rps  '
+                f'p50 {results[name]["p50_ms"]:>7.2f} ms  '
+                f'p95 {results[name]["p95_ms"]:>7.2f} ms  '
+                f'p99 {results[name]["p99_ms"]:>7.2f} ms  '
+                f'queries {results[name]["queries"]:>3}  '
+                f'{results[name]["bytes"]:>8} B'
+            )
+        with open(options['output'], 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+        self.stdout.write(f'Results saved to {options["output"]}')
+        if options['baseline']:
+            self.compare(results, options['baseline'])
+
+    def auth(self, index=None):
+        if index is None:
+            index = self.random.randrange(len(self.tokens))
+        return {'HTTP_AUTHORIZATION': f'Token {self.tokens[index]}'}
+
+    @staticmethod
+    def encode_image():
+        buffer = BytesIO()
+        Image.new('RGB', (64, 48), '#2D8CE2').save(buffer, 'PNG')
+        return ('data:image/png;base64,'
+                + base64.b64encode(buffer.getvalue()).decode())
+
+    def recipe_payload(self):
+        return {
+            'tags': self.random.sample(self.tag_ids,
+                                       min(2, len(self.tag_ids))),
+            'ingredients': [
+                {'id': ingredient_id, 'amount': self.random.randint(1, 500)}
+                for ingredient_id in self.random.sample(
+                    self.ingredient_ids, min(3, len(self.ingredient_ids)))
+            ],
+            'image': self.image,
+            'name': 'Рецепт для замера записи',
+            'text': 'Создан benchmark_api и сразу удалён.',
+            'cooking_time': self.random.randint(1, 240),
+        }
+
+    def create_recipe(self):
+        """Рецепт случайного пользователя для замера правки и удаления."""
+        index = self.random.randrange(len(self.tokens))
+        response = self.client.post(
+            '/api/recipes/', self.recipe_payload(),
+            content_type='application/json', **self.auth(index)
+        )
+        if response.status_code != 201:
+            raise CommandError(f'Could not create a recipe: {response}')
+        return index, response.json()['id']
+
+    @staticmethod
+    def remove_recipe(state, response):
+        delete_recipes(Recipe.objects.filter(pk=state[1]))
+
+    def pick_unmarked(self, model, field, targets):
+        """Пользователь и объект, которых ещё не связывает отметка model.
+
+        Свой аккаунт в качестве автора для подписки не выбирается.
+        """
+        for _ in range(PICK_ATTEMPTS):
+            index = self.random.randrange(len(self.tokens))
+            target = self.random.choice(targets)
+            if target != self.user_ids[index] and not model.objects.filter(
+                    user_id=self.user_ids[index], **{field: target}
+            ).exists():
+                return index, target
+        raise CommandError(f'No free pairs for {model.__name__}.')
+
+    def toggle(self, model, field, targets, path):
+        """Добавление и снятие отметки; после прогона её снова нет."""
+        def run(state):
+            index, target = state
+            url = path.format(target)
+            self.client.post(url, **self.auth(index))
+            return self.client.delete(url, **self.auth(index))
+
+        def restore(state, response):
+            index, target = state
+            model.objects.filter(user_id=self.user_ids[index],
+                                 **{field: target}).delete()
+
+        return Scenario(
+            run, lambda: self.pick_unmarked(model, field, targets), restore
+        )
+
+    def misspelled_ingredient(self):
+        """Слово из названия случайного ингредиента с одной опечаткой."""
+        word = self.random.choice(self.ingredient_words)
+        index = self.random.randrange(1, len(word) - 1)
+        return word[:index] + word[index + 1:]
+
+    def write_scenarios(self):
+        """Запись рецептов, вход, выход и регистрация."""
+        client = self.client
+
+        def create_recipe(index):
+            return client.post('/api/recipes/', self.recipe_payload(),
+                               content_type='application/json',
+                               **self.auth(index))
+
+        def remove_created(index, response):
+            if response.status_code == 201:
+                delete_recipes(Recipe.objects.filter(
+                    pk=response.json()['id']))
+
+        def restore_token(index, response):
+            Token.objects.get_or_create(
+                user_id=self.user_ids[index],
+                defaults={'key': self.tokens[index]}
+            )
+
+        def next_signup():
+            self.signups += 1
+            return f'{BENCHMARK_PREFIX}_signup_{self.signups}'
+
+        def signup(username):
+            return client.post('/api/users/', {
+                'email': f'{username}@example.com', 'username': username,
+                'first_name': 'Bench', 'last_name': 'Signup',
+                'password': BENCHMARK_PASSWORD,
+            }, content_type='application/json')
+
+        def remove_signup(username, response):
+            for user in User.objects.filter(username=username):
+                delete_user(user)
+
+        def random_index():
+            return self.random.randrange(len(self.tokens))
+
+        return [
+            ('recipes:create', Scenario(
+                create_recipe, random_index, remove_created)),
+            ('recipes:update', Scenario(
+                lambda state: client.patch(
+                    f'/api/recipes/{state[1]}/', self.recipe_payload(),
+                    content_type='application/json', **self.auth(state[0])),
+                self.create_recipe, self.remove_recipe)),
+            ('recipes:delete', Scenario(
+                lambda state: client.delete(
+                    f'/api/recipes/{state[1]}/', **self.auth(state[0])),
+                self.create_recipe, self.remove_recipe)),
+            ('auth:login', Scenario(
+                lambda index: client.post('/api/auth/token/login/', {
+                    'email': self.emails[index],
+                    'password': BENCHMARK_PASSWORD,
+                }, content_type='application/json'),
+                random_index)),
+            ('auth:logout', Scenario(
+                lambda index: client.post('/api/auth/token/logout/',
+                                          **self.auth(index)),
+                random_index, restore_token)),
+            ('users:create', Scenario(signup, next_signup, remove_signup)),
+        ]
+
+    def scenarios(self):
+        """Набор сценариев: имя и функция, выполняющая один запрос.
+
+        Сценарии, меняющие данные, оформлены как Scenario и после
+        каждого прогона возвращают данные к исходным.
+        """
+        client = self.client
+        recipe = lambda: self.random.choice(self.recipe_ids)  # noqa: E731
+        user = lambda: self.random.choice(self.user_ids)  # noqa: E731
+
+        return [
+            ('tags:list', lambda: client.get('/api/tags/')),
+            ('tags:detail', lambda: client.get(
+                f'/api/tags/{self.random.choice(self.tag_ids)}/')),
+            ('ingredients:list', lambda: client.get('/api/ingredients/')),
+            ('ingredients:search', lambda: client.get(
+                '/api/ingredients/', {'name': 'мо'})),
+            ('ingredients:fuzzy', lambda: client.get(
+                '/api/ingredients/',
+                {'search': self.misspelled_ingredient()})),
+            ('ingredients:detail', lambda: client.get(
+                f'/api/ingredients/{self.random.choice(self.ingredient_ids)}/'
+            )),
+            ('recipes:list:anonymous', lambda: client.get(
+                '/api/recipes/', {'page': self.random.randint(1, 5)})),
+            ('recipes:list:authenticated', lambda: client.get(
+                '/api/recipes/', {'limit': 6}, **self.auth())),
+            ('recipes:list:tags', lambda: client.get(
+                '/api/recipes/',
+                {'tags': self.random.sample(
+                    self.tag_slugs, min(2, len(self.tag_slugs)))},
+                **self.auth())),
+            ('recipes:list:card', lambda: client.get(
+                '/api/recipes/',
+                {'limit': 6, 'fields': 'name,image,image_variants,'
+                                       'cooking_time'},
+                **self.auth())),
+            ('recipes:list:no_ingredients', lambda: client.get(
+                '/api/recipes/', {'limit': 6, 'omit': 'ingredients'},
+                **self.auth())),
+            ('recipes:list:facets', lambda: client.get(
+                '/api/recipes/',
+                {'facets': 'tags,cooking_time', 'tags': self.random.sample(
+                    self.tag_slugs, min(2, len(self.tag_slugs)))})),
+            ('recipes:list:popular', lambda: client.get(
+                '/api/recipes/', {'ordering': 'popular', 'limit': 6})),
+            ('recipes:list:favorited', lambda: client.get(
+                '/api/recipes/', {'is_favorited': 1}, **self.auth())),
+            ('recipes:list:in_cart', lambda: client.get(
+                '/api/recipes/', {'is_in_shopping_cart': 1}, **self.auth())),
+            ('recipes:detail', lambda: client.get(
+                f'/api/recipes/{recipe()}/', **self.auth())),
+            ('recipes:favorite', self.toggle(
+                Favorite, 'recipe_id', self.recipe_ids,
+                '/api/recipes/{}/favorite/')),
+            ('recipes:shopping_cart', self.toggle(
+                ShoppingCart, 'recipe_id', self.recipe_ids,
+                '/api/recipes/{}/shopping_cart/')),
+            ('recipes:download_shopping_cart', lambda: client.get(
+                '/api/recipes/download_shopping_cart/', **self.auth())),
+            ('users:list', lambda: client.get(
+                '/api/users/', {'limit': 6}, **self.auth())),
+            ('users:list:no_subscription', lambda: client.get(
+                '/api/users/', {'limit': 6, 'omit': 'is_subscribed'},
+                **self.auth())),
+            ('users:detail', lambda: client.get(
+                f'/api/users/{user()}/', **self.auth())),
+            ('users:me', lambda: client.get('/api/users/me/', **self.auth())),
+            ('users:subscriptions', lambda: client.get(
+                '/api/users/subscriptions/', {'recipes_limit': 3},
+                **self.auth())),
+            ('users:subscriptions:no_recipes', lambda: client.get(
+                '/api/users/subscriptions/', {'omit': 'recipes'},
+                **self.auth())),
+            ('users:subscribe', self.toggle(
+                Subscription, 'author_id', self.user_ids,
+                '/api/users/{}/subscribe/')),
+            *self.write_scenarios(),
+        ]
+
+    @staticmethod
+    def measure(scenario, iterations):
+        timings = []
+        queries = []
+        sizes = []
+        statuses = {}
+        if not isinstance(scenario, Scenario):
+            scenario = Scenario(lambda state, run=scenario: run())
+        for _ in range(iterations):
+            state = scenario.prepare()
+            with CaptureQueriesContext(connection) as context:
+                request_started = time.perf_counter()
+                response = scenario.run(state)
+                timings.append(time.perf_counter() - request_started)
+            scenario.restore(state, response)
+            queries.append(len(context.captured_queries))
+            sizes.append(len(response.content))
+            statuses[response.status_code] = (
+                statuses.get(response.status_code, 0) + 1
+            )
+        return {
+            # Только время запросов, без подготовки и отката.
+            'rps': iterations / sum(timings),
+            'p50_ms': percentile(timings, 50) * 1000,
+            'p95_ms': percentile(timings, 95) * 1000,
+            'p99_ms': percentile(timings, 99) * 1000,
+            'mean_ms': statistics.fmean(timings) * 1000,
+            'queries': max(queries),
+            'bytes': max(sizes),
+            'statuses': {str(code): count
+                         for code, count in statuses.items()},
+        }
+
+    def compare(self, results, path):
+        with open(path) as baseline_file:
+            baseline = json.load(baseline_file)
+        self.stdout.write(f'Compared with {path}:')
+        for name, result in results.items():
+            if name not in baseline:
+                continue
+            before = baseline[name]
+            self.stdout.write(
+                f'{name:<32} '
+                f'p50 {result["p50_ms"] - before["p50_ms"]:+8.2f} ms  '
+                f'p95 {result["p95_ms"] - before["p95_ms"]:+8.2f} ms  '
+                f'queries {result["queries"] - before["queries"]:+d}  '
+                f'bytes {result["bytes"] - before.get("bytes", 0):+d}'
+            )
@@ -0,0 +1,59 @@
+import timeit
+from io import BytesIO
+
+from django.core.management import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from api.parsers import ORJSONParser
+from api.renderers import ORJSONRenderer
+from api.serializers import RecipeGetSerializer
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ("Compares stdlib and orjson renderers and parsers on "
+            "representative recipe payloads")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=50)
+        parser.add_argument('--number', type=int, default=200)
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.select_related('author').prefetch_related(
+            'tags', 'recipeingredients__ingredient'
+        )[:options['page_size']]
+        data = {
+            'count': len(recipes),
+            'next': None,
+            'previous': None,
+            'results': RecipeGetSerializer(recipes, many=True).data,
+        }
+        if not data['results']:
+            raise CommandError('No recipes, run seed_benchmark_data first.')
+
+        payload = JSONRenderer().render(data)
+        fast_payload = ORJSONRenderer().render(data)
+        if JSONParser().parse(BytesIO(payload)) != ORJSONParser().parse(
+                BytesIO(fast_payload)):
+            raise CommandError('Renderers produced different documents.')
+        self.stdout.write(
+            f'Payload: {len(payload)} bytes, byte-identical: '
+            f'{payload == fast_payload}'
+        )
+
+        number = options['number']
+        cases = (
+            ('render', lambda: JSONRenderer().render(data),
+             lambda: ORJSONRenderer().render(data)),
+            ('parse', lambda: JSONParser().parse(BytesIO(payload)),
+             lambda: ORJSONParser().parse(BytesIO(payload))),
+        )
+        for name, stdlib, fast in cases:
+            stdlib_time = timeit.timeit(stdlib, number=number) / number
+            fast_time = timeit.timeit(fast, number=number) / number
+            self.stdout.write(
+                f'{name:<8} json {stdlib_time * 1e6:>9.1f} us  '
+                f'orjson {fast_time * 1e6:>9.1f} us  '
+                f'x{stdlib_time / fast_time:.1f}'
+            )
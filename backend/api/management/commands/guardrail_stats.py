@@ -0,0 +1,39 @@
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import BaseCommand, CommandError
+from django.urls import get_resolver
+
+from api.guardrails import GUARDRAILS_KEY, REJECTED, TIMEOUTS
+
+
+class Command(BaseCommand):
+    help = ("Shows how many requests hit the statement timeout or were "
+            "rejected by the query cost check, per endpoint. The counters "
+            "live in the shared cache, so REDIS_URL is required")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true',
+                            help='Zero the counters after printing them')
+
+    def handle(self, *args, **options):
+        if isinstance(caches['default'], LocMemCache):
+            # Счётчики в памяти процессов сервера, отсюда их не видно.
+            raise CommandError(
+                'Guardrail counters need a shared cache: set REDIS_URL for '
+                'the server and for this command'
+            )
+        endpoints = sorted(name for name in get_resolver().reverse_dict
+                           if isinstance(name, str))
+        keys = {
+            GUARDRAILS_KEY.format(kind, endpoint): (kind, endpoint)
+            for kind in (TIMEOUTS, REJECTED) for endpoint in endpoints
+        }
+        counts = cache.get_many(keys)
+        for key, value in sorted(counts.items()):
+            if value:
+                kind, endpoint = keys[key]
+                self.stdout.write(f'{endpoint:<40} {kind:<10} {value}')
+        if not any(counts.values()):
+            self.stdout.write('No timeouts or rejected queries')
+        if options['reset']:
+            cache.delete_many(counts)
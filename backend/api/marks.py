@@ -0,0 +1,84 @@
+from django.db import IntegrityError, connections, router, transaction
+
+from api.changes import MARKS, log_marks
+from api.signals import viewer_changed
+
+INSERT_MARK = (
+    'INSERT INTO {table} ({columns}) SELECT {values} '
+    'WHERE EXISTS (SELECT 1 FROM {target} WHERE {target_pk} = %s) '
+    'ON CONFLICT DO NOTHING RETURNING {pk}'
+)
+
+
+def insert_mark_sql(model, connection, **fields):
+    """INSERT отметки, если отмечаемый объект есть и отметки ещё нет."""
+    _, field = MARKS[model]
+    target = model._meta.get_field(field).related_model._meta
+    instance = model(**fields)
+    columns = [column for column in model._meta.local_concrete_fields
+               if not column.primary_key]
+    quote = connection.ops.quote_name
+    sql = INSERT_MARK.format(
+        table=quote(model._meta.db_table),
+        columns=', '.join(quote(column.column) for column in columns),
+        values=', '.join(['%s'] * len(columns)),
+        target=quote(target.db_table),
+        target_pk=quote(target.pk.column),
+        pk=quote(model._meta.pk.column),
+    )
+    # pre_save() заполняет поля auto_now_add, как при обычном save().
+    params = [column.get_db_prep_save(column.pre_save(instance, True),
+                                      connection)
+              for column in columns]
+    return sql, [*params, getattr(instance, field)]
+
+
+def add_mark(model, user_id, **fields):
+    """Добавляет отметку (избранное, корзина, подписка) одним INSERT.
+
+    Возвращает False, если отметка уже есть или отмечаемого объекта нет,
+    различать эти случаи вьюха должна отдельным запросом только после
+    отказа. Внешние ключи в PostgreSQL проверяются при коммите, поэтому
+    на время вставки они переводятся в немедленный режим: объект,
+    удалённый параллельно, даёт ошибку здесь, внутри точки сохранения, а
+    не при коммите чужой транзакции. Сигналов при такой вставке нет,
+    журнал изменений и версии отметок обновляются здесь.
+    """
+    _, field = MARKS[model]
+    connection = connections[router.db_for_write(model)]
+    sql, params = insert_mark_sql(model, connection, user_id=user_id,
+                                  **fields)
+    try:
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                if connection.vendor == 'postgresql':
+                    # Вьюхи работают без ATOMIC_REQUESTS, и режим
+                    # действует только до коммита этого atomic().
+                    cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+                cursor.execute(sql, params)
+                if cursor.fetchone() is None:
+                    return False
+            log_marks(model, [(user_id, fields[field])])
+            viewer_changed(user_id)
+    except IntegrityError:
+        # Объект удалили между проверкой EXISTS и вставкой.
+        return False
+    return True
+
+
+def remove_mark(model, user_id, **filters):
+    """Удаляет отметку одним DELETE и возвращает, была ли она.
+
+    queryset.delete() при подключённых сигналах сначала выбирает строки,
+    поэтому, как и в api.deletion, удаление идёт без сигналов, а журнал
+    и версии отметок обновляются здесь.
+    """
+    _, field = MARKS[model]
+    using = router.db_for_write(model)
+    with transaction.atomic(using=using):
+        deleted = model.objects.filter(
+            user_id=user_id, **filters)._raw_delete(using)
+        if deleted:
+            log_marks(model, [(user_id, filters[field])], deleted=True)
+            viewer_changed(user_id)
+    return bool(deleted)
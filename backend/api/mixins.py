@@ -0,0 +1,124 @@
+import hashlib
+
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+from rest_framework.exceptions import ValidationError
+
+from api.guardrails import check_query_cost
+from api.replicas import read_recent_from_primary
+from api.utils import is_number
+
+
+class ConditionalGetMixin:
+    """Поддержка ETag/Last-Modified для чтения.
+
+    Вьюсет переопределяет get_validators(), возвращающий части ETag и
+    время последнего изменения (или None, если проверять нечего), и
+    вызывает get_conditional_response() в начале обработчика. Если
+    клиент прислал актуальные If-None-Match/If-Modified-Since, отдаётся
+    304 без сериализации.
+    """
+    _validators = None
+
+    def get_validators(self):
+        """По умолчанию условные запросы не обрабатываются."""
+        return None
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response,
+                                             *args, **kwargs)
+        validators = self._validators
+        if validators and (200 <= response.status_code < 300
+                           or response.status_code == 304):
+            etag, last_modified = validators
+            response.headers.setdefault('ETag', etag)
+            response.headers.setdefault('Last-Modified',
+                                        http_date(last_modified))
+            # Ответ зависит от пользователя, общим прокси его кэшировать
+            # нельзя, а клиенты обязаны перепроверять его через валидаторы.
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ('Accept', 'Authorization'))
+        return response
+
+    def get_conditional_response(self, request):
+        validators = self.get_validators()
+        if validators is None:
+            return None
+        parts, last_modified = validators
+        parts = (*parts, request.accepted_media_type)
+        etag = quote_etag(
+            hashlib.md5(':'.join(map(str, parts)).encode()).hexdigest()
+        )
+        self._validators = etag, int(last_modified)
+        read_recent_from_primary(last_modified)
+        return get_conditional_response(request, etag=etag,
+                                        last_modified=int(last_modified))
+
+
+class SparseFieldsMixin:
+    """Параметры ?fields= и ?omit= для GET-запросов.
+
+    fields оставляет в ответе только перечисленные поля верхнего уровня,
+    omit убирает перечисленные, id остаётся всегда. Набор полей
+    передаётся сериализатору через context['fields'], а вьюсет по нему
+    же решает, какие связи загружать.
+    """
+    sparse_actions = ('list', 'retrieve')
+
+    def get_requested_fields(self):
+        """Запрошенные поля или None, если нужны все."""
+        if not hasattr(self, '_requested_fields'):
+            self._requested_fields = self.parse_requested_fields()
+        return self._requested_fields
+
+    def parse_requested_fields(self):
+        params = self.request.query_params
+        if (self.request.method != 'GET'
+                or self.action not in self.sparse_actions
+                or not ('fields' in params or 'omit' in params)):
+            return None
+        available = self.get_serializer_class().Meta.fields
+        fields = params.get('fields')
+        fields = fields.split(',') if fields else available
+        omit = params.get('omit')
+        omit = omit.split(',') if omit else ()
+        unknown = (set(fields) | set(omit)) - set(available)
+        if unknown:
+            raise ValidationError({'fields': [
+                f'Неизвестные поля: {", ".join(sorted(unknown))}. '
+                f'Доступные: {", ".join(available)}.'
+            ]})
+        return frozenset(fields).difference(omit) | {'id'}
+
+    def wants(self, field):
+        fields = self.get_requested_fields()
+        return fields is None or field in fields
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = self.get_requested_fields()
+        return context
+
+
+class QueryCostMixin:
+    """Проверка стоимости запроса списка до его выполнения.
+
+    Перед пагинацией запрос страницы (или всего списка без пагинации)
+    оценивается через EXPLAIN, слишком дорогой отклоняется, см.
+    check_query_cost().
+    """
+
+    def paginate_queryset(self, queryset):
+        check_query_cost(self.get_page_query(queryset),
+                         self.request.resolver_match.url_name)
+        return super().paginate_queryset(queryset)
+
+    def get_page_query(self, queryset):
+        paginator = self.paginator
+        if paginator is None:
+            return queryset
+        size = paginator.get_page_size(self.request)
+        page = self.request.query_params.get(paginator.page_query_param, '')
+        page = int(page) if is_number(page) and int(page) > 0 else 1
+        return queryset[(page - 1) * size:page * size]
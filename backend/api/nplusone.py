@@ -0,0 +1,128 @@
+import logging
+import re
+import sys
+import traceback
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework.fields import Field
+
+logger = logging.getLogger(__name__)
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%s")
+IN_LISTS = re.compile(r'\(\?(?:\s*,\s*\?)*\)')
+SPACES = re.compile(r'\s+')
+STACK_DEPTH = 8
+
+
+class NPlusOneError(Exception):
+    """Запрос одной формы повторился больше допустимого."""
+
+
+def normalize(sql):
+    """Форма запроса: без значений, с любым числом элементов в IN."""
+    sql = LITERALS.sub('?', sql)
+    sql = IN_LISTS.sub('(...)', sql)
+    return SPACES.sub(' ', sql).strip()
+
+
+def serializer_field(frame):
+    """Ближайшее к запросу поле сериализатора на стеке вызовов."""
+    while frame is not None:
+        for name in ('self', 'field'):
+            value = frame.f_locals.get(name)
+            if isinstance(value, Field) and value.field_name:
+                if value.parent is None:
+                    return value.field_name
+                return f'{type(value.parent).__name__}.{value.field_name}'
+        frame = frame.f_back
+    return None
+
+
+def project_stack():
+    """Кадры стека из кода проекта, без Django и сторонних пакетов."""
+    base = str(settings.BASE_DIR)
+    return traceback.format_list([
+        entry for entry in traceback.extract_stack()
+        if entry.filename.startswith(base)
+        and 'site-packages' not in entry.filename
+        and entry.filename != __file__
+    ][-STACK_DEPTH:])
+
+
+class QueryCollector:
+    """Считает выполненные запросы по их нормализованной форме.
+
+    Подключается к соединениям через execute_wrapper(). Для формы,
+    повторившейся threshold раз, запоминает поле сериализатора и стек
+    вызова, на котором это произошло.
+    """
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.counts = Counter()
+        self.origins = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        shape = normalize(sql)
+        self.counts[shape] += 1
+        if self.counts[shape] == self.threshold:
+            self.origins[shape] = (serializer_field(sys._getframe(1)),
+                                   project_stack())
+        return execute(sql, params, many, context)
+
+    def repeated(self):
+        """Пары (форма, количество) для форм, превысивших порог."""
+        return [(shape, count) for shape, count in self.counts.items()
+                if count >= self.threshold]
+
+    def report(self, label=''):
+        lines = [f'N+1 queries{f" in {label}" if label else ""}:']
+        for shape, count in self.repeated():
+            field, stack = self.origins[shape]
+            lines.append(f'{count}x {shape}')
+            if field:
+                lines.append(f'  serializer field: {field}')
+            lines.extend(f'  {line.rstrip()}' for line in stack)
+        return '\n'.join(lines)
+
+    def check(self, label='', raise_error=False):
+        if not self.repeated():
+            return
+        if raise_error:
+            raise NPlusOneError(self.report(label))
+        logger.warning(self.report(label))
+
+
+@contextmanager
+def detect_n_plus_one(label='', threshold=None, raise_error=None):
+    """Проверяет запросы внутри блока на N+1.
+
+    Если одна форма запроса выполнилась threshold раз и больше, пишет
+    предупреждение в лог или, с raise_error, выбрасывает NPlusOneError.
+    По умолчанию берутся NPLUSONE_THRESHOLD и NPLUSONE_RAISE.
+    """
+    collector = QueryCollector(threshold or settings.NPLUSONE_THRESHOLD)
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(collector))
+        yield collector
+    if raise_error is None:
+        raise_error = settings.NPLUSONE_RAISE
+    collector.check(label, raise_error)
+
+
+class NPlusOneMiddleware:
+    """Проверка каждого запроса на N+1 при DEBUG."""
+
+    def __init__(self, get_response):
+        if not settings.DEBUG:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with detect_n_plus_one(f'{request.method} {request.path}'):
+            return self.get_response(request)
@@ -1,8 +1,98 @@
+import base64
+import math
+
+import orjson
 from django.conf import settings
+from django.db.models import F, Q
+from rest_framework.exceptions import ValidationError
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class CustomizedPaginator(PageNumberPagination):
-    """Пагинатор с возможностью устанавливать кол-во объектов на страницу"""
+    """Пагинатор с возможностью устанавливать кол-во объектов на страницу.
+
+    limit больше PAGE_MAX_SIZE урезается до него.
+    """
     page_size_query_param = 'limit'
     page_size = settings.PAGE_SIZE
+    max_page_size = settings.PAGE_MAX_SIZE
+
+
+class PopularityPaginator(CustomizedPaginator):
+    """Пагинация по ключу для рецептов, отсортированных по популярности.
+
+    Вместо номера страницы клиент передаёт after - непрозрачный курсор
+    из ссылки next с парой (popularity, id) последнего рецепта
+    предыдущей страницы. Следующая страница выбирается условием по этой
+    паре, а не по текущей популярности рецепта, которая могла
+    измениться, и читается по индексу recipe_popularity без OFFSET и без
+    подсчёта всех строк, поэтому глубокие страницы не дороже первой.
+    """
+    after_query_param = 'after'
+    # Популярность добавляется к строкам страницы для курсора.
+    position_field = 'cursor_popularity'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        after = request.query_params.get(self.after_query_param)
+        if after is not None:
+            queryset = queryset.filter(self.after_filter(after))
+        queryset = queryset.annotate(
+            **{self.position_field: F('popularity')}
+        )
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        self.page = rows[:page_size]
+        return self.page
+
+    @staticmethod
+    def encode_cursor(popularity, recipe_id):
+        return base64.urlsafe_b64encode(
+            orjson.dumps([popularity, recipe_id])
+        ).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(value):
+        """Пара (popularity, id) из курсора или None, если он испорчен."""
+        try:
+            popularity, recipe_id = orjson.loads(base64.urlsafe_b64decode(
+                value + '=' * (-len(value) % 4)
+            ))
+        except (TypeError, ValueError):
+            return None
+        if (not isinstance(popularity, (int, float))
+                or not isinstance(recipe_id, int)
+                or isinstance(popularity, bool)
+                or isinstance(recipe_id, bool)
+                or not math.isfinite(popularity)):
+            return None
+        return popularity, recipe_id
+
+    def after_filter(self, value):
+        cursor = self.decode_cursor(value)
+        if cursor is None:
+            raise ValidationError({self.after_query_param: [
+                'Некорректный курсор, загрузите список заново.'
+            ]})
+        popularity, recipe_id = cursor
+        return (Q(popularity__lt=popularity)
+                | Q(popularity=popularity, id__lt=recipe_id))
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        if isinstance(last, dict):
+            cursor = last[self.position_field], last['id']
+        else:
+            cursor = getattr(last, self.position_field), last.pk
+        url = remove_query_param(self.request.build_absolute_uri(),
+                                 self.page_query_param)
+        return replace_query_param(url, self.after_query_param,
+                                   self.encode_cursor(*cursor))
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
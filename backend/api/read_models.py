@@ -0,0 +1,193 @@
+from django.conf import settings
+
+from api.utils import variant_urls
+from api.viewer_state import ViewerState
+from recipes.models import Recipe, RecipeIngredient
+from users.models import User
+
+RECIPE_FIELDS = ('name', 'image', 'image_variants', 'text', 'cooking_time',
+                 'views')
+CARD_FIELDS = ('tags', 'author', 'ingredients')
+AUTHOR_FIELDS = ('id', 'email', 'username', 'first_name', 'last_name')
+
+
+def get_tags(recipe_ids):
+    tags = {recipe_id: [] for recipe_id in recipe_ids}
+    rows = Recipe.tags.through.objects.filter(
+        recipe_id__in=recipe_ids
+    ).order_by('tag__name').values_list(
+        'recipe_id', 'tag__id', 'tag__name', 'tag__color', 'tag__slug'
+    )
+    for recipe_id, tag_id, name, color, slug in rows:
+        tags[recipe_id].append(
+            {'id': tag_id, 'name': name, 'color': color, 'slug': slug}
+        )
+    return tags
+
+
+def get_ingredients(recipe_ids):
+    ingredients = {recipe_id: [] for recipe_id in recipe_ids}
+    rows = RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).order_by('id').values_list(
+        'recipe_id', 'ingredient__id', 'ingredient__name',
+        'ingredient__measurement_unit', 'amount'
+    )
+    for recipe_id, ingredient_id, name, unit, amount in rows:
+        ingredients[recipe_id].append({
+            'id': ingredient_id,
+            'name': name,
+            'measurement_unit': unit,
+            'amount': amount,
+        })
+    return ingredients
+
+
+def build_cards(recipe_ids):
+    """Карточки рецептов по id: теги, автор и ингредиенты.
+
+    В карточку попадает только то, что не зависит от зрителя и требует
+    JOIN; собственные поля рецепта и так лежат в его строке, а ссылки на
+    картинки зависят от хоста запроса.
+    """
+    author_ids = dict(Recipe.objects.filter(
+        id__in=recipe_ids).values_list('id', 'author_id'))
+    authors = {
+        author['id']: author
+        for author in User.objects.filter(
+            id__in=set(author_ids.values())).values(*AUTHOR_FIELDS)
+    }
+    tags = get_tags(author_ids)
+    ingredients = get_ingredients(author_ids)
+    return {
+        recipe_id: {
+            'tags': tags[recipe_id],
+            'author': authors[author_id],
+            'ingredients': ingredients[recipe_id],
+        }
+        for recipe_id, author_id in author_ids.items()
+    }
+
+
+def rebuild_cards(queryset):
+    """Пересобирает карточки рецептов из queryset пачками.
+
+    Карточка входит в рецепт из ленты изменений, поэтому пересобранные
+    рецепты записываются в журнал. Возвращает количество обновлённых
+    рецептов.
+    """
+    # api.changes сам импортирует этот модуль.
+    from api.changes import log_recipes
+
+    recipe_ids = queryset.order_by('id').values_list('id', flat=True)
+    last_id = 0
+    updated = 0
+    while True:
+        chunk = list(recipe_ids.filter(
+            id__gt=last_id)[:settings.CARD_REBUILD_CHUNK_SIZE])
+        if not chunk:
+            return updated
+        last_id = chunk[-1]
+        log_recipes(chunk)
+        updated += Recipe.objects.bulk_update(
+            [Recipe(id=recipe_id, card=card)
+             for recipe_id, card in build_cards(chunk).items()],
+            ('card',)
+        )
+
+
+class RecipeListReadModel:
+    """Сборка списка рецептов напрямую из .values() без сериализаторов.
+
+    Результат совпадает с RecipeGetSerializer(many=True).data. Теги,
+    автор и ингредиенты хранятся готовыми в колонке Recipe.card, поэтому
+    рецепт читается одной строкой, а к ней добавляются только ссылки на
+    картинки и отметки текущего пользователя из ViewerState. Карточки,
+    которые ещё не собраны, строятся на лету. Если задан набор fields,
+    собираются только эти поля.
+    """
+
+    def __init__(self, request=None, fields=None):
+        self.request = request
+        self.fields = fields
+
+    def wants(self, field):
+        return self.fields is None or field in self.fields
+
+    def wants_card(self):
+        return any(self.wants(field) for field in CARD_FIELDS)
+
+    def get_rows(self, queryset):
+        """Строки рецептов, которые можно передать в пагинатор."""
+        columns = [field for field in RECIPE_FIELDS if self.wants(field)]
+        if self.wants_card():
+            columns.append('card')
+        return queryset.values('id', *columns)
+
+    def viewer(self):
+        if self.request is None:
+            return None
+        if self.request.user.is_authenticated:
+            return self.request.user
+        return False
+
+    def image_url(self, name):
+        if not name:
+            return None
+        url = Recipe._meta.get_field('image').storage.url(name)
+        if self.request is not None:
+            return self.request.build_absolute_uri(url)
+        return url
+
+    def get_cards(self, rows):
+        if not self.wants_card():
+            return {}
+        cards = {row['id']: row['card'] for row in rows if row['card']}
+        missing = [row['id'] for row in rows if row['id'] not in cards]
+        if missing:
+            cards.update(build_cards(missing))
+        return cards
+
+    def build(self, rows):
+        """Собирает представления рецептов по строкам из get_rows()."""
+        rows = list(rows)
+        viewer = self.viewer()
+        state = None
+        if viewer and (self.wants('author') or self.wants('is_favorited')
+                       or self.wants('is_in_shopping_cart')):
+            state = ViewerState.for_request(self.request)
+        favorited = state.favorites if state else set()
+        in_cart = state.shopping_carts if state else set()
+        following = state.following if state else set()
+        cards = self.get_cards(rows)
+        recipes = []
+        for row in rows:
+            card = cards.get(row['id'], {})
+            author = card.get('author')
+            if author is not None:
+                author = {
+                    **author,
+                    'is_subscribed': viewer and author['id'] in following,
+                }
+            recipes.append({
+                'id': row['id'],
+                'tags': card.get('tags'),
+                'author': author,
+                'ingredients': card.get('ingredients'),
+                'is_favorited': viewer and row['id'] in favorited,
+                'is_in_shopping_cart': viewer and row['id'] in in_cart,
+                'name': row.get('name'),
+                'image': self.image_url(row.get('image')),
+                'image_variants': variant_urls(row.get('image_variants', {}),
+                                               self.request),
+                'text': row.get('text'),
+                'cooking_time': row.get('cooking_time'),
+                'views': row.get('views'),
+            })
+        if self.fields is None:
+            return recipes
+        return [
+            {field: value for field, value in recipe.items()
+             if field in self.fields}
+            for recipe in recipes
+        ]
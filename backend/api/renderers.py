@@ -0,0 +1,32 @@
+import orjson
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.renderers import JSONRenderer
+
+ORJSON_OPTIONS = (orjson.OPT_PASSTHROUGH_DATETIME
+                  | orjson.OPT_NON_STR_KEYS)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSON-рендерер на orjson с тем же выводом, что и у JSONRenderer.
+
+    Типы, которые orjson не знает (Decimal, ленивые строки, даты), отдаются
+    стандартному энкодеру DRF. Для вывода с отступами используется родитель.
+    """
+    encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        if (not self.compact or self.ensure_ascii
+                or self.get_indent(accepted_media_type,
+                                   renderer_context) is not None):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        ret = orjson.dumps(data, default=self.encoder.default,
+                           option=ORJSON_OPTIONS)
+        # Как и JSONRenderer, экранируем U+2028 и U+2029 для JavaScript.
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = (ret.replace('\u2028'.encode(), b'\\u2028')
+                   .replace('\u2029'.encode(), b'\\u2029'))
+        return ret
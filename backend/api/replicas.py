@@ -0,0 +1,191 @@
+import hashlib
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import (DEFAULT_DB_ALIAS, DatabaseError, OperationalError,
+                       connections)
+from rest_framework.permissions import SAFE_METHODS
+
+PIN_KEY = 'replica-pin:{}'
+API_PREFIX = '/api/'
+# Токены читаются сразу после входа, а реплика может их ещё не получить.
+PRIMARY_MODELS = frozenset({'authtoken.token', 'sessions.session'})
+# Отставание в секундах; реплика, применившая всё полученное, не
+# отстаёт, даже если на основной БД давно не было записи.
+LAG_SQL = (
+    'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() '
+    'THEN 0 ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) '
+    'END'
+)
+
+# Время, до которого реплика считается недоступной, в этом процессе.
+_down_until = {}
+# Время следующей проверки отставания реплики в этом процессе.
+_lag_checked_until = {}
+_reads = ContextVar('replica_reads', default=None)
+
+
+class ReplicaReads:
+    """Реплика для чтения в рамках одного запроса.
+
+    Реплика выбирается при первом запросе к БД, а не заранее: ответы
+    304 по версиям из кэша обходятся без БД вовсе.
+    """
+
+    def __init__(self):
+        self._alias = None
+
+    @property
+    def alias(self):
+        if self._alias is None:
+            self._alias = pick_replica()
+        return self._alias
+
+    def use_primary(self):
+        self._alias = DEFAULT_DB_ALIAS
+
+
+def is_lagging(alias, now):
+    """Отстаёт ли реплика больше чем на REPLICA_MAX_LAG_SECONDS.
+
+    Проверяется не чаще раза в REPLICA_LAG_CHECK_SECONDS, между
+    проверками отставание может вырасти незамеченным.
+    """
+    if _lag_checked_until.get(alias, 0) > now:
+        return False
+    _lag_checked_until[alias] = now + settings.REPLICA_LAG_CHECK_SECONDS
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return False
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(LAG_SQL)
+            lag = cursor.fetchone()[0]
+    except DatabaseError:
+        return True
+    return lag is not None and lag > settings.REPLICA_MAX_LAG_SECONDS
+
+
+def pick_replica():
+    """Случайная доступная реплика или основная БД, если таких нет.
+
+    Реплика, к которой не удалось подключиться или которая отстала,
+    пропускается на REPLICA_RETRY_SECONDS.
+    """
+    now = time.monotonic()
+    replicas = [alias for alias in settings.DATABASE_REPLICAS
+                if _down_until.get(alias, 0) <= now]
+    random.shuffle(replicas)
+    for alias in replicas:
+        try:
+            connections[alias].ensure_connection()
+        except OperationalError:
+            _down_until[alias] = now + settings.REPLICA_RETRY_SECONDS
+            continue
+        if is_lagging(alias, now):
+            _down_until[alias] = now + settings.REPLICA_RETRY_SECONDS
+            continue
+        return alias
+    return DEFAULT_DB_ALIAS
+
+
+def read_from_primary():
+    """Оставшиеся чтения текущего запроса идут в основную БД."""
+    reads = _reads.get()
+    if reads is not None:
+        reads.use_primary()
+
+
+def read_recent_from_primary(changed):
+    """Читает из основной БД, если данные менялись только что.
+
+    Ответ уходит с валидаторами по версиям из кэша, а версия
+    увеличивается сразу после коммита. Отстающая реплика отдала бы под
+    новым ETag старые данные, и клиент получал бы на них 304. Окно
+    REPLICA_PIN_SECONDS должно быть больше REPLICA_MAX_LAG_SECONDS:
+    реплики с большим отставанием не используются.
+    """
+    if time.time() - changed < settings.REPLICA_PIN_SECONDS:
+        read_from_primary()
+
+
+def pin_key(credentials):
+    if not credentials:
+        return None
+    return PIN_KEY.format(
+        hashlib.sha256(credentials.encode()).hexdigest()
+    )
+
+
+def request_pin_key(request):
+    """Ключ закрепления за основной БД по токену или сессии клиента."""
+    return pin_key(request.META.get('HTTP_AUTHORIZATION')
+                   or request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+
+
+def issued_pin_key(response):
+    """Ключ для токена, выданного при входе.
+
+    Только что зарегистрированный пользователь может ещё не дойти до
+    реплики, поэтому новый токен сразу закрепляется за основной БД.
+    """
+    data = getattr(response, 'data', None)
+    if isinstance(data, dict) and data.get('auth_token'):
+        return pin_key(f'Token {data["auth_token"]}')
+    return None
+
+
+class ReplicaRouter:
+    """Отправляет чтения GET-запросов к API на реплики.
+
+    Всё остальное - запись, чтения внутри изменяющих запросов, админка,
+    команды и поток событий - идёт в основную БД.
+    """
+
+    def db_for_read(self, model, **hints):
+        reads = _reads.get()
+        if reads is None or model._meta.label_lower in PRIMARY_MODELS:
+            return DEFAULT_DB_ALIAS
+        return reads.alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики - копии основной БД, объекты из них можно связывать.
+        return True
+
+
+class ReplicaMiddleware:
+    """Включает чтение с реплик для безопасных запросов к API.
+
+    После изменяющего запроса клиент на REPLICA_PIN_SECONDS закрепляется
+    за основной БД, чтобы сразу видеть свои изменения, даже если реплика
+    отстаёт.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if (not settings.DATABASE_REPLICAS
+                or not request.path.startswith(API_PREFIX)):
+            return self.get_response(request)
+        key = request_pin_key(request)
+        if request.method not in SAFE_METHODS:
+            response = self.get_response(request)
+            keys = {key, issued_pin_key(response)} - {None}
+            if keys:
+                cache.set_many(dict.fromkeys(keys, True),
+                               settings.REPLICA_PIN_SECONDS)
+            return response
+        if key is not None and cache.get(key):
+            return self.get_response(request)
+        token = _reads.set(ReplicaReads())
+        try:
+            return self.get_response(request)
+        finally:
+            _reads.reset(token)
@@ -0,0 +1,110 @@
+import re
+
+from django.conf import settings
+from django.contrib.postgres.lookups import TrigramWordSimilar
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connections, transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+
+from recipes.models import Ingredient
+
+WORDS = re.compile(r'\w+')
+
+
+def trigrams(text):
+    """Триграммы строки так же, как их считает pg_trgm.
+
+    Строка приводится к нижнему регистру и делится на слова, каждое
+    слово дополняется двумя пробелами слева и одним справа.
+    """
+    result = set()
+    for word in WORDS.findall(text.lower()):
+        word = f'  {word} '
+        result.update(word[i:i + 3] for i in range(len(word) - 2))
+    return result
+
+
+def word_similarity(term, text):
+    """Приближение word_similarity(term, text) из pg_trgm.
+
+    Доля триграмм term, найденных в лучшем из слов text или во всей
+    строке целиком.
+    """
+    needle = trigrams(term)
+    if not needle:
+        return 0.0
+    candidates = [text, *WORDS.findall(text)]
+    return max(len(needle & trigrams(candidate)) / len(needle)
+               for candidate in candidates)
+
+
+def search_postgresql(queryset, term, limit):
+    """Поиск оператором %> по GIN-индексу ingredient_name_trgm.
+
+    Порог сходства задаётся только на время транзакции, чтобы не
+    влиять на другие запросы того же соединения.
+    """
+    queryset = queryset.filter(
+        TrigramWordSimilar(F('name'), term)
+    ).annotate(
+        prefix=Case(When(name__istartswith=term, then=Value(1)),
+                    default=Value(0), output_field=IntegerField()),
+        similarity=TrigramWordSimilarity(term, 'name'),
+    ).order_by('-prefix', '-similarity', 'name')[:limit]
+    with transaction.atomic(using=queryset.db):
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(
+                "SELECT set_config('pg_trgm.word_similarity_threshold', "
+                "%s, true)", [str(settings.INGREDIENT_SEARCH_THRESHOLD)]
+            )
+        return list(queryset)
+
+
+def candidates(term):
+    """Условие, которому удовлетворяет любое название со сходством > 0.
+
+    Общая с term триграмма значит, что в названии есть её буквы без
+    пробелов дополнения. Однобуквенные куски берутся, только если других
+    нет: им соответствует почти весь каталог. В SQLite icontains не
+    учитывает регистр только для ASCII, названия в каталоге строчные.
+    """
+    pieces = {trigram.strip() for trigram in trigrams(term)}
+    pieces = {piece for piece in pieces if len(piece) > 1} or pieces
+    condition = Q(pk__in=[])
+    for piece in pieces:
+        condition |= Q(name__icontains=piece)
+    return condition
+
+
+def search_fallback(queryset, term, limit):
+    """Тот же поиск для баз без pg_trgm, например SQLite в тестах.
+
+    Сходство считается в Python, но только для ингредиентов, отобранных
+    в SQL по общим с term кускам триграмм.
+    """
+    prefix = term.lower()
+    found = []
+    for ingredient in queryset.filter(candidates(term)).iterator():
+        similarity = word_similarity(term, ingredient.name)
+        if similarity >= settings.INGREDIENT_SEARCH_THRESHOLD:
+            found.append((not ingredient.name.lower().startswith(prefix),
+                          -similarity, ingredient.name, ingredient))
+    found.sort(key=lambda item: item[:3])
+    return [ingredient for *_, ingredient in found[:limit]]
+
+
+def search_ingredients(term, limit=None):
+    """Нечёткий поиск ингредиентов с опечатками и по середине названия.
+
+    Сначала идут ингредиенты, название которых начинается с term, затем
+    остальные по убыванию сходства. Возвращает не больше limit
+    (по умолчанию INGREDIENT_SEARCH_LIMIT) ингредиентов.
+    """
+    term = term.strip()[:settings.INGREDIENT_MAX_LENGTH]
+    if not term:
+        return []
+    limit = limit or settings.INGREDIENT_SEARCH_LIMIT
+    queryset = Ingredient.objects.all()
+    if connections[queryset.db].vendor == 'postgresql':
+        return search_postgresql(queryset, term, limit)
+    return search_fallback(queryset, term, limit)
@@ -1,14 +1,35 @@
 from django.db import transaction
 from drf_base64.fields import Base64ImageField
 from rest_framework import serializers
-from rest_framework.validators import UniqueTogetherValidator
 
-from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
-from users.models import User, Subscription
+from recipes.images import schedule_variants
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from api.read_models import rebuild_cards
+from api.utils import is_number, variant_urls
+from api.viewer_state import ViewerState
+from users.models import User
 
 
-class UserSerializer(serializers.ModelSerializer):
+class RequestedFieldsMixin:
+    """Оставляет только поля из context['fields'].
+
+    Набор полей задаёт api.mixins.SparseFieldsMixin. Он относится к
+    сериализатору верхнего уровня, вложенные отдаются целиком.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested = self.context.get('fields')
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        if requested is None or parent is not None:
+            return fields
+        return {name: field for name, field in fields.items()
+                if name in requested}
+
+
+class UserSerializer(RequestedFieldsMixin, serializers.ModelSerializer):
     """Сериализатор для всех пользователей."""
     is_subscribed = serializers.SerializerMethodField(read_only=True)
 
@@ -18,22 +39,40 @@ class UserSerializer(serializers.ModelSerializer):
                   'first_name', 'last_name', 'is_subscribed',)
 
     def get_is_subscribed(self, author):
-        """Проверка подписки пользователей."""
+        """Проверка подписки пользователей.
+
+        Если queryset уже аннотирован флагом is_subscribed, запрос в БД
+        не выполняется.
+        """
         request = self.context.get('request')
         return (request and request.user.is_authenticated
-                and request.user.follower.filter(author=author).exists())
+                and self.check_subscription(request, author))
+
+    @staticmethod
+    def check_subscription(request, author):
+        if hasattr(author, 'is_subscribed'):
+            return author.is_subscribed
+        return author.id in ViewerState.for_request(request).following
+
 
+class ImageVariantsMixin:
+    """Ссылки на уменьшенные копии картинки рецепта."""
 
-class RecipeSerializer(serializers.ModelSerializer):
+    def get_image_variants(self, obj):
+        return variant_urls(obj.image_variants, self.context.get('request'))
+
+
+class RecipeSerializer(ImageVariantsMixin, serializers.ModelSerializer):
     """Список рецептов без ингридиентов."""
     image = Base64ImageField(read_only=True)
+    image_variants = serializers.SerializerMethodField()
     name = serializers.ReadOnlyField()
     cooking_time = serializers.ReadOnlyField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'name',
-                  'image', 'cooking_time')
+                  'image', 'image_variants', 'cooking_time', 'views')
 
 
 class SubscribeRepresentSerializer(UserSerializer):
@@ -47,42 +86,25 @@ class SubscribeRepresentSerializer(UserSerializer):
 
     def get_recipes_count(self, obj):
         """Получение количества рецептов."""
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return obj.recipes.count()
 
     def get_recipes(self, obj):
         """Получение рецептов."""
+        if hasattr(obj, 'prefetched_recipes'):
+            # Загружены вьюхой вместе со страницей с учётом recipes_limit.
+            return RecipeSerializer(obj.prefetched_recipes, many=True).data
         request = self.context.get('request')
         recipes_limit = None
         if request:
             recipes_limit = request.query_params.get('recipes_limit')
         recipes = obj.recipes.all()
-        if recipes_limit:
+        if recipes_limit and is_number(recipes_limit):
             recipes = obj.recipes.all()[:int(recipes_limit)]
         return RecipeSerializer(recipes, many=True).data
 
 
-class SubscribeSerializer(serializers.ModelSerializer):
-    """Сериализатор для подписки/отписки от пользователей."""
-    class Meta:
-        model = Subscription
-        fields = '__all__'
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Subscription.objects.all(),
-                fields=('user', 'author'),
-                message='Вы уже подписаны на этого пользователя'
-            )
-        ]
-
-    def validate(self, data):
-        request = self.context.get('request')
-        if request.user == data['author']:
-            raise serializers.ValidationError(
-                'Нельзя подписываться на самого себя.'
-            )
-        return data
-
-
 class IngredientSerializer(serializers.ModelSerializer):
     """Получение списка или одного ингрединета."""
     class Meta:
@@ -126,7 +148,8 @@ class IngredientPostSerializer(serializers.ModelSerializer):
         return value
 
 
-class RecipeGetSerializer(serializers.ModelSerializer):
+class RecipeGetSerializer(RequestedFieldsMixin, ImageVariantsMixin,
+                          serializers.ModelSerializer):
     """Сериализатор для получения информации о рецептах."""
     tags = TagSerializer(many=True, read_only=True)
     author = UserSerializer(read_only=True)
@@ -135,22 +158,24 @@ class RecipeGetSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     image = Base64ImageField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients',
                   'is_favorited', 'is_in_shopping_cart', 'name',
-                  'image', 'text', 'cooking_time')
+                  'image', 'image_variants', 'text', 'cooking_time',
+                  'views')
 
     def get_is_favorited(self, obj):
         request = self.context.get('request')
         return (request and request.user.is_authenticated
-                and request.user.favorites.filter(recipe=obj).exists())
+                and obj.id in ViewerState.for_request(request).favorites)
 
     def get_is_in_shopping_cart(self, obj):
         request = self.context.get('request')
         return (request and request.user.is_authenticated
-                and request.user.favorites.filter(recipe=obj).exists())
+                and obj.id in ViewerState.for_request(request).shopping_carts)
 
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
@@ -218,6 +243,8 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         recipe = Recipe.objects.create(author=request.user, **validated_data)
         recipe.tags.set(tags)
         self.set_ingredients(ingredients, recipe)
+        rebuild_cards(Recipe.objects.filter(pk=recipe.pk))
+        schedule_variants(recipe)
         return recipe
 
     @transaction.atomic
@@ -228,7 +255,16 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         instance.tags.set(tags)
         instance.ingredients.clear()
         self.set_ingredients(ingredients, instance)
-        return super().update(instance, validated_data)
+        previous_image = instance.image.name
+        instance = super().update(instance, validated_data)
+        rebuild_cards(Recipe.objects.filter(pk=instance.pk))
+        # Повторно отправленная та же картинка сохраняется под тем же
+        # именем, и её уменьшенные копии остаются актуальными.
+        if instance.image.name != previous_image:
+            instance.image_variants = {}
+            Recipe.objects.filter(pk=instance.pk).update(image_variants={})
+            schedule_variants(instance)
+        return instance
 
     def to_representation(self, instance):
         request = self.context.get('request')
@@ -236,31 +272,3 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             instance,
             context={'request': request}
         ).data
-
-
-class FavoriteSerializer(serializers.ModelSerializer):
-    """Сериализатор для работы с избранными рецептами."""
-    class Meta:
-        model = Favorite
-        fields = '__all__'
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Favorite.objects.all(),
-                fields=('user', 'recipe'),
-                message='Рецепт уже добавлен в избранное'
-            )
-        ]
-
-
-class ShoppingCartSerializer(serializers.ModelSerializer):
-    """Сериализатор для работы со списком покупок."""
-    class Meta:
-        model = ShoppingCart
-        fields = '__all__'
-        validators = [
-            UniqueTogetherValidator(
-                queryset=ShoppingCart.objects.all(),
-                fields=('user', 'recipe'),
-                message='Рецепт уже добавлен в список покупок'
-            )
-        ]
@@ -0,0 +1,161 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from api.changes import log_mark, log_recipes
+from api.events import AUTHOR_CHANNEL, publish_event
+from api.read_models import AUTHOR_FIELDS, rebuild_cards
+from api.versions import (CATALOG, INGREDIENTS, RECIPES, VIEWER,
+                          bump_version)
+from api.viewer_state import bump_state_version
+from recipes.models import (Change, Favorite, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, Tag)
+from recipes.storage import acquire, release
+from users.models import Subscription, User
+
+
+def bump_after_commit(scope):
+    """Обновляет версию данных после коммита текущей транзакции.
+
+    Новая версия до коммита позволила бы параллельному чтению
+    закэшировать под ней ещё старые данные. Вне транзакции версия
+    обновляется сразу.
+    """
+    transaction.on_commit(partial(bump_version, scope))
+
+
+def viewer_changed(user_id):
+    """Сбрасывает версии отметок пользователя после коммита."""
+    bump_after_commit(VIEWER.format(user_id))
+    transaction.on_commit(partial(bump_state_version, user_id))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipes_changed(**kwargs):
+    bump_after_commit(RECIPES)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(instance, raw=False, **kwargs):
+    previous = getattr(instance, 'saved_image', '')
+    if raw or instance.image.name == previous:
+        return
+    acquire(instance.image.name)
+    release([previous])
+    instance.saved_image = instance.image.name
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_image_deleted(instance, **kwargs):
+    release([getattr(instance, 'saved_image', instance.image.name)])
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    log_recipes([instance.pk])
+    if created:
+        publish_event(AUTHOR_CHANNEL.format(instance.author_id), {
+            'type': Change.RECIPE, 'id': instance.pk,
+            'author': instance.author_id,
+        })
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(instance, **kwargs):
+    log_recipes([instance.pk], deleted=True)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Subscription)
+def mark_saved(instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        log_mark(instance)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Subscription)
+def mark_deleted(instance, **kwargs):
+    log_mark(instance, deleted=True)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=User)
+def catalog_changed(**kwargs):
+    bump_after_commit(CATALOG)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredients_changed(**kwargs):
+    bump_after_commit(INGREDIENTS)
+
+
+@receiver(post_save, sender=User)
+def user_changed(update_fields=None, **kwargs):
+    # Вход пользователя обновляет только last_login, на выдачу это не влияет.
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        bump_after_commit(CATALOG)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def viewer_state_changed(instance, **kwargs):
+    viewer_changed(instance.user_id)
+
+
+def card_recipes(instance):
+    """Рецепты, в карточках которых есть тег, ингредиент или автор."""
+    if isinstance(instance, Tag):
+        return Recipe.objects.filter(tags=instance)
+    if isinstance(instance, Ingredient):
+        return Recipe.objects.filter(recipeingredients__ingredient=instance)
+    return Recipe.objects.filter(author=instance)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def card_source_saved(instance, created=False, raw=False, **kwargs):
+    if not created and not raw:
+        rebuild_cards(card_recipes(instance))
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def card_source_deleting(instance, **kwargs):
+    # После удаления связи с рецептами уже не найти.
+    instance.card_recipe_ids = list(
+        card_recipes(instance).values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def card_source_deleted(instance, **kwargs):
+    rebuild_cards(Recipe.objects.filter(
+        id__in=getattr(instance, 'card_recipe_ids', ())))
+
+
+@receiver(post_save, sender=User)
+def card_author_saved(instance, created=False, raw=False,
+                      update_fields=None, **kwargs):
+    if created or raw:
+        return
+    if update_fields is None or set(update_fields) & set(AUTHOR_FIELDS):
+        rebuild_cards(card_recipes(instance))
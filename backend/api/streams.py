@@ -0,0 +1,156 @@
+import asyncio
+import secrets
+from urllib.parse import parse_qs
+
+import orjson
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+
+from api.changes import DELETE
+from api.events import AUTHOR_CHANNEL, USER_CHANNEL, get_broker
+from recipes.models import Change
+from users.models import Subscription, User
+
+EVENTS_PATH = '/api/events/'
+TICKET_KEY = 'events:ticket:{}'
+
+
+def issue_ticket(user_id):
+    """Одноразовый билет на подключение к потоку событий.
+
+    EventSource в браузере не умеет отправлять заголовки, а токен в
+    параметре запроса остался бы в журналах прокси и истории браузера.
+    Билет получают запросом с токеном, он действует
+    EVENTS_TICKET_SECONDS и только для одного подключения.
+    """
+    ticket = secrets.token_urlsafe(32)
+    cache.set(TICKET_KEY.format(ticket), user_id,
+              settings.EVENTS_TICKET_SECONDS)
+    return ticket
+
+
+def redeem_ticket(ticket):
+    key = TICKET_KEY.format(ticket)
+    user_id = cache.get(key)
+    # Из параллельных подключений с одним билетом delete() вернёт True
+    # только одному.
+    if user_id is None or not cache.delete(key):
+        return None
+    return user_id
+
+
+def get_credentials(scope):
+    """Токен из заголовка Authorization и билет из параметра ticket."""
+    token = None
+    for name, value in scope['headers']:
+        if name == b'authorization':
+            keyword, _, key = value.decode('latin-1').partition(' ')
+            if keyword == 'Token':
+                token = key.strip()
+    query = parse_qs(scope['query_string'].decode('latin-1'))
+    return token, query.get('ticket', [None])[0]
+
+
+@sync_to_async
+def authenticate(token, ticket):
+    """Пользователь по токену или билету и id авторов из его подписок."""
+    close_old_connections()
+    try:
+        users = User.objects.filter(is_active=True)
+        if token:
+            users = users.filter(auth_token__key=token)
+        else:
+            users = users.filter(pk=redeem_ticket(ticket))
+        user_id = users.values_list('id', flat=True).first()
+        if user_id is None:
+            return None, ()
+        return user_id, tuple(Subscription.objects.filter(
+            user_id=user_id).values_list('author_id', flat=True))
+    finally:
+        close_old_connections()
+
+
+def encode(event):
+    return (b'event: ' + event['type'].encode() + b'\ndata: '
+            + orjson.dumps(event) + b'\n\n')
+
+
+async def wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def respond(send, status, body=b''):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json')]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def events_application(scope, receive, send):
+    """Поток server-sent events для авторизованного пользователя.
+
+    Отправляет новые рецепты авторов из подписок и изменения избранного,
+    корзины и подписок, сделанные в других вкладках и сессиях. Соединение
+    - корутина, ожидающая очередь, поэтому простаивающие клиенты не
+    занимают потоков, а воркеры WSGI API их вовсе не обслуживают.
+    """
+    if scope['method'] != 'GET':
+        return await respond(send, 405)
+    token, ticket = get_credentials(scope)
+    user_id, following = (await authenticate(token, ticket)
+                          if token or ticket else (None, ()))
+    if user_id is None:
+        return await respond(
+            send, 401, b'{"detail":"Authentication credentials were not '
+                       b'provided."}'
+        )
+    listener = get_broker().listen()
+    await listener.add(USER_CHANNEL.format(user_id))
+    for author_id in following:
+        await listener.add(AUTHOR_CHANNEL.format(author_id))
+    disconnected = asyncio.ensure_future(wait_disconnect(receive))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        await send({'type': 'http.response.body',
+                    'body': b'retry: 5000\n\n', 'more_body': True})
+        while True:
+            event = asyncio.ensure_future(listener.get())
+            done, _ = await asyncio.wait(
+                {event, disconnected}, timeout=settings.EVENTS_HEARTBEAT,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if disconnected in done:
+                event.cancel()
+                break
+            if event not in done:
+                event.cancel()
+                # Комментарий не даёт прокси закрыть простаивающее
+                # соединение.
+                chunk = b': ping\n\n'
+            else:
+                event = event.result()
+                if event['type'] == Change.SUBSCRIPTION:
+                    channel = AUTHOR_CHANNEL.format(event['id'])
+                    if event['action'] == DELETE:
+                        await listener.discard(channel)
+                    else:
+                        await listener.add(channel)
+                chunk = encode(event)
+            await send({'type': 'http.response.body', 'body': chunk,
+                        'more_body': True})
+    except OSError:
+        # Клиент ушёл во время отправки.
+        pass
+    finally:
+        disconnected.cancel()
+        await listener.close()
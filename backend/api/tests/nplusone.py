@@ -0,0 +1,50 @@
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from api.nplusone import detect_n_plus_one
+from api.urls import v1_router
+
+
+class NPlusOneTestMixin:
+    """Примесь к TestCase: GET-эндпоинты API без N+1.
+
+    Тест заполняет базу в setUpTestData, например командой
+    seed_benchmark_data с небольшими числами, и вызывает
+    assertEndpointsWithoutNPlusOne(). Эндпоинты берутся из роутера
+    api.urls, для детальных подставляется первый объект вьюсета.
+    """
+    nplusone_threshold = None
+    nplusone_params = {'limit': 20}
+
+    def get_api_endpoints(self):
+        for _, viewset, basename in v1_router.registry:
+            for route in v1_router.get_routes(viewset):
+                action = dict(route.mapping).get('get')
+                if action is None or not hasattr(viewset, action):
+                    continue
+                name = route.name.format(basename=basename)
+                if not route.detail:
+                    yield reverse(name)
+                    continue
+                instance = viewset.queryset.order_by('pk').first()
+                if instance is None:
+                    continue
+                lookup = viewset.lookup_url_kwarg or viewset.lookup_field
+                yield reverse(name, kwargs={
+                    lookup: getattr(instance, viewset.lookup_field)
+                })
+
+    def assertNoNPlusOne(self, label=''):
+        return detect_n_plus_one(label, self.nplusone_threshold,
+                                 raise_error=True)
+
+    def assertEndpointsWithoutNPlusOne(self, user=None):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        for url in self.get_api_endpoints():
+            with self.subTest(url=url):
+                with self.assertNoNPlusOne(f'GET {url}'):
+                    response = client.get(url, self.nplusone_params)
+                # 401 анонимному пользователю - тоже проверенный ответ.
+                self.assertLess(response.status_code, 500, url)
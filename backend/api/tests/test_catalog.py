@@ -0,0 +1,94 @@
+import gzip
+
+import brotli
+import orjson
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api import catalog
+from api.serializers import IngredientSerializer
+from api.tests.utils import CacheResetMixin, create_ingredient
+from recipes.models import Ingredient
+
+URL = '/api/ingredients/'
+DECOMPRESS = {
+    'br': brotli.decompress,
+    'gzip': gzip.decompress,
+    'identity': bytes,
+}
+
+
+class IngredientCatalogTests(CacheResetMixin, TestCase):
+    """Готовый каталог ингредиентов в трёх кодировках."""
+
+    def setUp(self):
+        super().setUp()
+        catalog._local.clear()
+        for name in ('соль', 'сахар', 'мука'):
+            create_ingredient(name)
+        self.client = APIClient(HTTP_HOST='127.0.0.1')
+
+    def get(self, accept_encoding='', **headers):
+        return self.client.get(URL, HTTP_ACCEPT_ENCODING=accept_encoding,
+                               **headers)
+
+    def decoded(self, response):
+        encoding = response.headers.get('Content-Encoding', 'identity')
+        return orjson.loads(DECOMPRESS[encoding](response.content))
+
+    def test_encoding_choice(self):
+        for accept_encoding, expected in (
+                ('gzip, deflate, br', 'br'),
+                ('gzip;q=1.0, identity; q=0.5', 'gzip'),
+                ('deflate', None),
+                ('', None)):
+            with self.subTest(accept_encoding=accept_encoding):
+                response = self.get(accept_encoding)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.headers.get('Content-Encoding'),
+                                 expected)
+
+    def test_etag_per_encoding(self):
+        etags = set()
+        for accept_encoding in ('br', 'gzip', ''):
+            response = self.get(accept_encoding)
+            self.assertIn('Accept-Encoding', response.headers['Vary'])
+            etags.add(response.headers['ETag'])
+            self.assertFalse(response.headers['ETag'].startswith('W/'))
+        self.assertEqual(len(etags), 3)
+
+    def test_not_modified(self):
+        etag = self.get('gzip')['ETag']
+        response = self.get('gzip', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        # ETag другой кодировки не подходит.
+        self.assertEqual(self.get('br', HTTP_IF_NONE_MATCH=etag).status_code,
+                         200)
+
+    def test_body_matches_serializer(self):
+        expected = orjson.loads(orjson.dumps(IngredientSerializer(
+            Ingredient.objects.all(), many=True).data))
+        for accept_encoding in ('br', 'gzip', ''):
+            with self.subTest(accept_encoding=accept_encoding):
+                self.assertEqual(self.decoded(self.get(accept_encoding)),
+                                 expected)
+
+    def test_warm_hit_without_queries(self):
+        self.get('br')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get('br').status_code, 200)
+        # Другой процесс: каталог из общего кэша, тоже без запросов.
+        catalog._local.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get('gzip').status_code, 200)
+
+    def test_rebuilt_after_version_bump(self):
+        before = self.get('br')
+        with self.captureOnCommitCallbacks(execute=True):
+            create_ingredient('перец')
+        after = self.get('br', HTTP_IF_NONE_MATCH=before['ETag'])
+        self.assertEqual(after.status_code, 200)
+        self.assertNotEqual(after['ETag'], before['ETag'])
+        self.assertIn('перец', [ingredient['name']
+                                for ingredient in self.decoded(after)])
@@ -0,0 +1,100 @@
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api.deletion import delete_recipes
+from api.tests.utils import (CacheResetMixin, create_ingredient,
+                             create_recipe, create_tag, create_user)
+from recipes.models import Change, Favorite, Recipe
+
+URL = '/api/changes/'
+
+
+class ChangeFeedTests(CacheResetMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.author = create_user('author')
+        self.viewer = create_user('viewer')
+        self.tag = create_tag('breakfast')
+        self.ingredient = create_ingredient('Мука')
+        self.recipe = create_recipe(self.author, tags=[self.tag],
+                                    ingredients=[(self.ingredient, 100)])
+        self.client = APIClient(HTTP_HOST='127.0.0.1')
+        self.client.force_authenticate(self.viewer)
+
+    def cursor(self):
+        return self.client.get(URL).json()['cursor']
+
+    def changes(self, since):
+        response = self.client.get(URL, {'since': since})
+        self.assertEqual(response.status_code, 200)
+        return {(change['type'], change['id']): change
+                for change in response.json()['changes']}
+
+    def test_invalid_cursor(self):
+        for since in ('²', '1', '1.²', '-1.2', 'a.b', '1.2.3', ''):
+            with self.subTest(since=since):
+                response = self.client.get(URL, {'since': since})
+                self.assertEqual(response.status_code, 400)
+
+    def test_changes_are_visible_immediately(self):
+        since = self.cursor()
+        recipe = create_recipe(self.author, 'Новый')
+        change = self.changes(since)[(Change.RECIPE, recipe.id)]
+        self.assertEqual(change['action'], 'upsert')
+        self.assertEqual(change['data']['name'], 'Новый')
+
+    def test_card_rebuilds_are_logged(self):
+        """Рецепт попадает в ленту при правке тега, ингредиента и автора."""
+        key = (Change.RECIPE, self.recipe.id)
+        since = self.cursor()
+        self.tag.name = 'Завтрак'
+        self.tag.save()
+        data = self.changes(since)[key]['data']
+        self.assertEqual(data['tags'][0]['name'], 'Завтрак')
+
+        since = self.cursor()
+        self.ingredient.name = 'Мука пшеничная'
+        self.ingredient.save()
+        data = self.changes(since)[key]['data']
+        self.assertEqual(data['ingredients'][0]['name'], 'Мука пшеничная')
+
+        since = self.cursor()
+        self.author.first_name = 'Автор'
+        self.author.save()
+        data = self.changes(since)[key]['data']
+        self.assertEqual(data['author']['first_name'], 'Автор')
+
+    def test_chunked_delete_logs_marks(self):
+        Favorite.objects.create(user=self.viewer, recipe=self.recipe)
+        since = self.cursor()
+        delete_recipes(Recipe.objects.filter(pk=self.recipe.pk))
+        changes = self.changes(since)
+        self.assertEqual(
+            changes[(Change.RECIPE, self.recipe.id)]['action'], 'delete')
+        self.assertEqual(
+            changes[(Change.FAVORITE, self.recipe.id)]['action'], 'delete')
+
+    @override_settings(CHANGES_PAGE_SIZE=2)
+    def test_pages(self):
+        since = self.cursor()
+        recipes = [create_recipe(self.author, f'Рецепт {number}')
+                   for number in range(3)]
+        seen = set()
+        pages = 0
+        has_more = True
+        while has_more:
+            response = self.client.get(URL, {'since': since}).json()
+            self.assertLessEqual(len(response['changes']), 2)
+            seen.update(change['id'] for change in response['changes'])
+            since, has_more = response['cursor'], response['has_more']
+            pages += 1
+        self.assertGreater(pages, 1)
+        self.assertEqual(seen, {recipe.id for recipe in recipes})
+
+    def test_pruned_cursor_expired(self):
+        since = self.cursor()
+        create_recipe(self.author, 'Новый')
+        Change.objects.filter(id=int(since.split('.')[1])).delete()
+        response = self.client.get(URL, {'since': since})
+        self.assertEqual(response.status_code, 410)
@@ -0,0 +1,161 @@
+import random
+from unittest import mock
+
+from django.test import TransactionTestCase
+from rest_framework.test import APIClient
+
+from api.read_models import rebuild_cards
+from api.tests.utils import (CacheResetMixin, create_recipe, create_tag,
+                             create_user)
+from api.views import RecipeViewSet
+from recipes.models import Favorite, Recipe, ShoppingCart
+
+STEPS = 60
+
+
+class ConditionalGetConsistencyTests(CacheResetMixin, TransactionTestCase):
+    """Записи вперемешку с условными GET не дают устаревших ответов.
+
+    TransactionTestCase нужен, чтобы записи коммитились и версии
+    обновлялись в on_commit, как в работающем приложении. После
+    каждого GET ответ сверяется с БД: 304 допустим, только если данные
+    не изменились с прошлого ответа, а тело 200 должно совпадать с БД.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.author = create_user('author')
+        self.viewer = create_user('viewer')
+        self.tags = [create_tag('breakfast'), create_tag('dinner')]
+        self.recipes = [
+            create_recipe(self.author, f'Рецепт {number}', self.tags[:1])
+            for number in range(3)
+        ]
+        self.client = APIClient(HTTP_HOST='127.0.0.1')
+        self.client.force_authenticate(self.viewer)
+        self.random = random.Random(0)
+        self.etags = {}
+        self.bodies = {}
+
+    def expected(self, path):
+        """Что должен видеть зритель по данным в БД."""
+        favorites = set(Favorite.objects.filter(
+            user=self.viewer).values_list('recipe_id', flat=True))
+        carts = set(ShoppingCart.objects.filter(
+            user=self.viewer).values_list('recipe_id', flat=True))
+        recipes = Recipe.objects.order_by('id')
+        if path != '/api/recipes/':
+            recipes = recipes.filter(pk=int(path.split('/')[-2]))
+        return [
+            (recipe.id, recipe.name, recipe.id in favorites,
+             recipe.id in carts,
+             sorted(tag.name for tag in recipe.tags.all()))
+            for recipe in recipes
+        ]
+
+    @staticmethod
+    def observed(data):
+        recipes = data['results'] if 'results' in data else [data]
+        return sorted(
+            (recipe['id'], recipe['name'], recipe['is_favorited'],
+             recipe['is_in_shopping_cart'],
+             sorted(tag['name'] for tag in recipe['tags']))
+            for recipe in recipes
+        )
+
+    def conditional_get(self, path):
+        headers = {}
+        if path in self.etags:
+            headers['HTTP_IF_NONE_MATCH'] = self.etags[path]
+        response = self.client.get(path, **headers)
+        expected = self.expected(path)
+        if response.status_code == 304:
+            self.assertEqual(self.bodies[path], expected,
+                             f'stale 304 for {path}')
+            return
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.observed(response.json()), expected,
+                         f'stale body for {path}')
+        self.etags[path] = response['ETag']
+        self.bodies[path] = expected
+
+    def toggle_favorite(self):
+        """Зритель через API: ViewerState правится на месте."""
+        recipe = self.random.choice(self.recipes)
+        path = f'/api/recipes/{recipe.id}/favorite/'
+        if Favorite.objects.filter(user=self.viewer, recipe=recipe).exists():
+            self.client.delete(path)
+        else:
+            self.client.post(path)
+
+    def toggle_cart_elsewhere(self):
+        """Тот же пользователь с другого устройства, мимо этого клиента."""
+        recipe = self.random.choice(self.recipes)
+        deleted, _ = ShoppingCart.objects.filter(
+            user=self.viewer, recipe=recipe).delete()
+        if not deleted:
+            ShoppingCart.objects.create(user=self.viewer, recipe=recipe)
+
+    def rename_recipe(self):
+        recipe = self.random.choice(self.recipes)
+        recipe.name = f'Рецепт {self.random.randrange(1000)}'
+        recipe.save()
+
+    def rename_tag(self):
+        tag = self.random.choice(self.tags)
+        tag.name = f'Тег {self.random.randrange(1000)}'
+        tag.save()
+
+    def retag_recipe(self):
+        """Как при сохранении рецепта сериализатором."""
+        recipe = self.random.choice(self.recipes)
+        recipe.tags.set(self.random.sample(
+            self.tags, self.random.randint(0, len(self.tags))))
+        recipe.save()
+        rebuild_cards(Recipe.objects.filter(pk=recipe.pk))
+
+    def test_interleaved_writes_and_conditional_gets(self):
+        paths = ['/api/recipes/', *(f'/api/recipes/{recipe.id}/'
+                                    for recipe in self.recipes)]
+        writes = [self.toggle_favorite, self.toggle_cart_elsewhere,
+                  self.rename_recipe, self.rename_tag, self.retag_recipe]
+        for path in paths:
+            self.conditional_get(path)
+        for _ in range(STEPS):
+            self.random.choice(writes)()
+            for path in self.random.sample(paths, 2):
+                self.conditional_get(path)
+        for path in paths:
+            self.conditional_get(path)
+
+    def test_write_during_get_does_not_pin_stale_etag(self):
+        """Запись между расчётом валидаторов и чтением данных.
+
+        Ответ может оказаться новее своего ETag, но следующий условный
+        GET с этим ETag обязан вернуть 200, а не закрепить устаревшее.
+        """
+        get_validators = RecipeViewSet.get_validators
+        writes = iter([self.toggle_cart_elsewhere, self.rename_tag])
+
+        def racing_validators(view):
+            validators = get_validators(view)
+            next(writes, lambda: None)()
+            return validators
+
+        path = f'/api/recipes/{self.recipes[0].id}/'
+        for current in ('/api/recipes/', path):
+            with mock.patch.object(RecipeViewSet, 'get_validators',
+                                   racing_validators):
+                response = self.client.get(current)
+            self.assertEqual(response.status_code, 200)
+            response = self.client.get(
+                current, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(self.observed(response.json()),
+                             self.expected(current))
+
+    def test_unchanged_data_is_not_modified(self):
+        self.conditional_get('/api/recipes/')
+        response = self.client.get(
+            '/api/recipes/', HTTP_IF_NONE_MATCH=self.etags['/api/recipes/'])
+        self.assertEqual(response.status_code, 304)
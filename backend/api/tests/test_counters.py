@@ -0,0 +1,102 @@
+import importlib.util
+import os
+from unittest import mock
+
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.tests.utils import CacheResetMixin, create_recipe, create_user
+from api.versions import CATALOG, RECIPES, get_versions
+from recipes import counters
+from recipes.counters import ViewCounter
+from recipes.models import Change, Recipe
+
+
+def load_gunicorn_config():
+    spec = importlib.util.spec_from_file_location(
+        'gunicorn_config', settings.BASE_DIR / 'gunicorn.conf.py'
+    )
+    module = importlib.util.module_from_spec(spec)
+    with mock.patch.dict(os.environ, GUNICORN_WORKERS='1'):
+        spec.loader.exec_module(module)
+    return module
+
+
+class ViewCounterTests(CacheResetMixin, TestCase):
+    """Буфер просмотров без фонового потока: потоки подменены."""
+
+    def setUp(self):
+        super().setUp()
+        author = create_user('author')
+        self.recipes = [create_recipe(author, f'Рецепт {number}')
+                        for number in range(3)]
+        thread = mock.patch.object(counters.threading, 'Thread')
+        self.thread = thread.start()
+        self.addCleanup(thread.stop)
+        self.counter = ViewCounter()
+
+    def views(self):
+        return list(Recipe.objects.order_by('id').values_list(
+            'views', flat=True))
+
+    def test_flush_is_one_update(self):
+        first, second, third = (recipe.id for recipe in self.recipes)
+        for recipe_id in (first, first, first, second, second, second,
+                          third):
+            self.counter.add(recipe_id)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.counter.flush(), 3)
+        self.assertEqual(len(queries), 1)
+        self.assertTrue(queries[0]['sql'].startswith('UPDATE'))
+        self.assertEqual(self.views(), [3, 3, 1])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.counter.flush(), 0)
+
+    @override_settings(VIEW_COUNTER_MAX_PENDING=3)
+    def test_wakeup_when_full(self):
+        for _ in range(2):
+            self.counter.add(self.recipes[0].id)
+        self.assertFalse(self.counter.wakeup.is_set())
+        self.counter.add(self.recipes[1].id)
+        self.assertTrue(self.counter.wakeup.is_set())
+
+    def test_reset_after_fork(self):
+        self.counter.add(self.recipes[0].id)
+        self.counter.add(self.recipes[0].id)
+        self.assertEqual(self.thread.call_count, 1)
+        with mock.patch.object(counters.os, 'getpid',
+                               return_value=os.getpid() + 1):
+            self.counter.add(self.recipes[1].id)
+        self.assertEqual(self.thread.call_count, 2)
+        self.assertEqual(dict(self.counter.pending),
+                         {self.recipes[1].id: 1})
+        self.assertEqual(self.counter.size, 1)
+
+    def test_worker_exit_flushes(self):
+        config = load_gunicorn_config()
+        with mock.patch.object(counters, 'view_counter', self.counter):
+            self.counter.add(self.recipes[2].id)
+            config.worker_exit(None, None)
+        self.assertEqual(self.views(), [0, 0, 1])
+        self.assertFalse(self.counter.pending)
+
+    def test_views_do_not_touch_recipe(self):
+        recipe = self.recipes[0]
+        client = APIClient(HTTP_HOST='127.0.0.1')
+        path = f'/api/recipes/{recipe.id}/'
+        changes = Change.objects.count()
+        versions = get_versions(RECIPES, CATALOG)
+        with mock.patch('api.views.view_counter', self.counter), \
+                self.captureOnCommitCallbacks(execute=True):
+            etag = client.get(path)['ETag']
+            self.counter.flush()
+            response = client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        updated = Recipe.objects.get(pk=recipe.pk)
+        self.assertEqual(updated.views, 1)
+        self.assertEqual(updated.updated, recipe.updated)
+        self.assertEqual(Change.objects.count(), changes)
+        self.assertEqual(get_versions(RECIPES, CATALOG), versions)
@@ -0,0 +1,129 @@
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.deletion import delete_user
+from api.tests.utils import (IMAGE, CacheResetMixin, create_ingredient,
+                             create_recipe, create_tag, create_user)
+from api.versions import RECIPES, VIEWER, get_version
+from api.viewer_state import get_state_version
+from recipes.models import (Change, Favorite, ImageBlob, Recipe,
+                            RecipeIngredient, ShoppingCart)
+from users.models import Subscription, User
+
+
+class DeleteRecipeTests(CacheResetMixin, TestCase):
+    """Удаление рецепта через API и админку убирает все связи."""
+
+    def setUp(self):
+        super().setUp()
+        self.author = create_user('author')
+        self.viewer = create_user('viewer')
+        ingredient = create_ingredient('соль')
+        self.recipe, self.kept = (
+            create_recipe(self.author, name, [create_tag(slug)],
+                          [(ingredient, 5)])
+            for name, slug in (('Суп', 'soup'), ('Каша', 'porridge'))
+        )
+        for model in (Favorite, ShoppingCart):
+            model.objects.bulk_create(
+                model(user=self.viewer, recipe=recipe)
+                for recipe in (self.recipe, self.kept)
+            )
+
+    def assertDeleted(self, delete):
+        versions = (get_version(RECIPES),
+                    get_version(VIEWER.format(self.viewer.id)),
+                    get_state_version(self.viewer.id))
+        references = ImageBlob.objects.get(name=IMAGE).references
+        with self.captureOnCommitCallbacks(execute=True):
+            delete()
+        self.assertFalse(Recipe.objects.filter(pk=self.recipe.pk).exists())
+        for model in (Favorite, ShoppingCart, RecipeIngredient):
+            self.assertFalse(
+                model.objects.filter(recipe_id=self.recipe.pk).exists())
+            self.assertTrue(
+                model.objects.filter(recipe_id=self.kept.pk).exists())
+        self.assertEqual(
+            set(Change.objects.filter(
+                object_id=self.recipe.pk, deleted=True
+            ).values_list('kind', 'user_id')),
+            {(Change.RECIPE, None),
+             (Change.FAVORITE, self.viewer.id),
+             (Change.SHOPPING_CART, self.viewer.id)}
+        )
+        for before, after in zip(versions, (
+                get_version(RECIPES),
+                get_version(VIEWER.format(self.viewer.id)),
+                get_state_version(self.viewer.id))):
+            self.assertGreater(after, before)
+        self.assertEqual(ImageBlob.objects.get(name=IMAGE).references,
+                         references - 1)
+
+    def test_api(self):
+        client = APIClient(HTTP_HOST='127.0.0.1')
+        client.force_authenticate(self.author)
+
+        def delete():
+            response = client.delete(f'/api/recipes/{self.recipe.pk}/')
+            self.assertEqual(response.status_code, 204)
+
+        self.assertDeleted(delete)
+
+    def test_admin_action(self):
+        client = Client(HTTP_HOST='127.0.0.1')
+        client.force_login(User.objects.create_superuser(
+            email='admin@example.com', username='admin', password='admin',
+            first_name='Admin', last_name='Test'
+        ))
+
+        def delete():
+            response = client.post('/admin/recipes/recipe/', {
+                'action': 'delete_selected',
+                '_selected_action': [self.recipe.pk],
+                'post': 'yes',
+            })
+            self.assertEqual(response.status_code, 302)
+
+        self.assertDeleted(delete)
+
+
+class DeleteUserTests(CacheResetMixin, TestCase):
+
+    @override_settings(DELETE_CHUNK_SIZE=2)
+    def test_cascades_in_chunks(self):
+        user = create_user('author')
+        other = create_user('other')
+        recipes = [create_recipe(user, f'Рецепт {number}')
+                   for number in range(5)]
+        others = [create_recipe(other, f'Чужой {number}')
+                  for number in range(3)]
+        for model in (Favorite, ShoppingCart):
+            model.objects.bulk_create(
+                [model(user=other, recipe=recipe) for recipe in recipes]
+                + [model(user=user, recipe=recipe) for recipe in others]
+            )
+        Subscription.objects.create(user=user, author=other)
+        Subscription.objects.create(user=other, author=user)
+        with CaptureQueriesContext(connection) as queries, \
+                self.captureOnCommitCallbacks(execute=True):
+            delete_user(user)
+        recipe_deletes = [
+            query for query in queries
+            if query['sql'].startswith(
+                f'DELETE FROM "{Recipe._meta.db_table}"')
+        ]
+        self.assertEqual(len(recipe_deletes), 3)
+        self.assertFalse(User.objects.filter(pk=user.pk).exists())
+        self.assertEqual(Recipe.objects.count(), len(others))
+        for model in (Favorite, ShoppingCart):
+            self.assertFalse(model.objects.exists())
+        self.assertFalse(Subscription.objects.exists())
+        self.assertEqual(Change.objects.filter(
+            kind=Change.RECIPE, deleted=True).count(), 5)
+        self.assertEqual(
+            Change.objects.filter(kind=Change.FAVORITE, deleted=True,
+                                  user_id=other.id).count(), 5)
+        self.assertEqual(ImageBlob.objects.get(name=IMAGE).references,
+                         len(others))
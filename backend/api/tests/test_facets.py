@@ -0,0 +1,100 @@
+from collections import Counter
+from unittest import mock
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api import facets
+from api.tests.utils import (CacheResetMixin, create_recipe, create_tag,
+                             create_user)
+from recipes.models import Favorite
+
+URL = '/api/recipes/'
+
+
+class FacetTests(CacheResetMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.author = create_user('author')
+        other = create_user('other')
+        self.viewer = create_user('viewer')
+        breakfast, dinner, lunch = (create_tag(slug) for slug in
+                                    ('breakfast', 'dinner', 'lunch'))
+        self.breakfast = breakfast
+        recipes = [
+            create_recipe(self.author, 'Омлет', [breakfast], cooking_time=10),
+            create_recipe(self.author, 'Каша', [breakfast, dinner],
+                          cooking_time=20),
+            create_recipe(other, 'Суп', [dinner], cooking_time=45),
+            create_recipe(other, 'Жаркое', [lunch], cooking_time=200),
+        ]
+        Favorite.objects.bulk_create(
+            Favorite(user=self.viewer, recipe=recipe)
+            for recipe in recipes[::2]
+        )
+        self.client = APIClient(HTTP_HOST='127.0.0.1')
+        self.client.force_authenticate(self.viewer)
+
+    def get(self, **params):
+        response = self.client.get(
+            URL, {'facets': 'tags,cooking_time', 'limit': 100, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    @staticmethod
+    def tag_counts(data):
+        return {tag['slug']: tag['count'] for tag in data['facets']['tags']}
+
+    def test_counts_match_list(self):
+        for params in ({}, {'author': self.author.id},
+                       {'is_favorited': 1}):
+            with self.subTest(params=params):
+                data = self.get(**params)
+                self.assertEqual(self.tag_counts(data), Counter(
+                    tag['slug'] for recipe in data['results']
+                    for tag in recipe['tags']
+                ))
+                self.assertEqual(
+                    sum(bucket['count']
+                        for bucket in data['facets']['cooking_time']),
+                    data['count']
+                )
+
+    def test_cooking_time_buckets(self):
+        self.assertEqual(
+            [bucket['count']
+             for bucket in self.get()['facets']['cooking_time']],
+            [1, 1, 1, 0, 1]
+        )
+
+    def test_tags_filter_keeps_tag_counts(self):
+        data = self.get(tags='breakfast')
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(self.tag_counts(data),
+                         {'breakfast': 2, 'dinner': 2, 'lunch': 1})
+        self.assertEqual(
+            sum(bucket['count']
+                for bucket in data['facets']['cooking_time']),
+            2
+        )
+
+    def test_equivalent_queries_share_cache(self):
+        with mock.patch.object(facets, 'tag_counts',
+                               wraps=facets.tag_counts) as counts:
+            self.client.get(URL + '?facets=tags&tags=dinner&tags=breakfast'
+                                  '&is_favorited=1')
+            self.client.get(URL + '?facets=tags&tags=breakfast&tags=dinner'
+                                  '&is_favorited=true&ordering=popular')
+        self.assertEqual(counts.call_count, 1)
+
+    def test_version_bump_invalidates(self):
+        self.assertEqual(self.tag_counts(self.get())['breakfast'], 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            create_recipe(self.author, 'Блины', [self.breakfast])
+        self.assertEqual(self.tag_counts(self.get())['breakfast'], 3)
+
+    def test_unknown_facet(self):
+        response = self.client.get(URL, {'facets': 'tags,calories'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('calories', response.json()['facets'][0])
@@ -0,0 +1,60 @@
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api.guardrails import TIMEOUTS, count
+from api.pagination import CustomizedPaginator
+from api.tests.utils import CacheResetMixin, create_recipe, create_user
+
+
+class PageQueryTests(CacheResetMixin, TestCase):
+
+    def test_invalid_page(self):
+        create_recipe(create_user('author'))
+        client = APIClient(HTTP_HOST='127.0.0.1')
+        for page in ('²', '٣', '-1', 'a'):
+            with self.subTest(page=page):
+                response = client.get('/api/recipes/', {'page': page})
+                self.assertEqual(response.status_code, 404)
+
+    def test_limit_clamped(self):
+        author = create_user('author')
+        for number in range(3):
+            create_recipe(author, f'Рецепт {number}')
+        client = APIClient(HTTP_HOST='127.0.0.1')
+        with mock.patch.object(CustomizedPaginator, 'max_page_size', 2):
+            for ordering in ({}, {'ordering': 'popular'}):
+                with self.subTest(ordering=ordering):
+                    response = client.get('/api/recipes/',
+                                          {'limit': 1000000, **ordering})
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(len(response.json()['results']), 2)
+                    self.assertIsNotNone(response.json()['next'])
+
+
+class GuardrailStatsTests(SimpleTestCase):
+
+    def test_refuses_process_local_cache(self):
+        with self.assertRaisesMessage(CommandError, 'REDIS_URL'):
+            call_command('guardrail_stats', stdout=StringIO())
+
+    def test_shared_cache(self):
+        location = tempfile.TemporaryDirectory()
+        self.addCleanup(location.cleanup)
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': location.name,
+        }}):
+            count(TIMEOUTS, 'recipes-list')
+            count(TIMEOUTS, 'recipes-list')
+            output = StringIO()
+            call_command('guardrail_stats', '--reset', stdout=output)
+            self.assertRegex(output.getvalue(),
+                             r'recipes-list\s+timeouts\s+2')
+            output = StringIO()
+            call_command('guardrail_stats', stdout=output)
+            self.assertIn('No timeouts', output.getvalue())
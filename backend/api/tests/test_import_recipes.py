@@ -0,0 +1,74 @@
+import os
+import tempfile
+from io import StringIO
+
+import orjson
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from api.tests.utils import CacheResetMixin, create_user
+from recipes.models import ImageBlob, Recipe
+
+
+def exported(name, image):
+    return {
+        'author': {'email': 'author@example.com', 'username': 'author',
+                   'first_name': 'Author', 'last_name': 'Test'},
+        'name': name, 'text': 'Текст', 'cooking_time': 10, 'image': image,
+        'tags': [], 'ingredients': [],
+    }
+
+
+class ImportRecipesTests(CacheResetMixin, TestCase):
+    """Импорт без --media-root и повторный запуск того же файла."""
+
+    def setUp(self):
+        super().setUp()
+        create_user('author')
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        os.makedirs(os.path.join(media.name, 'recipes'))
+        with open(os.path.join(media.name, 'recipes', 'found.png'),
+                  'wb') as file:
+            file.write(b'png')
+        rows = [
+            exported('Есть картинка', 'recipes/found.png'),
+            exported('Нет картинки', 'recipes/lost.png'),
+            exported('Есть картинка', 'recipes/found.png'),
+        ]
+        source = tempfile.NamedTemporaryFile(suffix='.ndjson', delete=False)
+        self.addCleanup(os.remove, source.name)
+        with source:
+            source.write(b''.join(orjson.dumps(row) + b'\n' for row in rows))
+        self.path = source.name
+
+    def import_recipes(self):
+        output = StringIO()
+        call_command('import_recipes', self.path, stdout=output,
+                     stderr=StringIO())
+        return output.getvalue()
+
+    def test_missing_image_skipped(self):
+        output = self.import_recipes()
+        self.assertIn('Imported 1 recipes', output)
+        self.assertIn('Skipped 1: missing image', output)
+        self.assertIn('Skipped 1: already imported', output)
+        self.assertEqual(
+            list(Recipe.objects.values_list('name', 'image')),
+            [('Есть картинка', 'recipes/found.png')]
+        )
+        self.assertEqual(
+            list(ImageBlob.objects.values_list('name', 'references')),
+            [('recipes/found.png', 1)]
+        )
+
+    def test_rerun_imports_nothing(self):
+        self.import_recipes()
+        output = self.import_recipes()
+        self.assertIn('Imported 0 recipes', output)
+        self.assertIn('Skipped 2: already imported', output)
+        self.assertEqual(Recipe.objects.count(), 1)
+        self.assertEqual(
+            ImageBlob.objects.get(name='recipes/found.png').references, 1
+        )
@@ -0,0 +1,114 @@
+from unittest import skipIf
+
+from django.db import connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.marks import add_mark, remove_mark
+from api.tests.utils import (CacheResetMixin, concurrently, create_recipe,
+                             create_user)
+from recipes.models import Change, Favorite, Recipe, ShoppingCart
+from users.models import Subscription
+
+THREADS = 6
+
+
+class MarkConcurrencyTests(CacheResetMixin, TransactionTestCase):
+    """Повторные и параллельные отметки не заканчиваются ошибкой 500.
+
+    TransactionTestCase: запросы из потоков идут через свои соединения и
+    видят только закоммиченные данные, как параллельные воркеры.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.author = create_user('author')
+        self.viewer = create_user('viewer')
+        self.recipe = create_recipe(self.author)
+        self.marks = (
+            (f'/api/recipes/{self.recipe.id}/favorite/', Favorite),
+            (f'/api/recipes/{self.recipe.id}/shopping_cart/', ShoppingCart),
+            (f'/api/users/{self.author.id}/subscribe/', Subscription),
+        )
+
+    def client_for(self, user):
+        client = APIClient(HTTP_HOST='127.0.0.1')
+        client.force_authenticate(user)
+        return client
+
+    def request(self, method, path, user=None):
+        def send():
+            client = self.client_for(user or self.viewer)
+            return getattr(client, method)(path).status_code
+        return send
+
+    def mark_changes(self):
+        return Change.objects.exclude(kind=Change.RECIPE).count()
+
+    def test_double_click(self):
+        client = self.client_for(self.viewer)
+        for path, model in self.marks:
+            with self.subTest(path=path):
+                statuses = [client.post(path).status_code for _ in range(2)]
+                self.assertEqual(statuses, [201, 400])
+                self.assertEqual(model.objects.count(), 1)
+                statuses = [client.delete(path).status_code
+                            for _ in range(2)]
+                self.assertEqual(statuses, [204, 400])
+                self.assertFalse(model.objects.exists())
+        # Журнал: по одной записи на каждое настоящее изменение.
+        self.assertEqual(self.mark_changes(), 6)
+
+    def test_concurrent_toggles(self):
+        for path, model in self.marks:
+            with self.subTest(path=path):
+                statuses = concurrently(
+                    *[self.request('post', path)] * THREADS)
+                self.assertEqual(sorted(statuses),
+                                 [201] + [400] * (THREADS - 1))
+                self.assertEqual(model.objects.count(), 1)
+                statuses = concurrently(
+                    *[self.request('delete', path)] * THREADS)
+                self.assertEqual(sorted(statuses),
+                                 [204] + [400] * (THREADS - 1))
+                self.assertFalse(model.objects.exists())
+        self.assertEqual(self.mark_changes(), 6)
+
+    # SQLite не поднимает блокировку чтения до записи при параллельном
+    # писателе и отвечает 'database is locked', проверка для PostgreSQL.
+    @skipIf(connection.vendor == 'sqlite', 'SQLite serializes writers')
+    def test_add_while_target_deleted(self):
+        path = f'/api/recipes/{self.recipe.id}/favorite/'
+        viewers = [create_user(f'viewer{number}')
+                   for number in range(THREADS - 1)]
+        statuses = concurrently(
+            self.request('delete', f'/api/recipes/{self.recipe.id}/',
+                         self.author),
+            *[self.request('post', path, viewer) for viewer in viewers]
+        )
+        self.assertEqual(statuses[0], 204)
+        self.assertLessEqual(set(statuses[1:]), {201, 404})
+        self.assertFalse(Recipe.objects.exists())
+        self.assertFalse(Favorite.objects.exists())
+
+    def test_missing_target(self):
+        client = self.client_for(self.viewer)
+        response = client.post(
+            f'/api/recipes/{self.recipe.id + 100}/favorite/')
+        self.assertEqual(response.status_code, 404)
+        response = client.post('/api/users/1000/subscribe/')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Favorite.objects.exists())
+        self.assertEqual(self.mark_changes(), 0)
+
+    def test_single_statement(self):
+        """Отметка пишется и снимается одним запросом к своей таблице."""
+        table = Favorite._meta.db_table
+        for toggle in (add_mark, remove_mark):
+            with self.subTest(toggle=toggle.__name__):
+                with CaptureQueriesContext(connection) as queries:
+                    self.assertTrue(toggle(Favorite, self.viewer.id,
+                                           recipe_id=self.recipe.id))
+                self.assertEqual(
+                    sum(table in query['sql'] for query in queries), 1)
@@ -0,0 +1,72 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.tests.nplusone import NPlusOneTestMixin
+from api.tests.utils import (CacheResetMixin, create_ingredient,
+                             create_recipe, create_tag, create_user)
+from recipes.models import Favorite, ShoppingCart
+from users.models import Subscription
+
+AUTHORS = 8
+RECIPES_PER_AUTHOR = 3
+
+
+class NPlusOneTests(NPlusOneTestMixin, CacheResetMixin, TestCase):
+    """Число запросов не растёт с числом рецептов и авторов на странице.
+
+    Данных больше порога NPLUSONE_THRESHOLD, поэтому запрос на строку
+    повторился бы достаточно раз, чтобы его заметить.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = create_user('viewer')
+        tags = [create_tag('breakfast'), create_tag('dinner')]
+        ingredients = [create_ingredient('Мука'), create_ingredient('Соль')]
+        for number in range(AUTHORS):
+            author = create_user(f'author{number}')
+            Subscription.objects.create(user=cls.viewer, author=author)
+            for index in range(RECIPES_PER_AUTHOR):
+                recipe = create_recipe(
+                    author, f'Рецепт {number}-{index}', tags,
+                    [(ingredient, 10) for ingredient in ingredients]
+                )
+                Favorite.objects.create(user=cls.viewer, recipe=recipe)
+                ShoppingCart.objects.create(user=cls.viewer, recipe=recipe)
+        cls.recipe = recipe
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient(HTTP_HOST='127.0.0.1')
+        self.client.force_authenticate(self.viewer)
+
+    def get(self, url, params=None):
+        with self.assertNoNPlusOne(f'GET {url}'):
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_recipe_list(self):
+        data = self.get('/api/recipes/', {'limit': 20})
+        self.assertEqual(len(data['results']), 20)
+
+    def test_recipe_detail(self):
+        data = self.get(f'/api/recipes/{self.recipe.id}/')
+        self.assertEqual(len(data['ingredients']), 2)
+
+    def test_subscriptions(self):
+        data = self.get('/api/users/subscriptions/',
+                        {'limit': AUTHORS, 'recipes_limit': 2})
+        self.assertEqual(len(data['results']), AUTHORS)
+        self.assertTrue(all(len(author['recipes']) == 2
+                            for author in data['results']))
+
+    def test_invalid_recipes_limit(self):
+        data = self.get('/api/users/subscriptions/',
+                        {'limit': AUTHORS, 'recipes_limit': '²'})
+        self.assertTrue(all(len(author['recipes']) == RECIPES_PER_AUTHOR
+                            for author in data['results']))
+
+    def test_all_endpoints(self):
+        self.assertEndpointsWithoutNPlusOne(self.viewer)
+        self.assertEndpointsWithoutNPlusOne()
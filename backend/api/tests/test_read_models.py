@@ -0,0 +1,93 @@
+from django.test import TestCase
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+
+from api.read_models import RecipeListReadModel
+from api.serializers import RecipeGetSerializer
+from api.tests.utils import (CacheResetMixin, create_ingredient,
+                             create_recipe, create_tag, create_user)
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscription
+
+
+class RecipeListReadModelTests(CacheResetMixin, TestCase):
+    """Read-модель списка совпадает с RecipeGetSerializer."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.viewer = create_user('viewer')
+        breakfast, dinner = create_tag('breakfast'), create_tag('dinner')
+        milk, salt = create_ingredient('молоко', 'мл'), create_ingredient(
+            'соль')
+        cls.favorited = create_recipe(cls.author, 'Каша', [breakfast],
+                                      [(milk, 200), (salt, 5)])
+        cls.in_cart = create_recipe(cls.author, 'Суп', [dinner, breakfast],
+                                    [(salt, 10)])
+        cls.plain = create_recipe(cls.viewer, 'Омлет')
+        Favorite.objects.create(user=cls.viewer, recipe=cls.favorited)
+        ShoppingCart.objects.create(user=cls.viewer, recipe=cls.in_cart)
+        Subscription.objects.create(user=cls.viewer, author=cls.author)
+
+    def request(self, user=None):
+        request = APIRequestFactory().get('/api/recipes/')
+        if user is not None:
+            force_authenticate(request, user)
+        return APIView().initialize_request(request)
+
+    def serializer_data(self, request):
+        return RecipeGetSerializer(
+            Recipe.objects.order_by('id'), many=True,
+            context={'request': request}
+        ).data
+
+    def read_model_data(self, request, fields=None):
+        read_model = RecipeListReadModel(request, fields)
+        return read_model.build(
+            read_model.get_rows(Recipe.objects.order_by('id'))
+        )
+
+    def assertParity(self, request):
+        expected = [dict(recipe) for recipe in self.serializer_data(request)]
+        self.assertEqual(self.read_model_data(request), expected)
+
+    def test_anonymous(self):
+        self.assertParity(self.request())
+        for recipe in self.read_model_data(self.request()):
+            self.assertFalse(recipe['is_favorited'])
+            self.assertFalse(recipe['is_in_shopping_cart'])
+            self.assertFalse(recipe['author']['is_subscribed'])
+
+    def test_authenticated(self):
+        self.assertParity(self.request(self.viewer))
+        recipes = {recipe['id']: recipe
+                   for recipe in self.read_model_data(
+                       self.request(self.viewer))}
+        flags = {
+            recipe_id: (recipe['is_favorited'],
+                        recipe['is_in_shopping_cart'],
+                        recipe['author']['is_subscribed'])
+            for recipe_id, recipe in recipes.items()
+        }
+        self.assertEqual(flags, {
+            self.favorited.id: (True, False, True),
+            self.in_cart.id: (False, True, True),
+            self.plain.id: (False, False, False),
+        })
+
+    def test_other_user_sees_own_flags(self):
+        self.assertParity(self.request(self.author))
+        for recipe in self.read_model_data(self.request(self.author)):
+            self.assertFalse(recipe['is_favorited'])
+            self.assertFalse(recipe['is_in_shopping_cart'])
+
+    def test_missing_card_is_built_on_the_fly(self):
+        Recipe.objects.update(card={})
+        self.assertParity(self.request(self.viewer))
+
+    def test_requested_fields(self):
+        request = self.request(self.viewer)
+        fields = {'id', 'name', 'is_in_shopping_cart'}
+        expected = [{field: recipe[field] for field in fields}
+                    for recipe in self.serializer_data(request)]
+        self.assertEqual(self.read_model_data(request, fields), expected)
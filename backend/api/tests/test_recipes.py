@@ -0,0 +1,107 @@
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
+
+from django.db import connection
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.tests.utils import CacheResetMixin, create_recipe, create_user
+from recipes.models import Recipe
+
+URL = '/api/recipes/'
+
+
+class RecipeIdsTests(CacheResetMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        author = create_user('author')
+        self.recipes = [create_recipe(author, f'Рецепт {number}')
+                        for number in range(3)]
+        self.client = APIClient(HTTP_HOST='127.0.0.1')
+
+    def test_order_and_missing(self):
+        first, _, last = (recipe.id for recipe in self.recipes)
+        response = self.client.get(URL, {'ids': f'{last}, {first},0,{last}'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([recipe['id'] for recipe in data['results']],
+                         [last, first])
+        self.assertEqual(data['missing'], [0])
+
+    def test_invalid_ids(self):
+        for ids in ('²', '٣', '1,a', '-1', '1,,2'):
+            with self.subTest(ids=ids):
+                response = self.client.get(URL, {'ids': ids})
+                self.assertEqual(response.status_code, 400)
+
+
+class RecipeReplicaPinTests(CacheResetMixin, TestCase):
+
+    def test_pin_is_decided_before_reading_updated(self):
+        recipe = create_recipe(create_user('author'))
+        events = []
+
+        def record_query(execute, sql, params, many, context):
+            if '"updated"' in sql:
+                events.append('updated')
+            return execute(sql, params, many, context)
+
+        with mock.patch('api.views.read_recent_from_primary',
+                        side_effect=lambda changed: events.append('pin')):
+            with connection.execute_wrapper(record_query):
+                response = APIClient(HTTP_HOST='127.0.0.1').get(
+                    f'{URL}{recipe.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(events[:2], ['pin', 'updated'])
+
+
+class PopularityPaginationTests(CacheResetMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        author = create_user('author')
+        self.recipes = [create_recipe(author, f'Рецепт {number}')
+                        for number in range(5)]
+        # Две пары с одинаковой популярностью: порядок внутри по id.
+        for recipe, popularity in zip(self.recipes, (1, 3, 3, 0.5, 0.5)):
+            Recipe.objects.filter(pk=recipe.pk).update(popularity=popularity)
+        self.client = APIClient(HTTP_HOST='127.0.0.1')
+
+    def get_page(self, after=None):
+        params = {'ordering': 'popular', 'limit': 2}
+        if after is not None:
+            params['after'] = after
+        response = self.client.get(URL, params)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        after = None
+        if data['next']:
+            after = parse_qs(urlsplit(data['next']).query)['after'][0]
+        return [recipe['id'] for recipe in data['results']], after
+
+    def test_pages_follow_popularity_order(self):
+        expected = list(Recipe.objects.order_by(
+            '-popularity', '-id').values_list('id', flat=True))
+        seen, after = self.get_page()
+        while after:
+            page, after = self.get_page(after)
+            seen += page
+        self.assertEqual(seen, expected)
+
+    def test_cursor_keeps_position_when_popularity_changes(self):
+        expected = list(Recipe.objects.order_by(
+            '-popularity', '-id').values_list('id', flat=True))
+        first, after = self.get_page()
+        # Последний рецепт страницы поднимается наверх до запроса
+        # следующей: страница продолжается с прежней позиции.
+        Recipe.objects.filter(pk=first[-1]).update(popularity=100)
+        second, _ = self.get_page(after)
+        self.assertEqual(second, expected[2:4])
+
+    def test_invalid_cursor(self):
+        for after in ('²', '12', 'abc', 'WzFd', 'WyJhIiwxXQ'):
+            with self.subTest(after=after):
+                response = self.client.get(
+                    URL, {'ordering': 'popular', 'after': after})
+                self.assertEqual(response.status_code, 400)
@@ -0,0 +1,46 @@
+from contextlib import contextmanager
+from unittest import mock
+
+from django.db import DEFAULT_DB_ALIAS
+from django.test import SimpleTestCase, override_settings
+
+from api import replicas
+
+REPLICA = 'replica_1'
+
+
+class FakeReplica:
+    vendor = 'postgresql'
+
+    def __init__(self, lag):
+        self.lag = lag
+
+    def ensure_connection(self):
+        pass
+
+    @contextmanager
+    def cursor(self):
+        cursor = mock.Mock()
+        cursor.fetchone.return_value = (self.lag,)
+        yield cursor
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA], REPLICA_MAX_LAG_SECONDS=5)
+class ReplicaLagTests(SimpleTestCase):
+
+    def setUp(self):
+        replicas._down_until.clear()
+        replicas._lag_checked_until.clear()
+
+    def pick(self, lag):
+        with mock.patch.object(replicas, 'connections',
+                               {REPLICA: FakeReplica(lag)}):
+            return replicas.pick_replica()
+
+    def test_caught_up_replica_is_used(self):
+        self.assertEqual(self.pick(0), REPLICA)
+
+    def test_lagging_replica_is_skipped(self):
+        self.assertEqual(self.pick(12.5), DEFAULT_DB_ALIAS)
+        # До конца REPLICA_RETRY_SECONDS реплика не проверяется снова.
+        self.assertEqual(self.pick(0), DEFAULT_DB_ALIAS)
@@ -0,0 +1,68 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api import search
+from api.search import search_ingredients
+from api.tests.utils import CacheResetMixin, create_ingredient
+
+NAMES = ('сгущенное молоко', 'молоко', 'молоко кокосовое', 'масло сливочное',
+         'мука', 'соль')
+
+
+class IngredientSearchTests(CacheResetMixin, TestCase):
+    """Нечёткий поиск через search_fallback: тесты идут на SQLite."""
+
+    def setUp(self):
+        super().setUp()
+        for name in NAMES:
+            create_ingredient(name)
+
+    def names(self, term, limit=None):
+        return [ingredient.name
+                for ingredient in search_ingredients(term, limit)]
+
+    def test_prefix_first(self):
+        self.assertEqual(
+            self.names('молоко'),
+            ['молоко', 'молоко кокосовое', 'сгущенное молоко']
+        )
+
+    def test_typo(self):
+        self.assertEqual(self.names('малоко')[:2],
+                         ['молоко', 'молоко кокосовое'])
+        self.assertIn('масло сливочное', self.names('масла'))
+
+    def test_middle_of_name(self):
+        self.assertEqual(self.names('сливочное')[0], 'масло сливочное')
+        self.assertIn('сгущенное молоко', self.names('молоко'))
+
+    def test_limit(self):
+        self.assertEqual(self.names('молоко', limit=1), ['молоко'])
+        with override_settings(INGREDIENT_SEARCH_LIMIT=2):
+            self.assertEqual(len(self.names('молоко')), 2)
+
+    def test_empty_term(self):
+        for term in ('', '   ', '!!!'):
+            with self.subTest(term=term):
+                self.assertEqual(self.names(term), [])
+        response = APIClient(HTTP_HOST='127.0.0.1').get(
+            '/api/ingredients/', {'search': '   '})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), len(NAMES))
+
+    def test_candidates_filtered_in_sql(self):
+        with mock.patch.object(search, 'word_similarity',
+                               wraps=search.word_similarity) as similarity:
+            self.names('молоко')
+        self.assertEqual(
+            sorted(call.args[1] for call in similarity.call_args_list),
+            ['молоко', 'молоко кокосовое', 'сгущенное молоко']
+        )
+
+    def test_api(self):
+        response = APIClient(HTTP_HOST='127.0.0.1').get(
+            '/api/ingredients/', {'search': 'малоко'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['name'], 'молоко')
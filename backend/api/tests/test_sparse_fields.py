@@ -0,0 +1,91 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.tests.utils import (CacheResetMixin, create_ingredient,
+                             create_recipe, create_tag, create_user)
+from recipes.models import Favorite, Recipe
+
+URL = '/api/recipes/'
+
+
+class SparseFieldsTests(CacheResetMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        author = create_user('author')
+        self.viewer = create_user('viewer')
+        tag = create_tag('soup')
+        salt = create_ingredient('соль')
+        self.recipes = [
+            create_recipe(author, f'Рецепт {number}', [tag], [(salt, 5)])
+            for number in range(3)
+        ]
+        Favorite.objects.create(user=self.viewer, recipe=self.recipes[0])
+        self.client = APIClient(HTTP_HOST='127.0.0.1')
+        self.client.force_authenticate(self.viewer)
+        self.detail = f'{URL}{self.recipes[0].id}/'
+
+    def get(self, path, **params):
+        response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_fields_and_omit(self):
+        full = set(self.get(self.detail).json())
+        for params, expected in (
+                ({'fields': 'name,image'}, {'id', 'name', 'image'}),
+                ({'omit': 'ingredients,text'},
+                 full - {'ingredients', 'text'}),
+                ({'fields': 'name,text', 'omit': 'text'}, {'id', 'name'})):
+            with self.subTest(params=params):
+                results = self.get(URL, **params).json()['results']
+                self.assertEqual(len(results), 3)
+                for recipe in results:
+                    self.assertEqual(set(recipe), expected)
+                self.assertEqual(set(self.get(self.detail, **params).json()),
+                                 expected)
+
+    def test_unknown_fields(self):
+        for params in ({'fields': 'name,calories'}, {'omit': 'calories'}):
+            for path in (URL, self.detail):
+                with self.subTest(params=params, path=path):
+                    response = self.client.get(path, params)
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn('calories', response.json()['fields'][0])
+
+    def test_omitted_fields_skip_queries(self):
+        # Карточки не собраны, отметок зрителя нет в кэше: полный список
+        # достраивает и то и другое отдельными запросами.
+        Recipe.objects.update(card={})
+        with CaptureQueriesContext(connection) as queries:
+            self.get(URL)
+        self.assertGreater(len(queries), 2)
+        for params in ({'fields': 'name,cooking_time'},
+                       {'omit': 'tags,author,ingredients,is_favorited,'
+                                'is_in_shopping_cart'}):
+            with self.subTest(params=params):
+                cache.clear()
+                # COUNT и сама страница.
+                with self.assertNumQueries(2):
+                    self.get(URL, **params)
+
+    def test_detail_etag_depends_on_fields(self):
+        full = self.get(self.detail)['ETag']
+        sparse = self.get(self.detail, fields='name,image')['ETag']
+        self.assertNotEqual(full, sparse)
+        self.assertEqual(self.get(self.detail, fields='image,name')['ETag'],
+                         sparse)
+        self.assertEqual(
+            self.get(self.detail, omit='id,tags,author,ingredients,'
+                                       'is_favorited,is_in_shopping_cart,'
+                                       'image_variants,text,cooking_time,'
+                                       'views')['ETag'],
+            sparse
+        )
+        response = self.client.get(self.detail, {'fields': 'name,image'},
+                                   HTTP_IF_NONE_MATCH=full)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()), {'id', 'name', 'image'})
@@ -0,0 +1,81 @@
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.db import transaction
+from django.test import TransactionTestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.events import publisher
+from api.streams import EVENTS_PATH, events_application
+from api.tests.utils import CacheResetMixin, create_recipe, create_user
+from recipes.models import Favorite
+
+
+def open_stream(query=b'', headers=()):
+    """Статус ответа потока; клиент отключается сразу после ответа."""
+    messages = []
+
+    async def receive():
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        messages.append(message)
+
+    async_to_sync(events_application)({
+        'type': 'http', 'method': 'GET', 'path': EVENTS_PATH,
+        'query_string': query, 'headers': list(headers),
+    }, receive, send)
+    return messages[0]['status']
+
+
+class EventStreamAuthTests(CacheResetMixin, TransactionTestCase):
+    """TransactionTestCase: поток читает пользователя из другого потока."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user('viewer')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient(HTTP_HOST='127.0.0.1')
+
+    def issue_ticket(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.post('/api/users/events_ticket/')
+        self.assertEqual(response.status_code, 201)
+        return response.json()['ticket']
+
+    def test_ticket_is_single_use(self):
+        query = f'ticket={self.issue_ticket()}'.encode()
+        self.assertEqual(open_stream(query), 200)
+        self.assertEqual(open_stream(query), 401)
+
+    def test_token_in_query_is_rejected(self):
+        self.assertEqual(open_stream(f'token={self.token.key}'.encode()),
+                         401)
+
+    def test_token_header(self):
+        header = (b'authorization', f'Token {self.token.key}'.encode())
+        self.assertEqual(open_stream(headers=[header]), 200)
+
+    def test_anonymous_cannot_get_ticket(self):
+        response = self.client.post('/api/users/events_ticket/')
+        self.assertEqual(response.status_code, 401)
+
+
+class EventPublishTests(CacheResetMixin, TransactionTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user('viewer')
+        self.recipe = create_recipe(create_user('author'))
+
+    def test_rolled_back_marks_are_not_published(self):
+        with mock.patch.object(publisher, 'put') as put:
+            with self.assertRaises(ValueError):
+                with transaction.atomic():
+                    Favorite.objects.create(user=self.user,
+                                            recipe=self.recipe)
+                    raise ValueError
+            put.assert_not_called()
+            Favorite.objects.create(user=self.user, recipe=self.recipe)
+            put.assert_called_once()
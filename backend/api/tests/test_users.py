@@ -0,0 +1,82 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.tests.utils import CacheResetMixin, create_recipe, create_user
+from users.models import Subscription, User
+
+PAGE = 100
+
+
+class UserListQueryCountTests(CacheResetMixin, TestCase):
+    """Число запросов к БД не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = create_user('viewer')
+        User.objects.bulk_create(
+            User(email=f'author{number}@example.com',
+                 username=f'author{number:03}', first_name='Author',
+                 last_name=str(number), password='!')
+            for number in range(PAGE)
+        )
+        authors = list(User.objects.filter(username__startswith='author'))
+        for author in authors[:10]:
+            for number in range(3):
+                create_recipe(author, f'Рецепт {number}')
+        Subscription.objects.bulk_create(
+            Subscription(user=cls.viewer, author=author)
+            for author in authors
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient(HTTP_HOST='127.0.0.1')
+
+    def get(self, path, queries, **params):
+        with self.assertNumQueries(queries):
+            response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_list_anonymous(self):
+        # COUNT и страница.
+        data = self.get('/api/users/', 2, limit=PAGE)
+        self.assertEqual(len(data['results']), PAGE)
+        self.assertFalse(any(user['is_subscribed']
+                             for user in data['results']))
+
+    def test_list_authenticated(self):
+        self.client.force_authenticate(self.viewer)
+        # COUNT и страница с is_subscribed подзапросом EXISTS.
+        data = self.get('/api/users/', 2, limit=PAGE)
+        subscribed = [user['is_subscribed'] for user in data['results']]
+        self.assertEqual(subscribed.count(True), PAGE)
+
+    def test_list_without_subscription_flag(self):
+        self.client.force_authenticate(self.viewer)
+        self.get('/api/users/', 2, limit=PAGE, omit='is_subscribed')
+
+    def test_retrieve_and_me(self):
+        self.client.force_authenticate(self.viewer)
+        author = User.objects.get(username='author000')
+        self.assertTrue(self.get(f'/api/users/{author.id}/', 1)[
+            'is_subscribed'])
+        self.get('/api/users/me/', 1)
+
+    def test_subscriptions(self):
+        self.client.force_authenticate(self.viewer)
+        # COUNT, страница с recipes_count, рецепты одним запросом на
+        # страницу и загрузка ViewerState для is_subscribed (3 запроса).
+        data = self.get('/api/users/subscriptions/', 6, limit=PAGE,
+                        recipes_limit=2)
+        self.assertEqual(len(data['results']), PAGE)
+        with_recipes = [author for author in data['results']
+                        if author['recipes_count']]
+        self.assertEqual(len(with_recipes), 10)
+        for author in with_recipes:
+            self.assertEqual(author['recipes_count'], 3)
+            self.assertEqual(len(author['recipes']), 2)
+            self.assertTrue(author['is_subscribed'])
+        # Состояние зрителя уже в кэше.
+        self.get('/api/users/subscriptions/', 3, limit=PAGE,
+                 recipes_limit=2)
@@ -0,0 +1,48 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from api.tests.utils import (CacheResetMixin, create_ingredient,
+                             create_recipe, create_tag, create_user)
+from api.versions import (CATALOG, INGREDIENTS, RECIPES, _key,
+                          get_versions)
+
+
+class VersionBumpTests(CacheResetMixin, TestCase):
+    """Версии данных меняются только после коммита записи."""
+    scopes = (RECIPES, CATALOG, INGREDIENTS)
+
+    def setUp(self):
+        super().setUp()
+        cache.set_many({_key(scope): 0 for scope in self.scopes}, None)
+
+    def assertBumpedOnCommit(self, write, scopes):
+        with self.captureOnCommitCallbacks(execute=True):
+            write()
+            self.assertEqual(get_versions(*self.scopes), (0, 0, 0))
+        versions = dict(zip(self.scopes, get_versions(*self.scopes)))
+        for scope in self.scopes:
+            if scope in scopes:
+                self.assertGreater(versions[scope], 0, scope)
+            else:
+                self.assertEqual(versions[scope], 0, scope)
+
+    def test_recipe(self):
+        author = create_user('author')
+        self.assertBumpedOnCommit(lambda: create_recipe(author),
+                                  {RECIPES})
+
+    def test_tag(self):
+        self.assertBumpedOnCommit(lambda: create_tag('tag'), {CATALOG})
+
+    def test_ingredient(self):
+        self.assertBumpedOnCommit(lambda: create_ingredient('соль'),
+                                  {CATALOG, INGREDIENTS})
+
+    def test_user(self):
+        user = create_user('author')
+
+        def rename():
+            user.first_name = 'Renamed'
+            user.save()
+
+        self.assertBumpedOnCommit(rename, {CATALOG})
@@ -0,0 +1,110 @@
+import random
+
+from django.core.cache import cache
+from django.test import TransactionTestCase
+from rest_framework.test import APIClient
+
+from api.tests.utils import (CacheResetMixin, concurrently, create_recipe,
+                             create_user)
+from api.viewer_state import STATE_KEY, ViewerState, get_state_version
+from recipes.models import Favorite, ShoppingCart
+from users.models import Subscription
+
+THREADS = 4
+STEPS = 15
+
+
+class ViewerStateConcurrencyTests(CacheResetMixin, TransactionTestCase):
+    """Закэшированное состояние зрителя после параллельных записей.
+
+    Потоки одного пользователя - как его запросы в разных воркерах:
+    отметки через API правят состояние через apply(), записи мимо API
+    только увеличивают версию. После всех записей загруженное состояние
+    должно совпадать со строками в БД.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.viewer = create_user('viewer')
+        self.authors = [create_user(f'author{number}')
+                        for number in range(2)]
+        self.recipes = [create_recipe(self.authors[0], f'Рецепт {number}')
+                        for number in range(3)]
+        self.paths = [
+            *(f'/api/recipes/{recipe.id}/{action}/'
+              for recipe in self.recipes
+              for action in ('favorite', 'shopping_cart')),
+            *(f'/api/users/{author.id}/subscribe/'
+              for author in self.authors),
+        ]
+
+    def stored(self):
+        return (
+            set(Favorite.objects.filter(
+                user=self.viewer).values_list('recipe_id', flat=True)),
+            set(ShoppingCart.objects.filter(
+                user=self.viewer).values_list('recipe_id', flat=True)),
+            set(Subscription.objects.filter(
+                user=self.viewer).values_list('author_id', flat=True)),
+        )
+
+    def assertStateMatchesDatabase(self):
+        state = ViewerState.load(self.viewer.id)
+        self.assertEqual(
+            (state.favorites, state.shopping_carts, state.following),
+            self.stored()
+        )
+
+    def toggles(self, seed):
+        def run():
+            rng = random.Random(seed)
+            client = APIClient(HTTP_HOST='127.0.0.1')
+            client.force_authenticate(self.viewer)
+            for _ in range(STEPS):
+                path = rng.choice(self.paths)
+                method = rng.choice((client.post, client.delete))
+                self.assertIn(method(path).status_code, (201, 204, 400))
+                # Чтение списка загружает состояние в кэш.
+                self.assertEqual(client.get('/api/recipes/').status_code,
+                                 200)
+        return run
+
+    def writes_elsewhere(self, seed):
+        """Записи мимо API: сигналы только увеличивают версию."""
+        def run():
+            rng = random.Random(seed)
+            for _ in range(STEPS):
+                recipe = rng.choice(self.recipes)
+                deleted, _ = Favorite.objects.filter(
+                    user=self.viewer, recipe=recipe).delete()
+                if not deleted:
+                    Favorite.objects.get_or_create(user=self.viewer,
+                                                   recipe=recipe)
+        return run
+
+    def test_concurrent_toggles(self):
+        concurrently(*(self.toggles(seed) for seed in range(THREADS)))
+        self.assertStateMatchesDatabase()
+
+    def test_concurrent_toggles_and_other_writers(self):
+        concurrently(self.writes_elsewhere(THREADS),
+                     *(self.toggles(seed) for seed in range(THREADS - 1)))
+        self.assertStateMatchesDatabase()
+
+    def test_apply_after_foreign_bump(self):
+        """Между загрузкой состояния и apply() версию поднял другой
+        писатель: apply() не должен записать состояние без его отметки."""
+        client = APIClient(HTTP_HOST='127.0.0.1')
+        client.force_authenticate(self.viewer)
+        client.get('/api/recipes/')
+        loaded = ViewerState.load(self.viewer.id)
+        Favorite.objects.create(user=self.viewer, recipe=self.recipes[0])
+        self.assertEqual(get_state_version(self.viewer.id),
+                         loaded.version + 1)
+        response = client.post(
+            f'/api/recipes/{self.recipes[1].id}/shopping_cart/')
+        self.assertEqual(response.status_code, 201)
+        # Две записи с момента загрузки: состояние сброшено, а не
+        # поправлено на месте без чужой отметки.
+        self.assertIsNone(cache.get(STATE_KEY.format(self.viewer.id)))
+        self.assertStateMatchesDatabase()
@@ -0,0 +1,82 @@
+import threading
+
+from django.core.cache import cache
+from django.db import connection
+
+from api.read_models import rebuild_cards
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import User
+
+IMAGE = 'recipes/test.png'
+
+
+def create_user(name):
+    return User.objects.create_user(
+        email=f'{name}@example.com', username=name, password='password',
+        first_name=name.title(), last_name='Test'
+    )
+
+
+def create_tag(slug):
+    return Tag.objects.create(name=slug.title(), slug=slug,
+                              color=f'#{Tag.objects.count():06X}')
+
+
+def create_ingredient(name, unit='г'):
+    return Ingredient.objects.create(name=name, measurement_unit=unit)
+
+
+def create_recipe(author, name='Рецепт', tags=(), ingredients=(),
+                  cooking_time=10):
+    """Рецепт с тегами и ингредиентами [(ingredient, amount)].
+
+    Файл картинки не создаётся: для выдачи достаточно имени.
+    """
+    recipe = Recipe.objects.create(author=author, name=name, text='Текст',
+                                   image=IMAGE, cooking_time=cooking_time)
+    recipe.tags.set(tags)
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=amount)
+        for ingredient, amount in ingredients
+    )
+    rebuild_cards(Recipe.objects.filter(pk=recipe.pk))
+    return recipe
+
+
+class CacheResetMixin:
+    """Версии и состояния зрителей живут в кэше, а не в тестовой БД."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+
+def concurrently(*functions):
+    """Запускает функции одновременно в потоках и возвращает результаты.
+
+    Барьер выравнивает старт, у каждого потока своё соединение с БД,
+    которое закрывается по завершении. Исключение из потока
+    пробрасывается в тест.
+    """
+    barrier = threading.Barrier(len(functions))
+    results = [None] * len(functions)
+    errors = []
+
+    def run(index, function):
+        try:
+            barrier.wait()
+            results[index] = function()
+        except Exception as error:
+            errors.append(error)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=run, args=item)
+               for item in enumerate(functions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return results
@@ -1,8 +1,8 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import (CustomUserViewSet, IngredientViewSet, RecipeViewSet,
-                    TagViewSet)
+from .views import (ChangeViewSet, CustomUserViewSet, IngredientViewSet,
+                    RecipeViewSet, TagViewSet)
 
 v1_router = DefaultRouter()
 
@@ -10,6 +10,7 @@ v1_router.register('tags', TagViewSet, basename='tags')
 v1_router.register('ingredients', IngredientViewSet, basename='ingredients')
 v1_router.register('recipes', RecipeViewSet, basename='recipes')
 v1_router.register('users', CustomUserViewSet, basename='users')
+v1_router.register('changes', ChangeViewSet, basename='changes')
 
 
 urlpatterns = [
@@ -3,6 +3,16 @@ import base64
 from django.core.files.base import ContentFile
 from rest_framework import serializers
 
+from recipes.models import Recipe
+
+
+def is_number(value):
+    """Только цифры ASCII.
+
+    str.isdigit() пропускает и '²', на котором int() падает.
+    """
+    return value.isascii() and value.isdecimal()
+
 
 class Base64ImageField(serializers.ImageField):
     """Вспомогательный класс для работы с изображениями."""
@@ -13,3 +23,17 @@ class Base64ImageField(serializers.ImageField):
             data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
 
         return super().to_internal_value(data)
+
+
+def variant_urls(variants, request=None):
+    """Ссылки на уменьшенные копии картинки рецепта."""
+    storage = Recipe._meta.get_field('image').storage
+    urls = {}
+    for variant, files in variants.items():
+        urls[variant] = {}
+        for extension, name in files.items():
+            url = storage.url(name)
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            urls[variant][extension] = url
+    return urls
@@ -0,0 +1,42 @@
+import time
+
+from django.core.cache import cache
+
+RECIPES = 'recipes'
+CATALOG = 'catalog'
+INGREDIENTS = 'ingredients'
+VIEWER = 'viewer:{}'
+
+
+def _key(scope):
+    return f'versions:{scope}'
+
+
+def get_version(scope):
+    """Версия набора данных: время последнего изменения в секундах.
+
+    Хранится в общем кэше. Если ключа нет (кэш очищен), версия
+    начинается с текущего момента, что только сбрасывает валидаторы.
+    """
+    version = cache.get(_key(scope))
+    if version is None:
+        cache.add(_key(scope), time.time(), None)
+        version = cache.get(_key(scope))
+    return version
+
+
+def get_versions(*scopes):
+    keys = {_key(scope): scope for scope in scopes}
+    found = cache.get_many(keys)
+    return tuple(
+        found[key] if key in found else get_version(scope)
+        for key, scope in keys.items()
+    )
+
+
+def bump_version(scope):
+    cache.set(_key(scope), time.time(), None)
+
+
+def viewer_scope(user):
+    return VIEWER.format(user.pk) if user.is_authenticated else None
@@ -0,0 +1,116 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from recipes.models import Favorite, ShoppingCart
+from users.models import Subscription
+
+STATE_KEY = 'viewer_state:{}'
+VERSION_KEY = 'viewer_state:{}:version'
+FAVORITES = 'favorites'
+SHOPPING_CARTS = 'shopping_carts'
+FOLLOWING = 'following'
+
+
+def _init_version(user_id):
+    # Счётчик начинается с текущего времени, а не с нуля: если ключ версии
+    # вытеснят из кэша, старое состояние не совпадёт с новым счётчиком.
+    cache.add(VERSION_KEY.format(user_id), time.time_ns() // 1000, None)
+
+
+def get_state_version(user_id):
+    version = cache.get(VERSION_KEY.format(user_id))
+    if version is None:
+        _init_version(user_id)
+        version = cache.get(VERSION_KEY.format(user_id))
+    return version
+
+
+def bump_state_version(user_id):
+    """Атомарно увеличивает версию состояния и возвращает новое значение."""
+    try:
+        return cache.incr(VERSION_KEY.format(user_id))
+    except ValueError:
+        _init_version(user_id)
+        return cache.incr(VERSION_KEY.format(user_id))
+
+
+class ViewerState:
+    """Множества id избранного, корзины и подписок пользователя.
+
+    Хранится в общем кэше вместе с номером версии. Любое изменение
+    Favorite, ShoppingCart или Subscription увеличивает версию (см.
+    api.signals), поэтому состояние с устаревшей версией перечитывается
+    из БД. Вьюхи после своей записи обновляют состояние на месте через
+    apply(), не перечитывая его.
+    """
+
+    def __init__(self, user_id, version, favorites=(), shopping_carts=(),
+                 following=()):
+        self.user_id = user_id
+        self.version = version
+        self.favorites = set(favorites)
+        self.shopping_carts = set(shopping_carts)
+        self.following = set(following)
+
+    @classmethod
+    def load(cls, user_id):
+        # Версию читаем до данных: если между чтениями кто-то изменит
+        # состояние, сохранённая копия окажется устаревшей, а не неверной.
+        version = get_state_version(user_id)
+        state = cache.get(STATE_KEY.format(user_id))
+        if state is not None and state.version == version:
+            return state
+        # Состояние кэшируется под этой версией, поэтому читается из
+        # основной БД: реплика может ещё не получить последнюю отметку.
+        state = cls(
+            user_id, version,
+            favorites=Favorite.objects.using(DEFAULT_DB_ALIAS).filter(
+                user_id=user_id).values_list('recipe_id', flat=True),
+            shopping_carts=ShoppingCart.objects.using(DEFAULT_DB_ALIAS).filter(
+                user_id=user_id).values_list('recipe_id', flat=True),
+            following=Subscription.objects.using(DEFAULT_DB_ALIAS).filter(
+                user_id=user_id).values_list('author_id', flat=True),
+        )
+        state.save()
+        return state
+
+    @classmethod
+    def for_request(cls, request):
+        """Состояние текущего пользователя, одно на запрос."""
+        if not (request and request.user.is_authenticated):
+            return None
+        state = getattr(request, '_viewer_state', None)
+        if state is None:
+            state = cls.load(request.user.pk)
+            request._viewer_state = state
+        return state
+
+    @classmethod
+    def apply(cls, user_id, field, object_id, added):
+        """Обновляет закэшированное состояние после записи в БД.
+
+        Запись уже увеличила версию. Если с момента загрузки состояния
+        версия выросла ровно на единицу, других изменений не было и
+        состояние можно поправить на месте, иначе его перечитает
+        следующий запрос.
+        """
+        state = cache.get(STATE_KEY.format(user_id))
+        if state is None:
+            return
+        if get_state_version(user_id) != state.version + 1:
+            cache.delete(STATE_KEY.format(user_id))
+            return
+        ids = getattr(state, field)
+        if added:
+            ids.add(object_id)
+        else:
+            ids.discard(object_id)
+        state.version += 1
+        state.save()
+
+    def save(self):
+        cache.set(STATE_KEY.format(self.user_id), self,
+                  settings.VIEWER_STATE_TIMEOUT)
@@ -1,32 +1,100 @@
 from django.conf import settings
-from django.db.models import Sum
+from django.db.models import Count, Exists, OuterRef, Prefetch, Sum, Value
+from django.http import Http404
 from django.shortcuts import HttpResponse, get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
-from api.filters import IngredientFilter, RecipeFilter
-from api.pagination import CustomizedPaginator
+from api.catalog import catalog_response
+from api.changes import (CursorExpired, get_changes, latest_cursor,
+                         parse_cursor)
+from api.deletion import delete_recipes, delete_user
+from api.facets import get_facets, parse_facets
+from api.filters import POPULAR, IngredientFilter, RecipeFilter
+from api.marks import add_mark, remove_mark
+from api.mixins import (ConditionalGetMixin, QueryCostMixin,
+                        SparseFieldsMixin)
+from api.pagination import CustomizedPaginator, PopularityPaginator
 from api.permissions import IsAuthorOrAdminOrReadOnly
-from api.serializers import (FavoriteSerializer, IngredientSerializer,
-                             RecipeSerializer, RecipeCreateSerializer,
-                             RecipeGetSerializer, ShoppingCartSerializer,
-                             SubscribeSerializer, SubscribeRepresentSerializer,
-                             TagSerializer, UserSerializer)
+from api.read_models import RecipeListReadModel
+from api.replicas import read_from_primary, read_recent_from_primary
+from api.search import search_ingredients
+from api.serializers import (IngredientSerializer, RecipeSerializer,
+                             RecipeCreateSerializer, RecipeGetSerializer,
+                             SubscribeRepresentSerializer, TagSerializer,
+                             UserSerializer)
+from api.streams import issue_ticket
+from api.utils import is_number
+from api.versions import CATALOG, RECIPES, get_versions, viewer_scope
+from api.viewer_state import FOLLOWING, ViewerState
+from recipes.counters import view_counter
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                             ShoppingCart, Tag)
 from users.models import Subscription, User
 
 
-class CustomUserViewSet(UserViewSet):
+def parse_id(value):
+    """id из URL; нечисловой id означает несуществующий объект."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise Http404
+
+
+def mark_exists_error(message):
+    return ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [message]})
+
+
+class CustomUserViewSet(SparseFieldsMixin, UserViewSet):
     """Вьюсет для кастомной модели пользователя."""
 
     queryset = User.objects.all()
     serializer_class = UserSerializer
     pagination_class = CustomizedPaginator
+    sparse_actions = ('list', 'retrieve', 'me', 'subscriptions')
+
+    def get_queryset(self):
+        """Флаг подписки вычисляется подзапросом, а не запросом на строку.
+
+        Порядок по уникальному username из Meta.ordering стабилен для
+        пагинации и поддерживается индексом.
+        """
+        user = self.request.user
+        if not self.wants('is_subscribed'):
+            return super().get_queryset()
+        if user.is_authenticated:
+            is_subscribed = Exists(Subscription.objects.filter(
+                user=user, author=OuterRef('pk')
+            ))
+        else:
+            is_subscribed = Value(False)
+        return super().get_queryset().annotate(is_subscribed=is_subscribed)
+
+    def get_serializer_class(self):
+        if self.action == 'subscriptions':
+            return SubscribeRepresentSerializer
+        return super().get_serializer_class()
+
+    def get_permissions(self):
+        # djoser проверяет me общими правами user, а с ними анонимный
+        # GET доходил до get_instance() и падал с ошибкой 500.
+        if self.action == 'me':
+            return [IsAuthenticated()]
+        return super().get_permissions()
+
+    def get_instance(self):
+        if self.request.method == 'GET':
+            return self.get_queryset().get(pk=self.request.user.pk)
+        return super().get_instance()
+
+    def perform_destroy(self, instance):
+        delete_user(instance)
 
     @action(
         detail=True,
@@ -35,42 +103,107 @@ class CustomUserViewSet(UserViewSet):
     )
     def subscribe(self, request, **kwargs):
         """Подписка/отписка на пользователя."""
-        author = get_object_or_404(User, id=kwargs['id'])
+        author_id = parse_id(kwargs['id'])
         if request.method == 'POST':
-            serializer = SubscribeSerializer(data={'author': author.id,
-                                                   'user': request.user.id},
-                                             context={'request': request})
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
-            represent_serializer = SubscribeRepresentSerializer(author)
+            if author_id == request.user.id:
+                raise mark_exists_error('Нельзя подписываться на самого себя.')
+            if not add_mark(Subscription, request.user.id,
+                            author_id=author_id):
+                get_object_or_404(User, id=author_id)
+                raise mark_exists_error(
+                    'Вы уже подписаны на этого пользователя'
+                )
+            ViewerState.apply(request.user.id, FOLLOWING, author_id, True)
+            # Автор читается один раз, только для ответа.
+            represent_serializer = SubscribeRepresentSerializer(
+                get_object_or_404(User, id=author_id)
+            )
             return Response(represent_serializer.data,
                             status=status.HTTP_201_CREATED)
-        is_deleted = Subscription.objects.filter(user=request.user,
-                                                 author=author).delete()
-        if is_deleted[0]:
+        if remove_mark(Subscription, request.user.id, author_id=author_id):
+            ViewerState.apply(request.user.id, FOLLOWING, author_id, False)
             return Response(status=status.HTTP_204_NO_CONTENT)
+        get_object_or_404(User, id=author_id)
         return Response({'message':
                          'Нельзя отписаться от несуществующей подписки'},
                         status=status.HTTP_400_BAD_REQUEST)
 
+    @action(
+        detail=False,
+        methods=['POST'],
+        permission_classes=(IsAuthenticated,)
+    )
+    def events_ticket(self, request):
+        """Одноразовый билет для подключения EventSource к /api/events/."""
+        return Response({'ticket': issue_ticket(request.user.id)},
+                        status=status.HTTP_201_CREATED)
+
     @action(
         detail=False,
         methods=['GET'],
         permission_classes=(IsAuthenticated,)
     )
     def subscriptions(self, request):
-        """Список подписок пользователя."""
+        """Список подписок пользователя.
+
+        Количество рецептов считается в том же запросе, а сами рецепты
+        загружаются одним запросом на страницу, а не на каждого автора.
+        """
+        authors = User.objects.filter(following__user=request.user)
+        if self.wants('recipes_count'):
+            # С агрегатом Meta.ordering не применяется, задаём порядок явно.
+            authors = authors.annotate(
+                recipes_count=Count('recipes')
+            ).order_by(*User._meta.ordering)
+        if self.wants('recipes'):
+            recipes = Recipe.objects.all()
+            limit = request.query_params.get('recipes_limit', '')
+            if is_number(limit):
+                recipes = recipes[:int(limit)]
+            authors = authors.prefetch_related(Prefetch(
+                'recipes', queryset=recipes, to_attr='prefetched_recipes'
+            ))
         return self.get_paginated_response(
-            SubscribeRepresentSerializer(
-                self.paginate_queryset(
-                    User.objects.filter(following__user=request.user)
-                ),
+            self.get_serializer(
+                self.paginate_queryset(authors),
                 many=True,
-                context={'request': request},
             ).data
         )
 
 
+class ChangeViewSet(viewsets.ViewSet):
+    """Лента изменений для синхронизации клиентов.
+
+    Без параметра since возвращает текущий курсор, который клиент
+    запоминает после полной загрузки данных. С since - изменения после
+    курсора: рецепты, а для авторизованного пользователя ещё и его
+    избранное, корзина и подписки. Если курсор старше журнала, отвечает
+    410, и клиенту нужно загрузить данные заново.
+    """
+
+    permission_classes = (AllowAny, )
+
+    def list(self, request):
+        # Отстающая реплика может не показать уже отданные другим
+        # клиентам записи, и курсор перескочит через них.
+        read_from_primary()
+        since = request.query_params.get('since')
+        if since is None:
+            return Response({'cursor': latest_cursor(request.user),
+                             'has_more': False, 'changes': []})
+        position = parse_cursor(since)
+        if position is None:
+            raise ValidationError({'since': ['Некорректный курсор.']})
+        try:
+            cursor, has_more, changes = get_changes(request, position)
+        except CursorExpired:
+            return Response({'detail': 'Курсор устарел, загрузите данные '
+                                       'заново.'},
+                            status=status.HTTP_410_GONE)
+        return Response({'cursor': cursor, 'has_more': has_more,
+                         'changes': changes})
+
+
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
     """Получение информации о тегах."""
 
@@ -79,7 +212,7 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = (AllowAny, )
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(QueryCostMixin, viewsets.ReadOnlyModelViewSet):
     """Получение информации об ингредиентах."""
 
     queryset = Ingredient.objects.all()
@@ -88,8 +221,22 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = (DjangoFilterBackend, )
     filterset_class = IngredientFilter
 
+    def list(self, request, *args, **kwargs):
+        # ?search= - нечёткий поиск с опечатками, см. api.search.
+        search = request.query_params.get('search', '').strip()
+        if search:
+            return Response(IngredientSerializer(
+                search_ingredients(search), many=True
+            ).data)
+        # Полный каталог без фильтра отдаётся заранее отрендеренным.
+        if (not request.query_params.get('name')
+                and request.accepted_renderer.format == 'json'):
+            return catalog_response(request)
+        return super().list(request, *args, **kwargs)
+
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalGetMixin, SparseFieldsMixin, QueryCostMixin,
+                    viewsets.ModelViewSet):
     """Этот Viewset обрабатывает: все стандартные методы ModelViewset +
     добавление/удаление рецептов в Избранное + добавление/удаление/скачивание
     Списка Покупок.
@@ -101,24 +248,190 @@ class RecipeViewSet(viewsets.ModelViewSet):
     filter_backends = (DjangoFilterBackend, )
     filterset_class = RecipeFilter
     http_method_names = ['get', 'post', 'create', 'patch', 'delete']
+    # Для списка и рецепта вместо RecipeGetSerializer используется
+    # облегчённая read-модель; None возвращает сериализатор.
+    list_read_model = RecipeListReadModel
+    # Время запроса к БД вместо STATEMENT_TIMEOUT_SECONDS: сумма по
+    # большой корзине покупок законно дольше обычного чтения.
+    statement_timeouts = {'download_shopping_cart': 5}
 
     def get_serializer_class(self):
         if self.action in ('list', 'retrieve'):
             return RecipeGetSerializer
         return RecipeCreateSerializer
 
+    @property
+    def paginator(self):
+        """Для ordering=popular - пагинация по ключу вместо номеров."""
+        if not hasattr(self, '_paginator'):
+            if self.request.query_params.get('ordering') == POPULAR:
+                self._paginator = PopularityPaginator()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def get_validators(self):
+        """Валидаторы для условных GET-запросов списка и рецепта.
+
+        Список зависит от всех рецептов, справочников и отметок текущего
+        пользователя, рецепт - от своего времени изменения вместо общей
+        версии рецептов. У ответов с разными ?fields=/?omit= разные ETag:
+        у списка они входят в путь, у рецепта - отдельной частью.
+        """
+        scopes = [CATALOG]
+        viewer = viewer_scope(self.request.user)
+        if viewer:
+            scopes.append(viewer)
+        if self.action == 'list':
+            versions = get_versions(RECIPES, *scopes)
+            return ((self.request.get_full_path(), viewer, *versions),
+                    max(versions))
+        recipes_version, *versions = get_versions(RECIPES, *scopes)
+        # Версии - из кэша, а updated - из БД. Реплика, отстающая от
+        # только что изменённого рецепта, отдала бы старое updated и
+        # старый ETag, поэтому выбор БД делается до чтения.
+        read_recent_from_primary(max(recipes_version, *versions))
+        try:
+            updated = Recipe.objects.filter(
+                pk=self.kwargs[self.lookup_field]
+            ).values_list('updated', flat=True).first()
+        except ValueError:
+            return None
+        if updated is None:
+            return None
+        fields = self.get_requested_fields()
+        fields = ','.join(sorted(fields)) if fields is not None else '*'
+        return ((self.kwargs[self.lookup_field], updated.timestamp(),
+                 viewer, fields, *versions),
+                max(updated.timestamp(), *versions))
+
+    def retrieve(self, request, *args, **kwargs):
+        response = self.retrieve_recipe(request, *args, **kwargs)
+        # Ответ 304 - тоже просмотр: клиент открыл рецепт из своего кэша.
+        view_counter.add(parse_id(self.kwargs[self.lookup_field]))
+        return response
+
+    def retrieve_recipe(self, request, *args, **kwargs):
+        not_modified = self.get_conditional_response(request)
+        if not_modified is not None:
+            return not_modified
+        if self.list_read_model is None:
+            return super().retrieve(request, *args, **kwargs)
+        read_model = self.list_read_model(
+            request, self.get_requested_fields()
+        )
+        recipes = read_model.build(read_model.get_rows(
+            self.filter_queryset(self.get_queryset()).filter(
+                pk=parse_id(self.kwargs[self.lookup_field])
+            )
+        ))
+        if not recipes:
+            raise Http404
+        return Response(recipes[0])
+
+    def list(self, request, *args, **kwargs):
+        """Список рецептов; с ?facets= ещё и счётчики по фасетам.
+
+        Фасеты считаются по тем же фильтрам, что и список, и
+        добавляются в ответ ключом facets.
+        """
+        not_modified = self.get_conditional_response(request)
+        if not_modified is not None:
+            return not_modified
+        if 'ids' in request.query_params:
+            return self.list_by_ids(request)
+        facets = parse_facets(request.query_params.get('facets', ''))
+        if self.list_read_model is None:
+            response = super().list(request, *args, **kwargs)
+        else:
+            read_model = self.list_read_model(
+                request, self.get_requested_fields()
+            )
+            rows = read_model.get_rows(
+                self.filter_queryset(self.get_queryset())
+            )
+            page = self.paginate_queryset(rows)
+            if page is not None:
+                response = self.get_paginated_response(read_model.build(page))
+            else:
+                response = Response(read_model.build(rows))
+        if facets and isinstance(response.data, dict):
+            response.data['facets'] = get_facets(request, self, facets)
+        return response
+
+    @staticmethod
+    def parse_ids(value):
+        ids = []
+        for part in value.split(','):
+            if not is_number(part.strip()):
+                raise ValidationError({'ids': [f'Некорректный id: {part}.']})
+            if int(part) not in ids:
+                ids.append(int(part))
+        if len(ids) > settings.RECIPE_IDS_LIMIT:
+            raise ValidationError({'ids': [
+                f'Не больше {settings.RECIPE_IDS_LIMIT} рецептов за запрос.'
+            ]})
+        return ids
+
+    def list_by_ids(self, request):
+        """Рецепты по списку id (?ids=1,2,3) одним ответом.
+
+        Рецепты возвращаются в порядке запроса без пагинации, id
+        несуществующих или не прошедших фильтры рецептов - в missing.
+        """
+        ids = self.parse_ids(request.query_params['ids'])
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            id__in=ids
+        )
+        if self.list_read_model is None:
+            recipes = self.get_serializer(queryset, many=True).data
+        else:
+            read_model = self.list_read_model(
+                request, self.get_requested_fields()
+            )
+            recipes = read_model.build(read_model.get_rows(queryset))
+        found = {recipe['id']: recipe for recipe in recipes}
+        return Response({
+            'results': [found[pk] for pk in ids if pk in found],
+            'missing': [pk for pk in ids if pk not in found],
+        })
+
+    def perform_destroy(self, instance):
+        delete_recipes(Recipe.objects.filter(pk=instance.pk))
+
     @staticmethod
-    def add(serializer, request, pk):
-        recipe = get_object_or_404(Recipe, id=pk)
-        suitable_serializer = serializer(data={'user': request.user.id,
-                                               'recipe': recipe.id, },
-                                         context={"request": request})
-        suitable_serializer.is_valid(raise_exception=True)
-        suitable_serializer.save()
-        represent_serializer = RecipeSerializer(recipe)
+    def add(model, request, pk, message):
+        """Добавляет рецепт в избранное или корзину.
+
+        Повтор и несуществующий рецепт различаются отдельным запросом
+        только после отказа add_mark, а после успеха рецепт читается
+        один раз, для ответа.
+        """
+        recipe_id = parse_id(pk)
+        if not add_mark(model, request.user.id, recipe_id=recipe_id):
+            get_object_or_404(Recipe, id=recipe_id)
+            raise mark_exists_error(message)
+        ViewerState.apply(request.user.id, model._meta.default_related_name,
+                          recipe_id, True)
+        represent_serializer = RecipeSerializer(
+            get_object_or_404(Recipe, id=recipe_id)
+        )
         return Response(represent_serializer.data,
                         status=status.HTTP_201_CREATED)
 
+    @staticmethod
+    def remove(model, request, pk, message):
+        """Удаляет рецепт из избранного или корзины."""
+        recipe_id = parse_id(pk)
+        if remove_mark(model, request.user.id, recipe_id=recipe_id):
+            ViewerState.apply(request.user.id,
+                              model._meta.default_related_name,
+                              recipe_id, False)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        get_object_or_404(Recipe, id=recipe_id)
+        return Response({'message': message},
+                        status=status.HTTP_400_BAD_REQUEST)
+
     @action(
         detail=True,
         methods=['post', ],
@@ -126,17 +439,13 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def favorite(self, request, pk):
         """Удалить/добавить в избранное."""
-        return self.add(FavoriteSerializer, request, pk)
+        return self.add(Favorite, request, pk,
+                        'Рецепт уже добавлен в избранное')
 
     @favorite.mapping.delete
     def destroy_favorite(self, request, pk):
-        is_deleted = Favorite.objects.filter(user=request.user,
-                                             recipe=get_object_or_404(
-                                                 Recipe, id=pk)).delete()
-        if is_deleted[0]:
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        return Response({'message': 'Рецепт не был добавлен в избранное'},
-                        status=status.HTTP_400_BAD_REQUEST)
+        return self.remove(Favorite, request, pk,
+                           'Рецепт не был добавлен в избранное')
 
     @action(
         detail=True,
@@ -145,17 +454,13 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def shopping_cart(self, request, pk):
         """Удалить/добавить в список покупок."""
-        return self.add(ShoppingCartSerializer, request, pk)
+        return self.add(ShoppingCart, request, pk,
+                        'Рецепт уже добавлен в список покупок')
 
     @shopping_cart.mapping.delete
     def destroy_shopping_cart(self, request, pk):
-        is_deleted = ShoppingCart.objects.filter(user=request.user,
-                                                 recipe=get_object_or_404(
-                                                     Recipe, id=pk)).delete()
-        if is_deleted[0]:
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        return Response({'message': 'Рецепт не был добавлен в корзину'},
-                        status=status.HTTP_400_BAD_REQUEST)
+        return self.remove(ShoppingCart, request, pk,
+                           'Рецепт не был добавлен в корзину')
 
     @staticmethod
     def get_file(ingredients):
@@ -13,4 +13,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Импорт после настройки Django: модулю нужны загруженные модели.
+from api.streams import EVENTS_PATH, events_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """Поток событий обслуживается без middleware Django, остальное - им."""
+    if scope['type'] == 'http' and scope['path'] == EVENTS_PATH:
+        await events_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
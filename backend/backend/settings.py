@@ -12,8 +12,42 @@ PASSWORD_LENGTH = 150
 ADMIN_EMPTY_VALUE = '-empty-'
 FILE_NAME = 'shopping_cart.txt'
 PAGE_SIZE = 6
+# Больший ?limit= урезается: statement_timeout не ограничивает сериализацию.
+PAGE_MAX_SIZE = 100
+RECIPE_IDS_LIMIT = 100
 TAG_MAX_LENGTH = 50
 INGREDIENT_MAX_LENGTH = 50
+VIEWER_STATE_TIMEOUT = 60 * 60 * 24
+DELETE_CHUNK_SIZE = 1000
+CARD_REBUILD_CHUNK_SIZE = 500
+IMAGE_VARIANT_WORKERS = 2
+IMAGE_VARIANT_SWEEP_MINUTES = 10
+IMAGE_GARBAGE_GRACE_HOURS = 24
+CHANGES_PAGE_SIZE = 500
+CHANGES_RETENTION_DAYS = 30
+EVENTS_HEARTBEAT = 15
+EVENTS_QUEUE_SIZE = 100
+EVENTS_PUBLISH_QUEUE_SIZE = 1000
+EVENTS_TICKET_SECONDS = 30
+REPLICA_PIN_SECONDS = 10
+REPLICA_RETRY_SECONDS = 30
+REPLICA_MAX_LAG_SECONDS = 5
+REPLICA_LAG_CHECK_SECONDS = 5
+RANKING_HALF_LIFE_DAYS = 7
+RANKING_WINDOW_DAYS = 60
+RANKING_FAVORITE_WEIGHT = 2
+RANKING_SHOPPING_CART_WEIGHT = 1
+NPLUSONE_THRESHOLD = 5
+NPLUSONE_RAISE = False
+FACETS_CACHE_SECONDS = 60
+FACET_COOKING_TIME_BUCKETS = (15, 30, 60, 120)
+IMPORT_CHUNK_SIZE = 500
+IMPORT_IMAGE_WORKERS = 8
+VIEW_COUNTER_FLUSH_SECONDS = 10
+VIEW_COUNTER_MAX_PENDING = 1000
+INGREDIENT_SEARCH_LIMIT = 20
+INGREDIENT_SEARCH_THRESHOLD = 0.3
+STATEMENT_TIMEOUT_SECONDS = 2
 
 AUTH_USER_MODEL = 'users.User'
 
@@ -54,6 +88,9 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.replicas.ReplicaMiddleware',
+    'api.guardrails.StatementTimeoutMiddleware',
+    'api.nplusone.NPlusOneMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -93,6 +130,53 @@ DATABASES = {
     }
 }
 
+# Реплики для чтения: DB_REPLICA_HOSTS - хосты через запятую, остальные
+# параметры подключения такие же, как у основной БД.
+DATABASES.update({
+    f'replica_{number}': {
+        **DATABASES['default'],
+        'HOST': host.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    for number, host in enumerate(
+        filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), 1
+    )
+})
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+
+# Предельная оценка EXPLAIN для списков с фильтрами, без неё проверка
+# стоимости выключена, см. api.guardrails.
+QUERY_COST_LIMIT = float(os.getenv('QUERY_COST_LIMIT', 0)) or None
+
+
+# Общий кэш для версий данных и других кэшей между воркерами.
+# Без REDIS_URL (локальная разработка) кэш живёт в памяти процесса, и
+# gunicorn.conf.py откажется запускать больше одного воркера, а
+# guardrail_stats - показывать счётчики из чужих процессов.
+
+REDIS_URL = os.getenv('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# События для SSE: через Redis, если он есть, иначе в памяти процесса.
+EVENTS_BROKER = ('api.events.RedisBroker' if REDIS_URL
+                 else 'api.events.InProcessBroker')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -155,6 +239,17 @@ REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
+
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 CORS_ALLOWED_ORIGINS = [
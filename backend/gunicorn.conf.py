@@ -0,0 +1,157 @@
+"""Профиль gunicorn для продакшена.
+
+Количество воркеров и потоков считается по доступным ядрам и лимиту памяти
+контейнера, приложение загружается и прогревается в мастер-процессе до
+форка, после чего gc.freeze() оставляет прогретые объекты общими для
+воркеров (copy-on-write). Воркер, превысивший потолок памяти, завершается
+после текущего запроса и перезапускается мастером.
+"""
+import gc
+import logging
+import multiprocessing
+import os
+import time
+
+logger = logging.getLogger('gunicorn.error')
+
+STARTED = time.monotonic()
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+
+def read_int(path):
+    try:
+        with open(path) as file:
+            value = file.read().strip()
+    except OSError:
+        return None
+    return int(value) if value.isdigit() else None
+
+
+def cpu_count():
+    """Ядра с учётом квоты CPU в cgroup v2 и affinity процесса."""
+    count = len(os.sched_getaffinity(0))
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as file:
+            quota, period = file.read().split()
+        if quota != 'max':
+            count = min(count, max(1, int(quota) // int(period)))
+    except (OSError, ValueError):
+        pass
+    return count or multiprocessing.cpu_count()
+
+
+def memory_limit():
+    """Лимит памяти контейнера в байтах (cgroup v2 или v1)."""
+    return (read_int('/sys/fs/cgroup/memory.max')
+            or read_int('/sys/fs/cgroup/memory/memory.limit_in_bytes'))
+
+
+def current_rss():
+    """Текущий RSS процесса в байтах."""
+    with open('/proc/self/statm') as file:
+        return int(file.read().split()[1]) * PAGE_SIZE
+
+
+def current_pss():
+    """PSS процесса в байтах: общие с мастером страницы делятся поровну."""
+    try:
+        with open('/proc/self/smaps_rollup') as file:
+            for line in file:
+                if line.startswith('Pss:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+MB = 1024 * 1024
+CPUS = cpu_count()
+WORKER_MEMORY = int(os.getenv('GUNICORN_WORKER_MEMORY_MB', 256)) * MB
+MAX_WORKER_RSS = int(os.getenv('GUNICORN_MAX_WORKER_RSS_MB', 512)) * MB
+
+workers = int(os.getenv('GUNICORN_WORKERS', 0)) or 2 * CPUS + 1
+if memory_limit():
+    workers = max(1, min(workers, memory_limit() // WORKER_MEMORY))
+if workers > 1 and not os.getenv('REDIS_URL'):
+    # Версии данных, состояния зрителей и счётчики guardrails живут в
+    # кэше. Без общего Redis у каждого воркера свой LocMemCache, и
+    # воркеры отдают несогласованные ETag и 304.
+    raise RuntimeError(
+        f'REDIS_URL is required to run {workers} gunicorn workers; '
+        'set it or run with GUNICORN_WORKERS=1'
+    )
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+worker_class = 'gthread' if threads > 1 else 'sync'
+
+bind = os.getenv('GUNICORN_BIND', '0:8000')
+preload_app = True
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = max_requests // 10
+
+# Синхронная запись access-лога в stdout на каждый запрос заметно
+# тормозит воркеры, поэтому по умолчанию он выключен.
+accesslog = os.getenv('GUNICORN_ACCESS_LOG') or None
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+
+def warm_up():
+    """Прогрев того, что иначе каждый воркер делал бы на первых запросах."""
+    from django.apps import apps
+    from django.db import connections
+    from django.urls import get_resolver
+    from rest_framework.serializers import BaseSerializer
+
+    from api import serializers
+    from recipes.models import Recipe
+
+    resolver = get_resolver()
+    resolver.url_patterns
+    resolver.reverse_dict
+    for model in apps.get_models():
+        model._meta.get_fields()
+        model._meta.related_objects
+    for name in dir(serializers):
+        serializer = getattr(serializers, name)
+        if (isinstance(serializer, type)
+                and issubclass(serializer, BaseSerializer)
+                and serializer.__module__ == serializers.__name__):
+            serializer().fields
+    str(Recipe.objects.select_related('author').prefetch_related(
+        'tags', 'recipeingredients__ingredient').query)
+    # Соединения с БД не должны переживать форк.
+    connections.close_all()
+
+
+def when_ready(server):
+    warm_up()
+    gc.collect()
+    gc.freeze()
+    logger.info(
+        'Preloaded and warmed up in %.2fs, master RSS %d MB, '
+        '%d workers x %d threads',
+        time.monotonic() - STARTED, current_rss() // MB, workers, threads
+    )
+
+
+def post_worker_init(worker):
+    logger.info('Worker %s ready, RSS %d MB, PSS %d MB', worker.pid,
+                current_rss() // MB, current_pss() // MB)
+
+
+def post_request(worker, req, environ, resp):
+    rss = current_rss()
+    if rss > MAX_WORKER_RSS and worker.alive:
+        logger.warning('Worker %s reached %d MB RSS, recycling',
+                       worker.pid, rss // MB)
+        worker.alive = False
+
+
+def worker_exit(server, worker):
+    # Просмотры рецептов из буфера воркера, см. recipes.counters.
+    from recipes.counters import view_counter
+
+    view_counter.flush()
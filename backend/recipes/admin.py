@@ -1,6 +1,8 @@
 from django.conf import settings
 from django.contrib import admin
 
+from api.deletion import delete_recipes
+from api.read_models import rebuild_cards
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                             ShoppingCart, Tag)
 
@@ -27,7 +29,8 @@ class RecipeIngredientInline(admin.TabularInline):
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('pk', 'name', 'author', 'favorites_amount')
+    list_display = ('pk', 'name', 'author', 'favorites_amount', 'views')
+    readonly_fields = ('views',)
     search_fields = ('name', 'author')
     list_filter = ('name', 'author', 'tags')
     empty_value_display = settings.ADMIN_EMPTY_VALUE
@@ -38,12 +41,42 @@ class RecipeAdmin(admin.ModelAdmin):
     def favorites_amount(self, obj):
         return obj.favorites.count()
 
+    def save_related(self, request, form, formsets, change):
+        # Теги и ингредиенты сохраняются после самого рецепта.
+        super().save_related(request, form, formsets, change)
+        rebuild_cards(Recipe.objects.filter(pk=form.instance.pk))
+
+    def get_deleted_objects(self, objs, request):
+        # Стандартная страница подтверждения собирает все связанные объекты
+        # в память, у популярных рецептов это тысячи строк избранного.
+        return ([str(obj) for obj in objs],
+                {self.opts.verbose_name_plural: len(objs)}, set(), [])
+
+    def delete_model(self, request, obj):
+        delete_recipes(Recipe.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        delete_recipes(queryset)
+
 
 @admin.register(RecipeIngredient)
 class RecipeIngredientAdmin(admin.ModelAdmin):
     list_display = ('pk', 'recipe', 'ingredient', 'amount')
     empty_value_display = settings.ADMIN_EMPTY_VALUE
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        rebuild_cards(Recipe.objects.filter(pk=obj.recipe_id))
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        rebuild_cards(Recipe.objects.filter(pk=obj.recipe_id))
+
+    def delete_queryset(self, request, queryset):
+        recipe_ids = list(queryset.values_list('recipe_id', flat=True))
+        super().delete_queryset(request, queryset)
+        rebuild_cards(Recipe.objects.filter(pk__in=recipe_ids))
+
 
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
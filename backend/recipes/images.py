@@ -0,0 +1,107 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, connection, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Размеры производных картинок: вписываются в квадрат со стороной N.
+VARIANTS = {
+    'thumbnail': 320,
+    'medium': 960,
+}
+FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True,
+             'progressive': True},
+}
+VARIANTS_DIR = 'recipes/variants/'
+
+_executor = None
+
+
+def render_variants(name):
+    """Создаёт уменьшенные копии картинки и возвращает их имена.
+
+    Имя файла - хеш содержимого, поэтому одинаковые картинки не
+    дублируются, а nginx может отдавать их как неизменяемые.
+    Результат: {'thumbnail': {'webp': name, 'jpeg': name}, ...}.
+    """
+    from recipes.models import Recipe
+
+    storage = Recipe._meta.get_field('image').storage
+    with storage.open(name) as file:
+        original = ImageOps.exif_transpose(Image.open(file))
+        original.load()
+    result = {}
+    for variant, size in VARIANTS.items():
+        image = original.copy()
+        image.thumbnail((size, size), Image.LANCZOS)
+        result[variant] = {}
+        for extension, options in FORMATS.items():
+            converted = image
+            if options['format'] == 'JPEG' and image.mode != 'RGB':
+                converted = Image.new('RGB', image.size, 'white')
+                converted.paste(image, mask=image.convert('RGBA'))
+            buffer = BytesIO()
+            converted.save(buffer, **options)
+            # Хранилище само называет файл по хешу содержимого и не
+            # пишет его повторно, имя берём из его ответа.
+            result[variant][extension] = storage.save(
+                f'{VARIANTS_DIR}variant.{extension}',
+                ContentFile(buffer.getvalue())
+            )
+    return result
+
+
+def save_variants(recipe_id, name, variants):
+    """Сохраняет варианты, если картинка рецепта за это время не менялась."""
+    from recipes.models import Recipe
+
+    with transaction.atomic():
+        recipe = Recipe.objects.select_for_update().filter(
+            pk=recipe_id, image=name
+        ).first()
+        if recipe is None:
+            return
+        recipe.image_variants = variants
+        recipe.save(update_fields=('image_variants', 'updated'))
+
+
+def process_recipe_image(recipe_id, name):
+    close_old_connections()
+    try:
+        save_variants(recipe_id, name, render_variants(name))
+    except Exception:
+        logger.exception('Failed to build image variants for %s', name)
+    finally:
+        connection.close()
+
+
+def get_executor():
+    # Пул создаётся лениво, уже в процессе воркера после форка.
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_VARIANT_WORKERS,
+            thread_name_prefix='image-variants'
+        )
+    return _executor
+
+
+def schedule_variants(recipe):
+    """Ставит генерацию вариантов в фоновый пул после коммита.
+
+    Пул живёт в памяти процесса, и задачи пропадают вместе с
+    перезапущенным воркером. Такие рецепты остаются с пустым
+    image_variants, их периодически подбирает generate_image_variants.
+    """
+    if not recipe.image:
+        return
+    transaction.on_commit(lambda: get_executor().submit(
+        process_recipe_image, recipe.pk, recipe.image.name
+    ))
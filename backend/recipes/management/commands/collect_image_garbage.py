@@ -0,0 +1,93 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from recipes.images import VARIANTS_DIR
+from recipes.models import ImageBlob, Recipe
+
+
+class Command(BaseCommand):
+    help = ("Deletes recipe images and image variants that are no longer "
+            "referenced by any recipe")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours', type=int,
+            default=settings.IMAGE_GARBAGE_GRACE_HOURS,
+            help='Keep files that were released or written more recently'
+        )
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report what would be deleted')
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+        self.storage = Recipe._meta.get_field('image').storage
+        self.deleted = self.freed = 0
+        self.collect_released()
+        self.collect_untracked()
+        self.collect_variants()
+        action = 'Would delete' if self.dry_run else 'Deleted'
+        self.stdout.write(f'{action} {self.deleted} files, '
+                          f'{self.freed / 1024 / 1024:.1f} MB')
+
+    def delete_file(self, name):
+        if not self.storage.exists(name):
+            return
+        self.deleted += 1
+        self.freed += self.storage.size(name)
+        if not self.dry_run:
+            self.storage.delete(name)
+
+    def is_stale(self, name):
+        return self.storage.get_modified_time(name) < self.cutoff
+
+    def collect_released(self):
+        """Файлы, с которых сняты все ссылки."""
+        names = ImageBlob.objects.filter(
+            references=0, updated__lt=self.cutoff
+        ).values_list('name', flat=True)
+        for name in list(names):
+            with transaction.atomic():
+                blob = ImageBlob.objects.select_for_update().filter(
+                    name=name, references=0
+                ).first()
+                # Хранилище обновляет время изменения файла при повторной
+                # загрузке, такой файл вот-вот снова получит ссылку.
+                if (blob is None
+                        or Recipe.objects.filter(image=name).exists()
+                        or (self.storage.exists(name)
+                            and not self.is_stale(name))):
+                    continue
+                self.delete_file(name)
+                if not self.dry_run:
+                    blob.delete()
+
+    def collect_untracked(self):
+        """Файлы без счётчика, например оставшиеся от старых рецептов."""
+        upload_to = Recipe._meta.get_field('image').upload_to
+        known = set(ImageBlob.objects.values_list('name', flat=True))
+        known.update(Recipe.objects.values_list('image', flat=True))
+        _, files = self.storage.listdir(upload_to)
+        for file in files:
+            name = upload_to + file
+            if name not in known and self.is_stale(name):
+                self.delete_file(name)
+
+    def collect_variants(self):
+        """Уменьшенные копии, на которые не ссылается ни один рецепт."""
+        if not self.storage.exists(VARIANTS_DIR):
+            return
+        used = set()
+        for variants in Recipe.objects.values_list(
+                'image_variants', flat=True).iterator():
+            for files in variants.values():
+                used.update(files.values())
+        _, files = self.storage.listdir(VARIANTS_DIR)
+        for file in files:
+            name = VARIANTS_DIR + file
+            if name not in used and self.is_stale(name):
+                self.delete_file(name)
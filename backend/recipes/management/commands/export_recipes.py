@@ -0,0 +1,75 @@
+import sys
+import time
+
+import orjson
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from api.read_models import build_cards
+from recipes.models import Recipe
+
+RECIPE_COLUMNS = ('id', 'name', 'text', 'cooking_time', 'image')
+
+
+def export_lines(recipes, chunk_size):
+    """Строки NDJSON по рецепту, рецепты читаются пачками по id.
+
+    В памяти одновременно только одна пачка, поэтому расход памяти не
+    зависит от размера таблицы.
+    """
+    recipes = recipes.order_by('id').values(*RECIPE_COLUMNS)
+    last_id = 0
+    while True:
+        rows = list(recipes.filter(id__gt=last_id)[:chunk_size])
+        if not rows:
+            return
+        last_id = rows[-1]['id']
+        cards = build_cards([row['id'] for row in rows])
+        for row in rows:
+            card = cards[row['id']]
+            author = card['author']
+            yield orjson.dumps({
+                **row,
+                'author': {field: author[field] for field in
+                           ('email', 'username', 'first_name', 'last_name')},
+                'tags': [{field: tag[field] for field in
+                          ('slug', 'name', 'color')}
+                         for tag in card['tags']],
+                'ingredients': [{field: ingredient[field] for field in
+                                 ('name', 'measurement_unit', 'amount')}
+                                for ingredient in card['ingredients']],
+            }) + b'\n'
+
+
+class Command(BaseCommand):
+    help = ("Streams recipes with their author, tags, ingredients and "
+            "image names as NDJSON")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='-',
+                            help='File to write, "-" for stdout')
+        parser.add_argument('--author', action='append', default=[],
+                            help='Export only recipes of this email')
+        parser.add_argument('--chunk-size', type=int,
+                            default=settings.IMPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.all()
+        if options['author']:
+            recipes = recipes.filter(author__email__in=options['author'])
+        output = (sys.stdout.buffer if options['output'] == '-'
+                  else open(options['output'], 'wb'))
+        started = time.monotonic()
+        count = 0
+        try:
+            for line in export_lines(recipes, options['chunk_size']):
+                output.write(line)
+                count += 1
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
+        elapsed = time.monotonic() - started
+        self.stderr.write(
+            f'Exported {count} recipes in {elapsed:.1f}s '
+            f'({count / max(elapsed, 1e-6):.0f} recipes/s)'
+        )
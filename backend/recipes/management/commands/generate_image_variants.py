@@ -0,0 +1,67 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from recipes.images import render_variants, save_variants
+from recipes.models import Recipe
+
+BATCH_SIZE = 500
+
+
+def render(recipe_id, name):
+    return recipe_id, name, render_variants(name)
+
+
+class Command(BaseCommand):
+    help = ("Generates thumbnail and medium image variants for recipes. "
+            "Without --force only recipes that have none are processed; run "
+            "it periodically to pick up jobs lost with a recycled worker")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Worker processes, defaults to CPU count')
+        parser.add_argument('--force', action='store_true',
+                            help='Rebuild variants that already exist')
+        parser.add_argument(
+            '--min-age', type=int,
+            default=settings.IMAGE_VARIANT_SWEEP_MINUTES,
+            help='Skip recipes changed in the last N minutes, their '
+                 'variants may still be in progress in a web worker'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['force']:
+            recipes = recipes.filter(
+                image_variants={},
+                updated__lt=timezone.now() - timedelta(
+                    minutes=options['min_age'])
+            )
+        rows = list(recipes.order_by().values_list('id', 'image'))
+        self.stdout.write(f'Processing {len(rows)} images')
+        # Дочерние процессы не должны унаследовать соединения с БД.
+        connections.close_all()
+        started = time.monotonic()
+        done = failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            # Отправляем пачками, чтобы не держать в памяти все задачи сразу.
+            for start in range(0, len(rows), BATCH_SIZE):
+                futures = [pool.submit(render, recipe_id, name)
+                           for recipe_id, name
+                           in rows[start:start + BATCH_SIZE]]
+                for future in as_completed(futures):
+                    try:
+                        save_variants(*future.result())
+                        done += 1
+                    except Exception as error:
+                        failed += 1
+                        self.stderr.write(f'Failed: {error}')
+        self.stdout.write(
+            f'Done: {done}, failed: {failed}, '
+            f'{time.monotonic() - started:.1f}s'
+        )
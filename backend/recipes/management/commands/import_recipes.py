@@ -0,0 +1,233 @@
+import os
+import resource
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+import orjson
+from django.conf import settings
+from django.core.files import File
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+
+from api.read_models import rebuild_cards
+from api.versions import CATALOG, INGREDIENTS, RECIPES, bump_version
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from recipes.storage import acquire
+from users.models import User
+
+
+def read_chunks(stream, size):
+    """Пачки разобранных строк NDJSON; пустые строки пропускаются."""
+    lines = (line for line in stream if line.strip())
+    while True:
+        chunk = [orjson.loads(line) for line in islice(lines, size)]
+        if not chunk:
+            return
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = ("Imports recipes from NDJSON produced by export_recipes in "
+            "chunked bulk inserts. A recipe whose author already has a "
+            "recipe with the same name is skipped, so an interrupted import "
+            "can be rerun; concurrent imports of one file are not "
+            "deduplicated")
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='File to read, "-" for stdin')
+        parser.add_argument('--media-root',
+                            help='MEDIA_ROOT of the source environment; '
+                                 'images are copied from it. Without it '
+                                 'images must already be in our storage')
+        parser.add_argument('--create-authors', action='store_true',
+                            help='Create missing authors with an unusable '
+                                 'password instead of skipping recipes')
+        parser.add_argument('--chunk-size', type=int,
+                            default=settings.IMPORT_CHUNK_SIZE)
+        parser.add_argument('--workers', type=int,
+                            default=settings.IMPORT_IMAGE_WORKERS,
+                            help='Threads copying images')
+
+    def handle(self, *args, **options):
+        self.media_root = options['media_root']
+        self.create_authors = options['create_authors']
+        self.storage = Recipe._meta.get_field('image').storage
+        self.authors = dict(User.objects.values_list('email', 'id'))
+        self.tags = dict(Tag.objects.values_list('slug', 'id'))
+        self.ingredients = {}
+        for ingredient_id, name, unit in Ingredient.objects.order_by(
+                '-id').values_list('id', 'name', 'measurement_unit'):
+            self.ingredients[(name, unit)] = ingredient_id
+        # Исходное имя картинки -> имя в нашем хранилище.
+        self.images = {}
+        self.skipped = Counter()
+        stream = (sys.stdin.buffer if options['input'] == '-'
+                  else open(options['input'], 'rb'))
+        started = time.monotonic()
+        imported = 0
+        try:
+            with ThreadPoolExecutor(options['workers']) as self.pool:
+                for chunk in read_chunks(stream, options['chunk_size']):
+                    imported += self.import_chunk(chunk)
+                    elapsed = time.monotonic() - started
+                    self.stderr.write(
+                        f'{imported} recipes, '
+                        f'{imported / max(elapsed, 1e-6):.0f} recipes/s'
+                    )
+        finally:
+            if stream is not sys.stdin.buffer:
+                stream.close()
+            bump_version(RECIPES)
+            bump_version(CATALOG)
+            bump_version(INGREDIENTS)
+        elapsed = time.monotonic() - started
+        # ru_maxrss в Linux - в килобайтах.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+        self.stdout.write(
+            f'Imported {imported} recipes in {elapsed:.1f}s '
+            f'({imported / max(elapsed, 1e-6):.0f} recipes/s), '
+            f'peak memory {peak} MB'
+        )
+        for reason, count in self.skipped.items():
+            self.stdout.write(f'Skipped {count}: {reason}')
+
+    def resolve_authors(self, chunk):
+        missing = {
+            recipe['author']['email']: recipe['author'] for recipe in chunk
+            if recipe['author']['email'] not in self.authors
+        }
+        if missing and self.create_authors:
+            User.objects.bulk_create(
+                (User(password='!', **author) for author in missing.values()),
+                ignore_conflicts=True
+            )
+            self.authors.update(User.objects.filter(
+                email__in=missing).values_list('email', 'id'))
+
+    def resolve_tags(self, chunk):
+        missing = {
+            tag['slug']: tag for recipe in chunk for tag in recipe['tags']
+            if tag['slug'] not in self.tags
+        }
+        if missing:
+            # Конфликт по имени или цвету с другим тегом пропускается,
+            # такой тег не попадёт в рецепты.
+            Tag.objects.bulk_create(
+                (Tag(**tag) for tag in missing.values()),
+                ignore_conflicts=True
+            )
+            self.tags.update(Tag.objects.filter(
+                slug__in=missing).values_list('slug', 'id'))
+
+    def resolve_ingredients(self, chunk):
+        missing = {
+            (ingredient['name'], ingredient['measurement_unit'])
+            for recipe in chunk for ingredient in recipe['ingredients']
+        } - self.ingredients.keys()
+        if missing:
+            created = Ingredient.objects.bulk_create(
+                Ingredient(name=name, measurement_unit=unit)
+                for name, unit in missing
+            )
+            self.ingredients.update(
+                ((ingredient.name, ingredient.measurement_unit),
+                 ingredient.id)
+                for ingredient in created
+            )
+
+    def copy_image(self, name):
+        path = os.path.join(self.media_root, name)
+        if not os.path.isfile(path):
+            return name, None
+        with open(path, 'rb') as source:
+            return name, self.storage.save(name, File(source))
+
+    def find_image(self, name):
+        return name, name if self.storage.exists(name) else None
+
+    def resolve_images(self, chunk):
+        """Копирует или проверяет новые картинки пачки параллельно.
+
+        Хранилище адресует файлы по содержимому, поэтому имя картинки
+        после копирования может отличаться от исходного. Без --media-root
+        картинки уже должны быть в нашем хранилище под теми же именами.
+        """
+        names = {recipe['image'] for recipe in chunk} - self.images.keys()
+        resolve = self.copy_image if self.media_root else self.find_image
+        for name, stored in self.pool.map(resolve, names):
+            self.images[name] = stored
+
+    def existing_recipes(self, chunk):
+        """Пары (id автора, название) уже существующих рецептов пачки."""
+        author_ids = {self.authors[recipe['author']['email']]
+                      for recipe in chunk
+                      if recipe['author']['email'] in self.authors}
+        return set(Recipe.objects.filter(
+            author_id__in=author_ids,
+            name__in={recipe['name'] for recipe in chunk}
+        ).values_list('author_id', 'name'))
+
+    def import_chunk(self, chunk):
+        self.resolve_authors(chunk)
+        self.resolve_tags(chunk)
+        self.resolve_ingredients(chunk)
+        self.resolve_images(chunk)
+        existing = self.existing_recipes(chunk)
+        rows = []
+        for recipe in chunk:
+            key = (self.authors.get(recipe['author']['email']),
+                   recipe['name'])
+            if key[0] is None:
+                self.skipped['unknown author'] += 1
+            elif key in existing:
+                self.skipped['already imported'] += 1
+            elif not self.images.get(recipe['image']):
+                self.skipped['missing image'] += 1
+            else:
+                # Повтор внутри файла тоже пропускается.
+                existing.add(key)
+                rows.append(recipe)
+        if not rows:
+            return 0
+        recipe_tag = Recipe.tags.through
+        with transaction.atomic():
+            recipes = Recipe.objects.bulk_create(
+                Recipe(author_id=self.authors[row['author']['email']],
+                       name=row['name'], text=row['text'],
+                       cooking_time=row['cooking_time'],
+                       image=self.images[row['image']])
+                for row in rows
+            )
+            recipe_tag.objects.bulk_create(
+                recipe_tag(recipe_id=recipe.id, tag_id=self.tags[tag['slug']])
+                for recipe, row in zip(recipes, rows)
+                for tag in row['tags'] if tag['slug'] in self.tags
+            )
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe_id=recipe.id,
+                    ingredient_id=self.ingredients[(
+                        ingredient['name'], ingredient['measurement_unit']
+                    )],
+                    amount=ingredient['amount']
+                )
+                for recipe, row in zip(recipes, rows)
+                for ingredient in row['ingredients']
+            )
+            # bulk_create не отправляет сигналов: ссылки на картинки и
+            # карточки обновляем сами, карточки пишут и журнал изменений.
+            for name, count in Counter(
+                    recipe.image.name for recipe in recipes).items():
+                acquire(name, count)
+            rebuild_cards(Recipe.objects.filter(
+                id__in=[recipe.id for recipe in recipes]))
+        return len(recipes)
+
+    def execute(self, *args, **options):
+        try:
+            return super().execute(*args, **options)
+        except (OSError, orjson.JSONDecodeError, KeyError) as error:
+            raise CommandError(f'Import failed: {error!r}')
@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.utils import timezone
+
+from recipes.models import Change
+
+
+class Command(BaseCommand):
+    help = "Deletes change feed entries older than the retention period"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            default=settings.CHANGES_RETENTION_DAYS,
+                            help='Keep entries newer than this many days')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        # Последняя запись остаётся всегда: по ней API отличает
+        # устаревший курсор от отсутствия изменений.
+        latest = Change.objects.order_by('-txid', '-id').values_list(
+            'id', flat=True).first()
+        if latest is None:
+            return
+        old = Change.objects.filter(created__lt=cutoff).exclude(id=latest)
+        deleted = 0
+        while True:
+            ids = list(old.values_list(
+                'id', flat=True)[:settings.DELETE_CHUNK_SIZE])
+            if not ids:
+                break
+            deleted += Change.objects.filter(id__in=ids)._raw_delete(
+                Change.objects.db)
+        self.stdout.write(f'Deleted {deleted} change feed entries')
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management import BaseCommand
+
+from api.versions import RECIPES, bump_version
+from recipes.ranking import update_popularity
+
+
+class Command(BaseCommand):
+    help = ("Recomputes the time-decayed recipe popularity used by "
+            "ordering=popular; run it periodically, e.g. hourly")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        updated = update_popularity()
+        # Порядок списка изменился, старые ETag больше не годятся.
+        bump_version(RECIPES)
+        self.stdout.write(
+            f'Ranked {updated} recipes, '
+            f'{time.monotonic() - started:.1f}s'
+        )
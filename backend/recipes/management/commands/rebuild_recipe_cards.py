@@ -0,0 +1,25 @@
+import time
+
+from django.core.management import BaseCommand
+
+from api.read_models import rebuild_cards
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the stored recipe cards used by list and detail views"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--missing', action='store_true',
+                            help='Only build cards that are still empty')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.all()
+        if options['missing']:
+            recipes = recipes.filter(card={})
+        started = time.monotonic()
+        updated = rebuild_cards(recipes)
+        self.stdout.write(
+            f'Rebuilt {updated} recipe cards, '
+            f'{time.monotonic() - started:.1f}s'
+        )
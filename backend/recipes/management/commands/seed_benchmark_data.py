@@ -0,0 +1,224 @@
+import csv
+import os.path
+import random
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import BaseCommand
+from django.db import transaction
+from PIL import Image
+
+from api.deletion import delete_user
+from api.read_models import rebuild_cards
+from api.versions import (CATALOG, INGREDIENTS, RECIPES, VIEWER,
+                          bump_version)
+from api.viewer_state import bump_state_version
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from recipes.ranking import update_popularity
+from recipes.storage import acquire
+from users.models import Subscription, User
+
+BENCHMARK_PREFIX = 'bench'
+BENCHMARK_PASSWORD = 'bench-password'
+
+
+def chunked(total, size):
+    """Разбивает количество объектов на пачки заданного размера."""
+    for start in range(0, total, size):
+        yield start, min(size, total - start)
+
+
+class Command(BaseCommand):
+    help = "Bulk-generates synthetic data for load testing and benchmarks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--tags', type=int, default=10)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--tags-per-recipe', type=int, default=2)
+        parser.add_argument('--favorites', type=int, default=50000)
+        parser.add_argument('--carts', type=int, default=20000)
+        parser.add_argument('--subscriptions', type=int, default=10000)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Remove previously generated benchmark data first'
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        try:
+            self.seed(options)
+        finally:
+            # bulk_create не отправляет сигналов: без новых версий
+            # условные GET и кэши продолжили бы отдавать старые данные.
+            bump_version(RECIPES)
+            bump_version(CATALOG)
+            bump_version(INGREDIENTS)
+
+    def seed(self, options):
+        if options['clear']:
+            self.clear()
+        ingredient_ids = self.ensure_ingredients()
+        tag_ids = self.create_tags(options['tags'])
+        user_ids = self.create_users(options['users'])
+        if not user_ids:
+            self.stdout.write('No users to attach data to, nothing to do.')
+            return
+        self.image = self.ensure_image()
+        recipe_ids = self.create_recipes(
+            options['recipes'], user_ids, tag_ids, ingredient_ids,
+            options['tags_per_recipe'], options['ingredients_per_recipe']
+        )
+        try:
+            if recipe_ids:
+                self.create_pairs(Favorite, 'user_id', 'recipe_id',
+                                  user_ids, recipe_ids, options['favorites'])
+                self.create_pairs(ShoppingCart, 'user_id', 'recipe_id',
+                                  user_ids, recipe_ids, options['carts'])
+                update_popularity()
+            self.create_pairs(Subscription, 'user_id', 'author_id',
+                              user_ids, user_ids, options['subscriptions'],
+                              distinct=True)
+        finally:
+            # Отметки достаются и пользователям прошлых запусков, чьи
+            # состояния уже могут лежать в кэше.
+            for user_id in user_ids:
+                bump_version(VIEWER.format(user_id))
+                bump_state_version(user_id)
+        self.stdout.write('The benchmark data has been generated '
+                          'successfully.')
+
+    def clear(self):
+        # delete_user снимает ссылки с картинок, пишет журнал изменений и
+        # обновляет версии, чего каскадное users.delete() не делает.
+        deleted = 0
+        for user in User.objects.filter(
+                username__startswith=BENCHMARK_PREFIX).iterator():
+            delete_user(user)
+            deleted += 1
+        Tag.objects.filter(slug__startswith=BENCHMARK_PREFIX).delete()
+        self.stdout.write(f'Removed {deleted} benchmark users')
+
+    def ensure_ingredients(self):
+        """Загружает ингредиенты из csv, если каталог пустой."""
+        if not Ingredient.objects.exists():
+            with open(os.path.join(settings.BASE_DIR
+                                   / 'data/ingredients.csv'),
+                      'r') as csv_file:
+                Ingredient.objects.bulk_create(
+                    (Ingredient(name=row[0], measurement_unit=row[1])
+                     for row in csv.reader(csv_file, delimiter=',')),
+                    batch_size=self.batch_size
+                )
+        return list(Ingredient.objects.values_list('id', flat=True))
+
+    def create_tags(self, count):
+        Tag.objects.bulk_create(
+            (Tag(name=f'{BENCHMARK_PREFIX} {number}',
+                 color=f'#{number:06X}',
+                 slug=f'{BENCHMARK_PREFIX}_{number}')
+             for number in range(count)),
+            ignore_conflicts=True
+        )
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def create_users(self, count):
+        # Хешировать пароль для каждого пользователя слишком дорого.
+        password = make_password(BENCHMARK_PASSWORD)
+        start = User.objects.filter(
+            username__startswith=BENCHMARK_PREFIX
+        ).count()
+        for offset, size in chunked(count, self.batch_size):
+            User.objects.bulk_create(
+                User(username=f'{BENCHMARK_PREFIX}{number}',
+                     email=f'{BENCHMARK_PREFIX}{number}@example.com',
+                     first_name='Bench', last_name=f'User{number}',
+                     password=password)
+                for number in range(start + offset, start + offset + size)
+            )
+        self.stdout.write(f'Created {count} users')
+        return list(User.objects.filter(
+            username__startswith=BENCHMARK_PREFIX
+        ).values_list('id', flat=True))
+
+    def ensure_image(self):
+        """Одна общая картинка на все сгенерированные рецепты."""
+        buffer = BytesIO()
+        Image.new('RGB', (640, 480), '#E26C2D').save(buffer, 'PNG')
+        field = Recipe._meta.get_field('image')
+        return field.storage.save(field.upload_to + 'benchmark.png',
+                                  ContentFile(buffer.getvalue()))
+
+    def create_recipes(self, count, user_ids, tag_ids, ingredient_ids,
+                       tags_per_recipe, ingredients_per_recipe):
+        tags_per_recipe = min(tags_per_recipe, len(tag_ids))
+        ingredients_per_recipe = min(ingredients_per_recipe,
+                                     len(ingredient_ids))
+        recipe_tag = Recipe.tags.through
+        recipe_ids = []
+        for offset, size in chunked(count, self.batch_size):
+            with transaction.atomic():
+                recipes = Recipe.objects.bulk_create(
+                    Recipe(author_id=self.random.choice(user_ids),
+                           name=f'Рецепт {offset + number}',
+                           text='Описание рецепта для нагрузочного теста.',
+                           image=self.image,
+                           cooking_time=self.random.randint(1, 240))
+                    for number in range(size)
+                )
+                recipe_tag.objects.bulk_create(
+                    recipe_tag(recipe_id=recipe.id, tag_id=tag_id)
+                    for recipe in recipes
+                    for tag_id in self.random.sample(tag_ids,
+                                                     tags_per_recipe)
+                )
+                RecipeIngredient.objects.bulk_create(
+                    (RecipeIngredient(recipe_id=recipe.id,
+                                      ingredient_id=ingredient_id,
+                                      amount=self.random.randint(1, 500))
+                     for recipe in recipes
+                     for ingredient_id in self.random.sample(
+                         ingredient_ids, ingredients_per_recipe)),
+                    batch_size=self.batch_size
+                )
+                # bulk_create не отправляет сигналов, ссылки считаем сами.
+                acquire(self.image, len(recipes))
+                rebuild_cards(Recipe.objects.filter(
+                    id__in=[recipe.id for recipe in recipes]))
+            recipe_ids.extend(recipe.id for recipe in recipes)
+        self.stdout.write(f'Created {count} recipes')
+        return recipe_ids
+
+    def create_pairs(self, model, left, right, left_ids, right_ids, count,
+                     distinct=False):
+        """Создаёт случайные уникальные пары, повторы отбрасываются БД.
+
+        distinct отбрасывает пары из одинаковых id: так нельзя подписаться
+        на себя. id пользователя и рецепта совпадают случайно, такие пары
+        допустимы.
+        """
+        for _, size in chunked(count, self.batch_size):
+            pairs = set()
+            # Ограничиваем число попыток на случай маленького датасета.
+            for _ in range(size * 3):
+                if len(pairs) >= size:
+                    break
+                pair = (self.random.choice(left_ids),
+                        self.random.choice(right_ids))
+                if not distinct or pair[0] != pair[1]:
+                    pairs.add(pair)
+            model.objects.bulk_create(
+                (model(**{left: left_id, right: right_id})
+                 for left_id, right_id in pairs),
+                ignore_conflicts=True
+            )
+        self.stdout.write(
+            f'Created up to {count} {model._meta.verbose_name_plural}'
+        )
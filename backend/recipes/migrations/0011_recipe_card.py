@@ -0,0 +1,18 @@
+# Generated by Django 4.2.3 on 2026-10-19 07:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_change'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='card',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Карточка рецепта'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations
+
+INDEX = 'ingredient_name_trgm'
+
+
+def create_index(apps, schema_editor):
+    # Триграммный индекс есть только в PostgreSQL, на других базах
+    # api.search ищет без него.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    table = apps.get_model('recipes', 'Ingredient')._meta.db_table
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {INDEX} ON {table} '
+        f'USING gin (name gin_trgm_ops)'
+    )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_recipe_views'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
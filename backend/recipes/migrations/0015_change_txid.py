@@ -0,0 +1,34 @@
+# Generated by Django 4.2.3 on 2026-10-19 08:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_ingredient_name_trgm'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='change',
+            options={'ordering': ('txid', 'id'), 'verbose_name': 'Изменение', 'verbose_name_plural': 'Изменения'},
+        ),
+        migrations.RemoveIndex(
+            model_name='change',
+            name='change_user_id',
+        ),
+        migrations.AddField(
+            model_name='change',
+            name='txid',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Транзакция'),
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['txid', 'id'], name='change_position'),
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['user_id', 'txid', 'id'], name='change_user_position'),
+        ),
+    ]
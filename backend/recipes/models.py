@@ -3,6 +3,7 @@ from django.conf import settings
 from django.core.validators import MinValueValidator
 from django.db import models
 
+from recipes.storage import ContentAddressedStorage
 from users.models import User
 
 
@@ -23,7 +24,22 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         'Изображение блюда',
-        upload_to='recipes/'
+        upload_to='recipes/',
+        storage=ContentAddressedStorage(),
+        max_length=255,
+    )
+    image_variants = models.JSONField(
+        'Уменьшенные копии изображения',
+        default=dict,
+        blank=True,
+        editable=False,
+    )
+    # Готовые теги, автор и ингредиенты для выдачи, см. build_cards().
+    card = models.JSONField(
+        'Карточка рецепта',
+        default=dict,
+        blank=True,
+        editable=False,
     )
     ingredients = models.ManyToManyField(
         'Ingredient',
@@ -42,16 +58,64 @@ class Recipe(models.Model):
             )
         ]
     )
+    # Затухающий во времени рейтинг по избранному и корзинам, его
+    # пересчитывает команда rank_recipes.
+    popularity = models.FloatField(
+        'Популярность',
+        default=0,
+        editable=False,
+    )
+    # Пишется пачками из буфера recipes.counters.view_counter.
+    views = models.PositiveIntegerField(
+        'Просмотры',
+        default=0,
+        editable=False,
+    )
     created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created']
+        indexes = (
+            models.Index(fields=('-popularity', '-id'),
+                         name='recipe_popularity'),
+        )
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Имя картинки в БД нужно, чтобы при смене картинки снять ссылку
+        # со старого файла (см. ImageBlob).
+        if 'image' in field_names:
+            instance.saved_image = values[field_names.index('image')]
+        return instance
+
+
+class ImageBlob(models.Model):
+    """Счётчик ссылок рецептов на файл картинки."""
+    name = models.CharField(
+        'Файл',
+        max_length=255,
+        unique=True,
+    )
+    references = models.PositiveIntegerField(
+        'Количество ссылок',
+        default=0,
+    )
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Файл изображения'
+        verbose_name_plural = 'Файлы изображений'
+
+    def __str__(self):
+        return self.name
+
 
 class Tag(models.Model):
     """Модель тегов."""
@@ -144,6 +208,7 @@ class Favorite(models.Model):
         on_delete=models.CASCADE,
         verbose_name='Рецепт',
     )
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
 
     class Meta:
         ordering = ('user',)
@@ -175,6 +240,7 @@ class ShoppingCart(models.Model):
         related_name='shopping_carts',
         verbose_name='Рецепт'
     )
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
 
     class Meta:
         ordering = ('user',)
@@ -191,3 +257,53 @@ class ShoppingCart(models.Model):
     def __str__(self):
         return (f'{self.user.username} добавил'
                 f'{self.recipe.name} в список покупок')
+
+
+class Change(models.Model):
+    """Журнал изменений для инкрементальной синхронизации клиентов.
+
+    Записи о рецептах общие (user_id пустой), об избранном, корзине и
+    подписках видны только их владельцу. Курсор - пара (txid, id):
+    записи идут в порядке транзакций, а внутри транзакции - по номеру.
+    """
+    RECIPE = 'recipe'
+    FAVORITE = 'favorite'
+    SHOPPING_CART = 'shopping_cart'
+    SUBSCRIPTION = 'subscription'
+    KINDS = (
+        (RECIPE, 'Рецепт'),
+        (FAVORITE, 'Избранное'),
+        (SHOPPING_CART, 'Список покупок'),
+        (SUBSCRIPTION, 'Подписка'),
+    )
+
+    kind = models.CharField(
+        'Тип',
+        max_length=16,
+        choices=KINDS,
+    )
+    object_id = models.BigIntegerField('Объект')
+    # Без внешнего ключа: журнал удалённого пользователя подчищается
+    # командой prune_changes, а не каскадом.
+    user_id = models.BigIntegerField(
+        'Пользователь',
+        null=True,
+        blank=True,
+    )
+    deleted = models.BooleanField('Удалён', default=False)
+    # Номер записавшей транзакции в PostgreSQL, в других базах 0.
+    txid = models.BigIntegerField('Транзакция', default=0, editable=False)
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ('txid', 'id')
+        indexes = (
+            models.Index(fields=('txid', 'id'), name='change_position'),
+            models.Index(fields=('user_id', 'txid', 'id'),
+                         name='change_user_position'),
+        )
+        verbose_name = 'Изменение'
+        verbose_name_plural = 'Изменения'
+
+    def __str__(self):
+        return f'{self.kind} {self.object_id}'
@@ -0,0 +1,62 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import (Case, Exists, FloatField, OuterRef, Q,
+                              Subquery, Sum, Value, When)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+
+
+def decay(now):
+    """Вес отметки по её возрасту: половина за RANKING_HALF_LIFE_DAYS.
+
+    Возраст считается в днях ступенями через CASE: разность дат в
+    секундах PostgreSQL и SQLite вычисляют по-разному, а дневной
+    точности рейтингу достаточно. Отметки старше RANKING_WINDOW_DAYS
+    не учитываются.
+    """
+    return Case(
+        *(When(created__gte=now - timedelta(days=day + 1),
+               then=Value(0.5 ** (day / settings.RANKING_HALF_LIFE_DAYS)))
+          for day in range(settings.RANKING_WINDOW_DAYS)),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+def activity(model, now):
+    """Сумма весов отметок модели для рецепта из внешнего запроса."""
+    return Coalesce(Subquery(
+        model.objects.filter(
+            recipe=OuterRef('pk'),
+            created__gte=now - timedelta(days=settings.RANKING_WINDOW_DAYS)
+        ).order_by().values('recipe').annotate(
+            score=Sum(decay(now))
+        ).values('score'),
+        output_field=FloatField()
+    ), Value(0.0))
+
+
+def update_popularity(now=None):
+    """Пересчитывает Recipe.popularity двумя UPDATE.
+
+    Первый выставляет рейтинг рецептам с отметками в окне, второй
+    обнуляет рейтинг остальным, у кого он ещё не нулевой. Возвращает
+    количество обновлённых рецептов.
+    """
+    now = now or timezone.now()
+    start = now - timedelta(days=settings.RANKING_WINDOW_DAYS)
+    active = Q(Exists(Favorite.objects.filter(
+        recipe=OuterRef('pk'), created__gte=start
+    ))) | Q(Exists(ShoppingCart.objects.filter(
+        recipe=OuterRef('pk'), created__gte=start
+    )))
+    updated = Recipe.objects.filter(active).update(popularity=(
+        activity(Favorite, now) * settings.RANKING_FAVORITE_WEIGHT
+        + activity(ShoppingCart, now) * settings.RANKING_SHOPPING_CART_WEIGHT
+    ))
+    updated += Recipe.objects.filter(popularity__gt=0).exclude(
+        active).update(popularity=0)
+    return updated
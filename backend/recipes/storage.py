@@ -0,0 +1,93 @@
+import hashlib
+import os
+import uuid
+from collections import Counter
+
+from django.core.files.storage import FileSystemStorage
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, в котором имя файла - хеш его содержимого.
+
+    Одинаковые картинки сохраняются один раз: если файл с таким хешем уже
+    есть, запись пропускается. Удалять такие файлы напрямую нельзя, на них
+    могут ссылаться несколько рецептов, - учёт ссылок ведётся в ImageBlob,
+    а неиспользуемые файлы удаляет команда collect_image_garbage.
+    """
+
+    @staticmethod
+    def hashed_name(name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(os.path.dirname(name),
+                            f'{digest.hexdigest()}{extension}')
+
+    def get_available_name(self, name, max_length=None):
+        # Имя определяется содержимым, подбирать свободное не нужно.
+        return name
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, content)
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            # Свежее время изменения защищает файл от сборщика мусора.
+            os.utime(full_path)
+            return name.replace('\\', '/')
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        # Пишем во временный файл и атомарно переименовываем: параллельная
+        # загрузка той же картинки запишет те же байты под тем же именем.
+        temporary_path = f'{full_path}.{uuid.uuid4().hex}.tmp'
+        try:
+            with open(temporary_path, 'wb') as file:
+                for chunk in content.chunks():
+                    file.write(chunk if isinstance(chunk, bytes)
+                               else chunk.encode())
+            if self.file_permissions_mode is not None:
+                os.chmod(temporary_path, self.file_permissions_mode)
+            os.replace(temporary_path, full_path)
+        finally:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+        return name.replace('\\', '/')
+
+
+def acquire(name, count=1):
+    """Добавляет ссылки на файл."""
+    from recipes.models import ImageBlob
+
+    if not name:
+        return
+    updated = ImageBlob.objects.filter(name=name).update(
+        references=F('references') + count, updated=timezone.now()
+    )
+    if not updated:
+        ImageBlob.objects.bulk_create(
+            [ImageBlob(name=name, references=0)], ignore_conflicts=True
+        )
+        ImageBlob.objects.filter(name=name).update(
+            references=F('references') + count, updated=timezone.now()
+        )
+
+
+def release(names):
+    """Снимает по одной ссылке за каждое вхождение имени в names.
+
+    Сами файлы не удаляются: с нулевым счётчиком их позже подберёт
+    collect_image_garbage, если за это время картинку не загрузят снова.
+    """
+    from recipes.models import ImageBlob
+
+    for name, count in Counter(name for name in names if name).items():
+        ImageBlob.objects.filter(name=name).update(
+            references=Greatest(F('references') - count, 0),
+            updated=timezone.now()
+        )
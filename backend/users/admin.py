@@ -1,6 +1,7 @@
 from django.conf import settings
 from django.contrib import admin
 
+from api.deletion import delete_user
 from .models import Subscription, User
 
 
@@ -13,6 +14,18 @@ class UserAdmin(admin.ModelAdmin):
     list_filter = ('username', 'email')
     empty_value_display = settings.ADMIN_EMPTY_VALUE
 
+    def get_deleted_objects(self, objs, request):
+        # Не собираем в память все рецепты и отметки удаляемых авторов.
+        return ([str(obj) for obj in objs],
+                {self.opts.verbose_name_plural: len(objs)}, set(), [])
+
+    def delete_model(self, request, obj):
+        delete_user(obj)
+
+    def delete_queryset(self, request, queryset):
+        for user in queryset:
+            delete_user(user)
+
 
 @admin.register(Subscription)
 class SubscriptionAdmin(admin.ModelAdmin):